@@ -0,0 +1,457 @@
+"""
+Batch mode of the CLI.
+
+Runs gpt-engineer over many project folders in one process, as listed in a TOML
+manifest, with a bounded number of projects running concurrently. All the projects share
+one rate limiter, so that the requests sent to the model stay bounded whatever the
+concurrency. Projects run without interaction: the generated code is not executed, and
+the changes of improve mode are applied without confirmation. A project that fails is
+reported as such and does not stop the batch.
+
+A manifest lists the projects, with optional defaults and per-project overrides:
+
+    [defaults]
+    model = "gpt-4o"
+    temperature = 0.1
+    mode = "generate"       # or "improve"
+    prompt_file = "prompt"
+
+    [[projects]]
+    path = "projects/todo-app"
+
+    [[projects]]
+    path = "projects/legacy-api"
+    mode = "improve"
+    model = "gpt-4o-mini"
+
+Relative paths are relative to the manifest. In improve mode, the files are those
+selected in the project's file_selection.toml or, without one, the files most relevant
+to the prompt.
+
+For every project, the output directory gets a result.json and the token_usage.csv of
+the project; summary.json holds the results of all projects with the throughput and cost
+of the batch.
+
+Classes:
+    BatchProject: A project of the manifest, with its mode and model.
+    ProjectResult: The outcome, duration and token usage of a project.
+
+Functions:
+    load_manifest(manifest_path: Path) -> List[BatchProject]
+        Read the projects of a manifest.
+    run_project(project, rate_limiter, preprompts_holder, results_dir) -> ProjectResult
+        Generate or improve a project and write its result.
+    run_batch(projects, output_dir, concurrency, rate_limiter) -> dict
+        Run the projects concurrently and write their results and a summary.
+"""
+
+import json
+import re
+import time
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import toml
+import typer
+
+from gpt_engineer.applications.cli.cli_agent import CliAgent
+from gpt_engineer.applications.cli.file_selector import FileSelector
+from gpt_engineer.applications.cli.main import load_env_if_needed
+from gpt_engineer.core.ai import AI
+from gpt_engineer.core.base_execution_env import BaseExecutionEnv
+from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
+from gpt_engineer.core.default.disk_memory import DiskMemory
+from gpt_engineer.core.default.file_store import FileStore
+from gpt_engineer.core.default.paths import PREPROMPTS_PATH, memory_path
+from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.git import stage_uncommitted_to_git
+from gpt_engineer.core.preprompts_holder import PrepromptsHolder
+from gpt_engineer.core.prompt import Prompt
+from gpt_engineer.core.rate_limiter import RateLimiter
+from gpt_engineer.core.relevance_index import RelevanceIndex
+from gpt_engineer.core.token_usage import Tokenizer
+
+MODES = ("generate", "improve")
+# Tokens the files selected for a project in improve mode may take up, without a file list
+DEFAULT_FILE_TOKEN_BUDGET = 20000
+
+app = typer.Typer(context_settings={"help_option_names": ["-h", "--help"]})
+
+
+@dataclass
+class BatchProject:
+    """
+    A project of the manifest.
+
+    Attributes
+    ----------
+    path : Path
+        The project folder.
+    mode : str
+        "generate" or "improve".
+    model : str
+        The model the project runs with.
+    temperature : float
+        The temperature of the model.
+    prompt_file : str
+        The file of the project holding the prompt.
+    azure_endpoint : str
+        The Azure OpenAI endpoint, if any.
+    """
+
+    path: Path
+    mode: str = "generate"
+    model: str = "gpt-4o"
+    temperature: float = 0.1
+    prompt_file: str = "prompt"
+    azure_endpoint: str = ""
+
+
+@dataclass
+class ProjectResult:
+    """
+    The outcome of a project.
+
+    Attributes
+    ----------
+    path : str
+        The project folder.
+    mode : str
+        "generate" or "improve".
+    model : str
+        The model the project ran with.
+    status : str
+        "ok", "unchanged" when improve mode changed nothing, or "error".
+    duration : float
+        The seconds the project took.
+    prompt_tokens : int
+        The prompt tokens used by the project.
+    completion_tokens : int
+        The completion tokens used by the project.
+    cost : Optional[float]
+        The cost in USD of the tokens, None if the price of the model is unknown.
+    files : List[str]
+        The files written to the project.
+    error : str
+        The traceback of the failure, if any.
+    """
+
+    path: str
+    mode: str
+    model: str
+    status: str = "error"
+    duration: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: Optional[float] = None
+    files: List[str] = field(default_factory=list)
+    error: str = ""
+
+
+def load_manifest(manifest_path: Path) -> List[BatchProject]:
+    """
+    Read the projects of a manifest, with the defaults applied.
+
+    Raises
+    ------
+    ValueError
+        If the manifest lists no project, or a project has no path or an unknown mode.
+    """
+    manifest = toml.load(manifest_path)
+    defaults = manifest.get("defaults", {})
+    projects = []
+    for entry in manifest.get("projects", []):
+        settings = {**defaults, **entry}
+        if "path" not in settings:
+            raise ValueError(f"A project of {manifest_path} has no path: {entry}")
+        path = Path(settings.pop("path")).expanduser()
+        if not path.is_absolute():
+            path = Path(manifest_path).parent / path
+        unknown = set(settings) - set(BatchProject.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"Unknown settings {sorted(unknown)} for project {path}")
+        project = BatchProject(path=path, **settings)
+        if project.mode not in MODES:
+            raise ValueError(f"Unknown mode {project.mode!r} for project {path}")
+        projects.append(project)
+    if not projects:
+        raise ValueError(f"No [[projects]] in {manifest_path}")
+    return projects
+
+
+def skip_execution(
+    ai: AI, execution_env: BaseExecutionEnv, files_dict: FilesDict, **kwargs
+) -> FilesDict:
+    """Does not run the generated code, which would need a user at the terminal."""
+    return files_dict
+
+
+def _select_files(project: BatchProject, prompt: Prompt) -> FilesDict:
+    selector = FileSelector(project.path)
+    if selector.FILE_LIST_NAME in selector.metadata_db:
+        files_dict, _ = selector.ask_for_files(skip_file_selection=True)
+        return files_dict
+    all_files = selector.filter_utf8_files(
+        project.path, selector.get_current_files(project.path)
+    )
+    index = RelevanceIndex(selector.metadata_db)
+    index.update(project.path, all_files)
+    selected_files = index.select(
+        prompt.text,
+        project.path,
+        DEFAULT_FILE_TOKEN_BUDGET,
+        Tokenizer(project.model).num_tokens,
+    )
+    if not selected_files:
+        raise ValueError(
+            f"No file of {project.path} matches the prompt, select files with `gpte -i`"
+        )
+    return selector.read_files(selected_files)
+
+
+def run_project(
+    project: BatchProject,
+    rate_limiter: Optional[RateLimiter] = None,
+    preprompts_holder: Optional[PrepromptsHolder] = None,
+    results_dir: Optional[Path] = None,
+    ai_factory: Callable[..., AI] = AI,
+) -> ProjectResult:
+    """
+    Generate or improve a project, catching any failure.
+
+    Parameters
+    ----------
+    project : BatchProject
+        The project to run.
+    rate_limiter : RateLimiter, optional
+        The limiter shared by the projects of the batch.
+    preprompts_holder : PrepromptsHolder, optional
+        The preprompts, the default ones if not given.
+    results_dir : Path, optional
+        The directory result.json and token_usage.csv of the project are written to.
+    ai_factory : Callable[..., AI], optional
+        Creates the AI of the project from the arguments of `AI`.
+
+    Returns
+    -------
+    ProjectResult
+        The outcome of the project.
+    """
+    result = ProjectResult(str(project.path), project.mode, project.model)
+    start = time.time()
+    ai = None
+    try:
+        ai = ai_factory(
+            model_name=project.model,
+            temperature=project.temperature,
+            azure_endpoint=project.azure_endpoint or None,
+            streaming=False,
+            rate_limiter=rate_limiter,
+        )
+        prompt_text = DiskMemory(project.path).get(project.prompt_file)
+        if not prompt_text:
+            raise FileNotFoundError(
+                f"No prompt in {project.path / project.prompt_file}"
+            )
+        prompt = Prompt(prompt_text)
+
+        memory = DiskMemory(memory_path(project.path))
+        memory.archive_logs()
+        agent = CliAgent.with_default_config(
+            memory,
+            DiskExecutionEnv(),
+            ai=ai,
+            process_code_fn=skip_execution,
+            preprompts_holder=preprompts_holder or PrepromptsHolder(PREPROMPTS_PATH),
+        )
+
+        improve_mode = project.mode == "improve"
+        if improve_mode:
+            files_dict_before = _select_files(project, prompt)
+            files_dict = agent.improve(files_dict_before, prompt)
+            changed = FilesDict(
+                {
+                    name: content
+                    for name, content in files_dict.items()
+                    if files_dict_before.get(name) != content
+                }
+            )
+        else:
+            files_dict = changed = agent.init(prompt)
+
+        if changed:
+            stage_uncommitted_to_git(project.path, changed, improve_mode)
+            FileStore(project.path).push(changed)
+        result.files = sorted(changed)
+        result.status = "ok" if changed or not improve_mode else "unchanged"
+    except Exception:
+        result.error = traceback.format_exc()
+    finally:
+        result.duration = time.time() - start
+        if ai is not None:
+            _add_usage(ai, result)
+        if results_dir is not None:
+            results_dir.mkdir(parents=True, exist_ok=True)
+            (results_dir / "result.json").write_text(
+                json.dumps(asdict(result), indent=2)
+            )
+            if ai is not None:
+                (results_dir / "token_usage.csv").write_text(
+                    ai.token_usage_log.format_log()
+                )
+    return result
+
+
+def _add_usage(ai: AI, result: ProjectResult) -> None:
+    usage_log = ai.token_usage_log
+    for usage in usage_log.log():
+        result.prompt_tokens += usage.in_step_prompt_tokens
+        result.completion_tokens += usage.in_step_completion_tokens
+    result.cost = usage_log.cost(result.prompt_tokens, result.completion_tokens)
+
+
+def _output_name(index: int, path: Path) -> str:
+    return f"{index:04d}-" + re.sub(r"[^\w.-]+", "_", Path(path).name)
+
+
+def run_batch(
+    projects: List[BatchProject],
+    output_dir: Path,
+    concurrency: int = 4,
+    rate_limiter: Optional[RateLimiter] = None,
+    ai_factory: Callable[..., AI] = AI,
+) -> dict:
+    """
+    Run the projects concurrently and write their results and a summary.
+
+    Parameters
+    ----------
+    projects : List[BatchProject]
+        The projects to run.
+    output_dir : Path
+        The directory the results are written to.
+    concurrency : int, optional
+        The number of projects running at the same time.
+    rate_limiter : RateLimiter, optional
+        The limiter shared by all projects, by default one allowing as many requests in
+        flight as projects running.
+    ai_factory : Callable[..., AI], optional
+        Creates the AI of every project.
+
+    Returns
+    -------
+    dict
+        The summary, also written to summary.json.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rate_limiter = rate_limiter or RateLimiter(concurrency)
+    preprompts_holder = PrepromptsHolder(PREPROMPTS_PATH)
+
+    def run(index: int, project: BatchProject) -> ProjectResult:
+        result = run_project(
+            project,
+            rate_limiter,
+            preprompts_holder,
+            output_dir / _output_name(index, project.path),
+            ai_factory,
+        )
+        if result.status == "error":
+            print(f"[{index}] {project.path} failed:\n{result.error}")
+        else:
+            print(f"[{index}] {project.path} {result.status} in {result.duration:.1f}s")
+        return result
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(run, range(len(projects)), projects))
+    wall_time = time.time() - start
+
+    summary = summarize(results, wall_time)
+    (output_dir / "summary.json").write_text(json.dumps(summary, indent=2))
+    return summary
+
+
+def summarize(results: List[ProjectResult], wall_time: float) -> dict:
+    """Summarize the results of a batch run in wall_time seconds."""
+    statuses = [result.status for result in results]
+    tokens = sum(r.prompt_tokens + r.completion_tokens for r in results)
+    costs = [r.cost for r in results if r.cost is not None]
+    return {
+        "projects": len(results),
+        "ok": statuses.count("ok"),
+        "unchanged": statuses.count("unchanged"),
+        "errors": statuses.count("error"),
+        "wall_time": wall_time,
+        "projects_per_minute": 60 * len(results) / wall_time if wall_time else None,
+        "prompt_tokens": sum(r.prompt_tokens for r in results),
+        "completion_tokens": sum(r.completion_tokens for r in results),
+        "tokens_per_second": tokens / wall_time if wall_time else None,
+        "cost": sum(costs) if costs else None,
+        "results": [asdict(result) for result in results],
+    }
+
+
+def format_summary(summary: dict) -> str:
+    """Format the totals of a summary."""
+    cost = "n/a" if summary["cost"] is None else f"${summary['cost']:.4f}"
+    return (
+        f"{summary['projects']} projects in {summary['wall_time']:.1f}s: "
+        f"{summary['ok']} ok, {summary['unchanged']} unchanged, "
+        f"{summary['errors']} errors\n"
+        f"Throughput: {summary['projects_per_minute'] or 0:.2f} projects/min, "
+        f"{summary['tokens_per_second'] or 0:.1f} tokens/s\n"
+        f"Tokens: {summary['prompt_tokens']} prompt, "
+        f"{summary['completion_tokens']} completion, cost: {cost}"
+    )
+
+
+@app.command(help="Generate or improve the projects of a manifest.")
+def main(
+    manifest: Path = typer.Argument(..., help="The TOML manifest of the projects."),
+    output_dir: Path = typer.Option(
+        Path("batch_results"), "--output-dir", "-o", help="Where results are written."
+    ),
+    concurrency: int = typer.Option(
+        4, "--concurrency", "-c", help="Projects running at the same time."
+    ),
+    max_requests: Optional[int] = typer.Option(
+        None,
+        "--max-requests",
+        help="Requests to the model in flight at the same time, the concurrency by default.",
+    ),
+    requests_per_minute: Optional[int] = typer.Option(
+        None, "--rpm", help="Requests to the model started per minute."
+    ),
+):
+    """
+    Generate or improve the projects of a manifest.
+
+    Parameters
+    ----------
+    manifest : Path
+        The TOML manifest listing the projects.
+    output_dir : Path
+        The directory the per-project results and the summary are written to.
+    concurrency : int
+        The number of projects running at the same time.
+    max_requests : int, optional
+        The number of requests to the model in flight at the same time.
+    requests_per_minute : int, optional
+        The number of requests to the model started per minute, unbounded by default.
+    """
+    load_env_if_needed()
+    projects = load_manifest(manifest)
+    rate_limiter = RateLimiter(max_requests or concurrency, requests_per_minute)
+    summary = run_batch(projects, output_dir, concurrency, rate_limiter)
+    print(format_summary(summary))
+    if summary["errors"]:
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    app()
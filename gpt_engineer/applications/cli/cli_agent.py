@@ -4,25 +4,31 @@ using an AI model. It includes functionalities to initialize code generation, im
 and process the code through various steps defined in the step bundle.
 """
 
-from typing import Callable, Optional, TypeVar
+from typing import Any, Callable, Dict, List, Optional, TypeVar
 
 # from gpt_engineer.core.default.git_version_manager import GitVersionManager
 from gpt_engineer.core.ai import AI
 from gpt_engineer.core.base_agent import BaseAgent
 from gpt_engineer.core.base_execution_env import BaseExecutionEnv
 from gpt_engineer.core.base_memory import BaseMemory
+from gpt_engineer.core.cassette_ai import cassette_ai_from_env
+from gpt_engineer.core.checkpoints import StepCheckpoints
+from gpt_engineer.core.default.candidates import gen_candidates
 from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
 from gpt_engineer.core.default.disk_memory import DiskMemory
 from gpt_engineer.core.default.paths import PREPROMPTS_PATH
+from gpt_engineer.core.default.simple_agent import combine_files
 from gpt_engineer.core.default.steps import (
     execute_entrypoint,
     gen_code,
+    gen_code_with_entrypoint,
     gen_entrypoint,
     improve_fn,
 )
 from gpt_engineer.core.files_dict import FilesDict
 from gpt_engineer.core.preprompts_holder import PrepromptsHolder
 from gpt_engineer.core.prompt import Prompt
+from gpt_engineer.core.step_graph import Step, StepGraph
 
 CodeGenType = TypeVar("CodeGenType", bound=Callable[[AI, str, BaseMemory], FilesDict])
 CodeProcessor = TypeVar(
@@ -62,6 +68,15 @@ class CliAgent(BaseAgent):
     preprompts_holder : PrepromptsHolder, optional
         An instance of PrepromptsHolder that manages preprompt templates. If not provided, a default
         instance is created using the PREPROMPTS_PATH.
+    checkpoints : StepCheckpoints, optional
+        Records the output of every step, and reuses it when resuming a run with unchanged inputs.
+        If not provided, steps are not checkpointed.
+    speculative_entrypoint : bool, optional
+        When the code is generated with `gen_code`, request the entrypoint while the code is still
+        streaming, see `gen_code_with_entrypoint`. Defaults to False.
+    candidates : int, optional
+        The number of candidate implementations generated concurrently for new projects, keeping the
+        first whose entrypoint runs successfully, see `gen_candidates`. Defaults to 1.
 
     Attributes
     ----------
@@ -79,6 +94,12 @@ class CliAgent(BaseAgent):
         The function used for processing code.
     preprompts_holder : PrepromptsHolder
         The holder for preprompt templates.
+    checkpoints : Optional[StepCheckpoints]
+        The checkpoints of the steps.
+    speculative_entrypoint : bool
+        Whether the entrypoint is requested while the code is still streaming.
+    candidates : int
+        The number of candidate implementations generated for new projects.
     """
 
     def __init__(
@@ -90,14 +111,20 @@ class CliAgent(BaseAgent):
         improve_fn: ImproveType = improve_fn,
         process_code_fn: CodeProcessor = execute_entrypoint,
         preprompts_holder: PrepromptsHolder = None,
+        checkpoints: Optional[StepCheckpoints] = None,
+        speculative_entrypoint: bool = False,
+        candidates: int = 1,
     ):
         self.memory = memory
         self.execution_env = execution_env
-        self.ai = ai or AI()
+        self.ai = ai or cassette_ai_from_env() or AI()
         self.code_gen_fn = code_gen_fn
         self.process_code_fn = process_code_fn
         self.improve_fn = improve_fn
         self.preprompts_holder = preprompts_holder or PrepromptsHolder(PREPROMPTS_PATH)
+        self.checkpoints = checkpoints
+        self.speculative_entrypoint = speculative_entrypoint
+        self.candidates = candidates
 
     @classmethod
     def with_default_config(
@@ -110,6 +137,9 @@ class CliAgent(BaseAgent):
         process_code_fn: CodeProcessor = execute_entrypoint,
         preprompts_holder: PrepromptsHolder = None,
         diff_timeout=3,
+        checkpoints: Optional[StepCheckpoints] = None,
+        speculative_entrypoint: bool = False,
+        candidates: int = 1,
     ):
         """
         Creates a new instance of CliAgent with default configurations for memory, execution environment,
@@ -133,6 +163,12 @@ class CliAgent(BaseAgent):
         preprompts_holder : PrepromptsHolder, optional
             An instance of PrepromptsHolder for managing preprompt templates. Defaults to None, which will
             create a new PrepromptsHolder instance using PREPROMPTS_PATH.
+        checkpoints : StepCheckpoints, optional
+            Records and, when resuming, reuses the outputs of the steps. Defaults to None.
+        speculative_entrypoint : bool, optional
+            Request the entrypoint while the code is still streaming. Defaults to False.
+        candidates : int, optional
+            The number of candidate implementations generated for new projects. Defaults to 1.
 
         Returns
         -------
@@ -147,12 +183,129 @@ class CliAgent(BaseAgent):
             process_code_fn=process_code_fn,
             improve_fn=improve_fn,
             preprompts_holder=preprompts_holder or PrepromptsHolder(PREPROMPTS_PATH),
+            checkpoints=checkpoints,
+            speculative_entrypoint=speculative_entrypoint,
+            candidates=candidates,
         )
 
+    def _run_step(self, step_name: str, inputs: list, step: Callable[[], FilesDict]):
+        """
+        Runs a step, through the checkpoints if any. The inputs identify the step's
+        output, along with the model settings and the preprompts which every step uses.
+        """
+        if self.checkpoints is None:
+            return step()
+        inputs = [
+            getattr(self.ai, "model_name", None),
+            getattr(self.ai, "temperature", None),
+            self.preprompts_holder.get_preprompts(),
+            *inputs,
+        ]
+        return self.checkpoints.run(step_name, inputs, step)
+
+    def _step(
+        self,
+        name: str,
+        inputs: List[str],
+        output: str,
+        fn: Callable[..., FilesDict],
+        key: Callable[[Dict[str, Any]], list],
+    ) -> Step:
+        """
+        A step of the init graph, run through the checkpoints. fn takes the inputs as
+        keyword arguments, key gives the checkpoint inputs from them.
+        """
+
+        def run(**values):
+            return self._run_step(name, key(values), lambda: fn(**values))
+
+        return Step(run, inputs=inputs, output=output, name=name)
+
+    def _init_graph(self) -> StepGraph:
+        """
+        The steps generating a codebase: the code, its entrypoint, then the processing
+        of both, e.g. running them. Candidates and speculative entrypoints generate the
+        code and its entrypoint in a single step.
+        """
+        if self.candidates > 1:
+            steps = [
+                self._step(
+                    "gen_candidates",
+                    ["prompt"],
+                    "combined_dict",
+                    lambda prompt: gen_candidates(
+                        self.ai,
+                        prompt,
+                        self.memory,
+                        self.preprompts_holder,
+                        self.candidates,
+                        code_gen_fn=self.code_gen_fn,
+                    )[0],
+                    lambda v: [self.code_gen_fn, v["prompt"], self.candidates],
+                )
+            ]
+        elif self.speculative_entrypoint and self.code_gen_fn is gen_code:
+            steps = [
+                self._step(
+                    "gen_code_with_entrypoint",
+                    ["prompt"],
+                    "combined_dict",
+                    lambda prompt: gen_code_with_entrypoint(
+                        self.ai, prompt, self.memory, self.preprompts_holder
+                    ),
+                    lambda v: [v["prompt"]],
+                )
+            ]
+        else:
+            steps = [
+                self._step(
+                    self.code_gen_fn.__name__,
+                    ["prompt"],
+                    "files_dict",
+                    lambda prompt: self.code_gen_fn(
+                        self.ai, prompt, self.memory, self.preprompts_holder
+                    ),
+                    lambda v: [self.code_gen_fn, v["prompt"]],
+                ),
+                self._step(
+                    "gen_entrypoint",
+                    ["prompt", "files_dict"],
+                    "entrypoint",
+                    lambda prompt, files_dict: gen_entrypoint(
+                        self.ai, prompt, files_dict, self.memory, self.preprompts_holder
+                    ),
+                    lambda v: [v["prompt"], v["files_dict"]],
+                ),
+                Step(
+                    combine_files,
+                    inputs=["files_dict", "entrypoint"],
+                    output="combined_dict",
+                ),
+            ]
+        steps.append(
+            self._step(
+                self.process_code_fn.__name__,
+                ["prompt", "combined_dict"],
+                "processed_dict",
+                lambda prompt, combined_dict: self.process_code_fn(
+                    self.ai,
+                    self.execution_env,
+                    combined_dict,
+                    preprompts_holder=self.preprompts_holder,
+                    prompt=prompt,
+                    memory=self.memory,
+                ),
+                lambda v: [self.process_code_fn, v["prompt"], v["combined_dict"]],
+            )
+        )
+        return StepGraph(steps)
+
     def init(self, prompt: Prompt) -> FilesDict:
         """
         Generates a new piece of code using the AI and step bundle based on the provided prompt.
 
+        The steps are run as a `StepGraph`, see `_init_graph`.
+
         Parameters
         ----------
         prompt : str
@@ -163,24 +316,7 @@ class CliAgent(BaseAgent):
         FilesDict
             An instance of the `FilesDict` class containing the generated code.
         """
-
-        files_dict = self.code_gen_fn(
-            self.ai, prompt, self.memory, self.preprompts_holder
-        )
-        entrypoint = gen_entrypoint(
-            self.ai, prompt, files_dict, self.memory, self.preprompts_holder
-        )
-        combined_dict = {**files_dict, **entrypoint}
-        files_dict = FilesDict(combined_dict)
-        files_dict = self.process_code_fn(
-            self.ai,
-            self.execution_env,
-            files_dict,
-            preprompts_holder=self.preprompts_holder,
-            prompt=prompt,
-            memory=self.memory,
-        )
-        return files_dict
+        return self._init_graph().run({"prompt": prompt})["processed_dict"]
 
     def improve(
         self,
@@ -188,6 +324,8 @@ class CliAgent(BaseAgent):
         prompt: Prompt,
         execution_command: Optional[str] = None,
         diff_timeout=3,
+        code_map=False,
+        targeted_retry=False,
     ) -> FilesDict:
         """
         Improves an existing piece of code using the AI and step bundle based on the provided prompt.
@@ -200,6 +338,12 @@ class CliAgent(BaseAgent):
             A string prompt that guides the code improvement process.
         execution_command : str, optional
             An optional command to execute the code. If not provided, the default execution command is used.
+        diff_timeout : int, optional
+            The timeout, in seconds, of the regexp searches when correcting diffs.
+        code_map : bool, optional
+            Send only the signatures of the functions and classes that are not relevant to the prompt.
+        targeted_retry : bool, optional
+            Retry failed diffs with only the failed hunks and windows of the affected files.
 
         Returns
         -------
@@ -207,13 +351,26 @@ class CliAgent(BaseAgent):
             An instance of the `FilesDict` class containing the improved code.
         """
 
-        files_dict = self.improve_fn(
-            self.ai,
-            prompt,
-            files_dict,
-            self.memory,
-            self.preprompts_holder,
-            diff_timeout=diff_timeout,
+        files_dict = self._run_step(
+            self.improve_fn.__name__,
+            [
+                self.improve_fn,
+                prompt,
+                files_dict,
+                diff_timeout,
+                code_map,
+                targeted_retry,
+            ],
+            lambda: self.improve_fn(
+                self.ai,
+                prompt,
+                files_dict,
+                self.memory,
+                self.preprompts_holder,
+                diff_timeout=diff_timeout,
+                code_map=code_map,
+                targeted_retry=targeted_retry,
+            ),
         )
         # entrypoint = gen_entrypoint(
         #     self.ai, prompt, files_dict, self.memory, self.preprompts_holder
@@ -0,0 +1,344 @@
+"""
+Resident gpte daemon.
+
+Starting `gpte` costs the interpreter start and, above all, the imports of langchain,
+openai, tiktoken and black, before any work is done. The daemon pays these once: it
+imports the CLI, loads the tokenizer and the preprompts, then listens on a Unix socket.
+For every request it forks a child, which inherits the warm interpreter and runs the
+`gpte` command in the working directory and with the environment of the client.
+
+The thin client, `gpte-client`, takes the same arguments as `gpte`. It hands its own
+standard input, output and error to the daemon over the socket, so that the command
+reads from and writes to the client terminal directly, and exits with the exit code of
+the command. When no daemon is listening, it runs the command in-process.
+
+The socket lives in a directory of the user, $XDG_RUNTIME_DIR or a private directory of
+the temp dir, and can only be opened by the user running the daemon. The daemon checks
+the user of every client, and the client checks that the socket and the daemon belong
+to the same user before sending anything, where the platform reports the peer
+credentials. Only the environment variables gpte needs are sent to the daemon.
+
+Functions:
+    serve(socket_path: str) -> None
+        Run the daemon until interrupted.
+    run_client(argv: List[str], socket_path: str) -> Optional[int]
+        Run a gpte command through the daemon.
+    daemon_main() -> None
+        Entry point of `gpte-daemon`.
+    client_main() -> None
+        Entry point of `gpte-client`.
+"""
+
+import json
+import os
+import signal
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import traceback
+
+from typing import List, Optional
+
+SOCKET_ENV_VAR = "GPTE_DAEMON_SOCKET"
+# Length prefix of the request
+_HEADER = struct.Struct("!I")
+_MAX_REQUEST_SIZE = 16 * 1024 * 1024
+# The environment variables the client sends to the daemon, by name and by prefix
+_FORWARDED_ENV_VARS = {
+    "PATH",
+    "HOME",
+    "USER",
+    "LOGNAME",
+    "SHELL",
+    "LANG",
+    "TZ",
+    "TMPDIR",
+    "TERM",
+    "COLUMNS",
+    "LINES",
+    "NO_COLOR",
+    "EDITOR",
+    "VISUAL",
+    "VIRTUAL_ENV",
+    "MODEL_NAME",
+    "LOCAL_MODEL",
+    "SSL_CERT_FILE",
+    "REQUESTS_CA_BUNDLE",
+    "HTTP_PROXY",
+    "HTTPS_PROXY",
+    "NO_PROXY",
+    "http_proxy",
+    "https_proxy",
+    "no_proxy",
+}
+_FORWARDED_ENV_PREFIXES = (
+    "GPTE_",
+    "OPENAI_",
+    "AZURE_OPENAI_",
+    "ANTHROPIC_",
+    "LANGCHAIN_",
+    "TIKTOKEN_",
+    "XDG_",
+    "LC_",
+)
+
+
+def default_socket_path() -> str:
+    """
+    The socket of the daemon: $GPTE_DAEMON_SOCKET, or gpte.sock in $XDG_RUNTIME_DIR, or
+    in a directory of the user in the temp dir.
+    """
+    if os.environ.get(SOCKET_ENV_VAR):
+        return os.environ[SOCKET_ENV_VAR]
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "gpte.sock")
+    return os.path.join(tempfile.gettempdir(), f"gpte-{os.getuid()}", "gpte.sock")
+
+
+def _forwarded_env(environ) -> dict:
+    """The variables of an environment the command run by the daemon needs."""
+    return {
+        key: value
+        for key, value in environ.items()
+        if key in _FORWARDED_ENV_VARS or key.startswith(_FORWARDED_ENV_PREFIXES)
+    }
+
+
+def _is_own_socket(path: str) -> bool:
+    """Whether path is a socket of the current user, and not e.g. a planted symlink."""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(st.st_mode) and st.st_uid == os.getuid()
+
+
+def _warm_up() -> None:
+    """Import and load, in the daemon, everything the children should inherit."""
+    import gpt_engineer.applications.cli.main  # noqa: F401
+    import gpt_engineer.core.linting  # noqa: F401
+
+    from gpt_engineer.core.default.paths import PREPROMPTS_PATH
+    from gpt_engineer.core.preprompts_holder import PrepromptsHolder
+    from gpt_engineer.core.token_usage import Tokenizer
+
+    PrepromptsHolder(PREPROMPTS_PATH).get_preprompts()
+    try:
+        Tokenizer(os.environ.get("MODEL_NAME", "gpt-4o")).num_tokens("warm up")
+    except Exception as e:
+        # e.g. the encoding cannot be downloaded, the children will retry
+        print(f"Could not load the tokenizer: {e!r}", file=sys.stderr)
+
+
+def _recv_request(conn: socket.socket) -> tuple:
+    data, fds, _, _ = socket.recv_fds(conn, 65536, 3)
+    if len(fds) != 3 or len(data) < _HEADER.size:
+        raise ValueError("Malformed request")
+    (length,) = _HEADER.unpack_from(data)
+    if length > _MAX_REQUEST_SIZE:
+        raise ValueError("Request too large")
+    data = data[_HEADER.size :]
+    while len(data) < length:
+        chunk = conn.recv(length - len(data))
+        if not chunk:
+            raise ValueError("Truncated request")
+        data += chunk
+    return json.loads(data), fds
+
+
+def _peer_is_owner(conn: socket.socket) -> bool:
+    """Whether the other end of a connection runs as the current user."""
+    if not hasattr(socket, "SO_PEERCRED"):
+        # the permissions of the socket and its directory still restrict access
+        return True
+    creds = conn.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+    )
+    _, uid, _ = struct.unpack("3i", creds)
+    return uid == os.getuid()
+
+
+def _run_child(conn: socket.socket, request: dict, fds: List[int]) -> None:
+    """Run a request in a forked child, never returns."""
+    code = 1
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        for target, fd in enumerate(fds):
+            if fd != target:
+                os.dup2(fd, target)
+                os.close(fd)
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", buffering=1, closefd=False)
+        sys.stderr = open(2, "w", buffering=1, closefd=False)
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        conn.sendall(json.dumps({"pid": os.getpid()}).encode() + b"\n")
+
+        from gpt_engineer.applications.cli.main import app
+
+        try:
+            app(args=request["argv"], prog_name="gpte")
+            code = 0
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except KeyboardInterrupt:
+            code = 130
+        except BaseException:
+            traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            conn.sendall(json.dumps({"exit": code}).encode() + b"\n")
+        finally:
+            os._exit(code)
+
+
+def serve(socket_path: Optional[str] = None) -> None:
+    """
+    Run the daemon until interrupted.
+
+    Parameters
+    ----------
+    socket_path : str, optional
+        The Unix socket to listen on, `default_socket_path()` by default.
+    """
+    socket_path = socket_path or default_socket_path()
+    socket_dir = os.path.dirname(os.path.abspath(socket_path))
+    os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+    if os.lstat(socket_dir).st_uid != os.getuid():
+        # another user could replace the socket with their own
+        raise SystemExit(f"{socket_dir} does not belong to the current user")
+    if os.path.lexists(socket_path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+            raise SystemExit(f"A gpte daemon is already listening on {socket_path}")
+        except OSError:
+            # a stale socket of a daemon that did not shut down cleanly
+            os.unlink(socket_path)
+        finally:
+            probe.close()
+
+    _warm_up()
+    # children are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(old_umask)
+    server.listen()
+    print(f"gpte daemon listening on {socket_path}", flush=True)
+    try:
+        while True:
+            conn, _ = server.accept()
+            fds: List[int] = []
+            try:
+                if not _peer_is_owner(conn):
+                    continue
+                request, fds = _recv_request(conn)
+                if os.fork() == 0:
+                    server.close()
+                    _run_child(conn, request, fds)
+            except (OSError, ValueError) as e:
+                print(f"Rejected a request: {e!r}", file=sys.stderr)
+            finally:
+                for fd in fds:
+                    os.close(fd)
+                conn.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def run_client(argv: List[str], socket_path: Optional[str] = None) -> Optional[int]:
+    """
+    Run a gpte command through the daemon.
+
+    The request holds API keys and hands over the terminal, so it is only sent to a
+    socket, and a daemon, of the current user.
+
+    Returns
+    -------
+    Optional[int]
+        The exit code of the command, or None if no daemon of the user is listening.
+    """
+    socket_path = socket_path or default_socket_path()
+    if not os.path.lexists(socket_path):
+        return None
+    if not _is_own_socket(socket_path):
+        print(
+            f"Ignoring {socket_path}, which is not a socket of the current user",
+            file=sys.stderr,
+        )
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        if not _peer_is_owner(sock):
+            print(
+                f"Ignoring {socket_path}, the daemon runs as another user",
+                file=sys.stderr,
+            )
+            sock.close()
+            return None
+    except OSError:
+        sock.close()
+        return None
+
+    payload = json.dumps(
+        {"argv": argv, "cwd": os.getcwd(), "env": _forwarded_env(os.environ)}
+    ).encode()
+    data = _HEADER.pack(len(payload)) + payload
+    sent = socket.send_fds(sock, [data], [0, 1, 2])
+    sock.sendall(data[sent:])
+
+    pid = None
+    buffer = b""
+    code = 1
+    with sock:
+        while True:
+            try:
+                chunk = sock.recv(4096)
+            except KeyboardInterrupt:
+                # the command runs outside of the terminal's process group
+                if pid is not None:
+                    os.kill(pid, signal.SIGINT)
+                continue
+            if not chunk:
+                break
+            buffer += chunk
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                message = json.loads(line)
+                pid = message.get("pid", pid)
+                code = message.get("exit", code)
+    return code
+
+
+def daemon_main() -> None:
+    """Entry point of `gpte-daemon`: `gpte-daemon [SOCKET_PATH]`."""
+    serve(sys.argv[1] if len(sys.argv) > 1 else None)
+
+
+def client_main() -> None:
+    """Entry point of `gpte-client`, which takes the arguments of `gpte`."""
+    code = run_client(sys.argv[1:])
+    if code is None:
+        from gpt_engineer.applications.cli.main import app
+
+        app(args=sys.argv[1:], prog_name="gpte")
+    sys.exit(code)
@@ -17,19 +17,29 @@ It operates within the GPT-Engineer environment, relying on core functionalities
 file handling and persistence.
 """
 
+import codecs
 import fnmatch
+import json
 import os
 import subprocess
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, Generator, List, Union
+from typing import Any, Callable, Dict, Generator, List, Tuple, Union
 
 import toml
 
 from gpt_engineer.core.default.disk_memory import DiskMemory
 from gpt_engineer.core.default.paths import metadata_path
 from gpt_engineer.core.files_dict import FilesDict
-from gpt_engineer.core.git import filter_by_gitignore, is_git_repo
+from gpt_engineer.core.git import (
+    GitignoreSpec,
+    filter_by_gitignore,
+    find_git_root,
+    is_ignored,
+)
+from gpt_engineer.core.profiling import INTERACTIVE_CATEGORY, profiled
+from gpt_engineer.core.relevance_index import RelevanceIndex
 
 
 class FileSelector:
@@ -48,6 +58,10 @@ class FileSelector:
         The name of the file that stores the selected files list.
     COMMENT : str
         The comment string to be added to the top of the file selection list.
+    UTF8_CACHE_NAME : str
+        The name of the file that caches which project files are UTF-8 encoded.
+    UTF8_CHECK_BYTES : int
+        The number of leading bytes read to decide whether a file is UTF-8 encoded.
     """
 
     IGNORE_FOLDERS = {"site-packages", "node_modules", "venv", "__pycache__"}
@@ -61,6 +75,8 @@ class FileSelector:
         "cost additional tokens and potentially overflow token limit.\n\n"
     )
     LINTING_STRING = '[linting]\n# "linting" = "off"\n\n'
+    UTF8_CACHE_NAME = "utf8_cache.json"
+    UTF8_CHECK_BYTES = 8192
     is_linting = True
 
     def __init__(self, project_path: Union[str, Path]):
@@ -76,6 +92,7 @@ class FileSelector:
         self.metadata_db = DiskMemory(metadata_path(self.project_path))
         self.toml_path = self.metadata_db.path / self.FILE_LIST_NAME
 
+    @profiled()
     def ask_for_files(self, skip_file_selection=False) -> tuple[FilesDict, bool]:
         """
         Prompts the user to select files for context improvement.
@@ -104,6 +121,89 @@ class FileSelector:
             else:
                 selected_files = self.editor_file_selector(self.project_path, True)
 
+        return self.read_files(selected_files), self.is_linting
+
+    @profiled()
+    def auto_select_files(
+        self,
+        prompt: str,
+        token_budget: int,
+        num_tokens: Callable[[str], int],
+    ) -> tuple[FilesDict, bool]:
+        """
+        Selects the files most relevant to the prompt without user interaction.
+
+        The project files are ranked against the prompt with a lexical index persisted in
+        the project metadata, and the top files are taken as long as they fit in the
+        token budget. The selection is written to the .toml file, so that it can be
+        reviewed and reused with `--skip-file-selection`. If no file matches the prompt,
+        falls back on interactive selection.
+
+        Parameters
+        ----------
+        prompt : str
+            The prompt to rank the project files against.
+        token_budget : int
+            The maximum number of tokens the selected files may take up.
+        num_tokens : Callable[[str], int]
+            Counts the tokens of a text, e.g. `Tokenizer.num_tokens`.
+
+        Returns
+        -------
+        tuple[FilesDict, bool]
+            The selected files and their contents, and whether linting is enabled.
+        """
+        root_path = Path(self.project_path)
+        all_files = self.filter_utf8_files(root_path, self.get_current_files(root_path))
+
+        index = RelevanceIndex(self.metadata_db)
+        reindexed = index.update(root_path, all_files)
+        print(f"Indexed {reindexed} new or changed files of {len(all_files)}")
+        selected_files = index.select(prompt, root_path, token_budget, num_tokens)
+        if not selected_files:
+            print("No file matches the prompt, please select files manually.")
+            return self.ask_for_files()
+
+        if self.FILE_LIST_NAME in self.metadata_db:
+            edited_tree = toml.load(self.toml_path)
+            if edited_tree.get("linting", {}).get("linting", "").lower() == "off":
+                self.is_linting = False
+                self.LINTING_STRING = '[linting]\n"linting" = "off"\n\n'
+
+        selected = set(selected_files)
+        lines = toml.dumps({"files": {x: "selected" for x in all_files}}).split("\n")
+        s = "\n".join(
+            lines[:1]
+            + [
+                line if line.split(" = ")[0].strip('"') in selected else "# " + line
+                for line in lines[1:]
+            ]
+        )
+        with open(self.toml_path, "w") as file:
+            file.write(self.COMMENT)
+            file.write(self.LINTING_STRING)
+            file.write(s)
+
+        print(f"\nSelected {len(selected_files)} files relevant to the prompt:")
+        for file in selected_files:
+            print(f"  {file}")
+        print(f"Edit {self.toml_path} and rerun with -s to change the selection.\n")
+        return self.read_files(selected_files), self.is_linting
+
+    def read_files(self, selected_files: List[str]) -> FilesDict:
+        """
+        Reads the selected files, skipping those that are missing or not UTF-8 encoded.
+
+        Parameters
+        ----------
+        selected_files : List[str]
+            The paths of the files, relative to the project path.
+
+        Returns
+        -------
+        FilesDict
+            A dictionary with file paths as keys and file contents as values.
+        """
         content_dict = {}
         for file_path in selected_files:
             # selected files contains paths that are relative to the project path
@@ -118,7 +218,7 @@ class FileSelector:
             except UnicodeDecodeError:
                 print(f"Warning: File not UTF-8 encoded {file_path}, skipping")
 
-        return FilesDict(content_dict), self.is_linting
+        return FilesDict(content_dict)
 
     def editor_file_selector(
         self, input_path: Union[str, Path], init: bool = True
@@ -146,7 +246,12 @@ class FileSelector:
 
         # Initialize .toml file with file tree if in initial state
         if init:
-            tree_dict = {x: "selected" for x in self.get_current_files(root_path)}
+            tree_dict = {
+                x: "selected"
+                for x in self.filter_utf8_files(
+                    root_path, self.get_current_files(root_path)
+                )
+            }
 
             s = toml.dumps({"files": tree_dict})
 
@@ -165,7 +270,9 @@ class FileSelector:
 
         else:
             # Load existing files from the .toml configuration
-            all_files = self.get_current_files(root_path)
+            all_files = self.filter_utf8_files(
+                root_path, self.get_current_files(root_path)
+            )
             s = toml.dumps({"files": {x: "selected" for x in all_files}})
 
             # get linting status from the toml file
@@ -209,6 +316,8 @@ class FileSelector:
             input_path, toml_file
         )  # Return the list of selected files after user edits
 
+    # the time spent editing the selection is the user's, not gpt-engineer's
+    @profiled(category=INTERACTIVE_CATEGORY)
     def open_with_default_editor(self, file_path: Union[str, Path]):
         """
         Opens a file with the system's default text editor.
@@ -250,6 +359,9 @@ class FileSelector:
         """
         Checks if the file at the given path is UTF-8 encoded.
 
+        Only the first UTF8_CHECK_BYTES bytes are read. Like git's binary detection,
+        a NUL byte in that chunk marks the file as binary.
+
         Parameters
         ----------
         file_path : Union[str, Path]
@@ -263,11 +375,78 @@ class FileSelector:
 
         try:
             with open(file_path, "rb") as file:
-                file.read().decode("utf-8")
-                return True
+                chunk = file.read(self.UTF8_CHECK_BYTES)
+                at_end = len(chunk) < self.UTF8_CHECK_BYTES or not file.read(1)
+        except OSError:
+            return False
+        if b"\0" in chunk:
+            return False
+        try:
+            # a multi-byte character cut off at the chunk boundary is not an error
+            codecs.getincrementaldecoder("utf-8")().decode(chunk, final=at_end)
+            return True
         except UnicodeDecodeError:
             return False
 
+    def filter_utf8_files(
+        self, project_path: Union[str, Path], files: List[str], max_workers: int = 8
+    ) -> List[str]:
+        """
+        Keeps the files that are UTF-8 encoded, the only ones that can be selected.
+
+        Verdicts are cached in the project metadata by path, size and modification time,
+        so unchanged files are not read again on later runs. Files that are not cached
+        are classified on a thread pool.
+
+        Parameters
+        ----------
+        project_path : Union[str, Path]
+            The path to the project directory the files are relative to.
+        files : List[str]
+            The relative paths of the candidate files.
+        max_workers : int, optional
+            The number of threads used to classify files that are not cached.
+
+        Returns
+        -------
+        List[str]
+            The UTF-8 encoded files, in the order they were given.
+        """
+        try:
+            cached = json.loads(self.metadata_db.get(self.UTF8_CACHE_NAME, "{}"))
+        except ValueError:
+            cached = {}
+
+        verdicts, stats, unknown = {}, {}, []
+        for file in files:
+            try:
+                st = os.stat(Path(project_path) / file)
+            except OSError:
+                continue
+            stats[file] = [st.st_size, st.st_mtime_ns]
+            if st.st_size == 0:
+                verdicts[file] = True
+            elif cached.get(file, [None, None])[:2] == stats[file]:
+                verdicts[file] = cached[file][2]
+            else:
+                unknown.append(file)
+
+        if unknown:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for file, verdict in zip(
+                    unknown,
+                    executor.map(
+                        lambda f: self.is_utf8(Path(project_path) / f), unknown
+                    ),
+                ):
+                    verdicts[file] = verdict
+
+        if unknown or len(cached) != len(stats):
+            self.metadata_db[self.UTF8_CACHE_NAME] = json.dumps(
+                {file: stats[file] + [verdicts[file]] for file in verdicts}
+            )
+        return [file for file in files if verdicts.get(file)]
+
     def get_files_from_toml(
         self, input_path: Union[str, Path], toml_file: Union[str, Path]
     ) -> List[str]:
@@ -376,45 +555,124 @@ class FileSelector:
                 return True
         return False
 
-    def get_current_files(self, project_path: Union[str, Path]) -> List[str]:
+    def get_current_files(
+        self, project_path: Union[str, Path], max_workers: int = 1
+    ) -> List[str]:
         """
         Generates a list of all files in the project directory. Will use .gitignore files if project_path is a git repository.
 
+        Ignored and hidden directories are pruned before they are descended into, and the
+        patterns of every .gitignore found on the way are applied during the walk.
+
         Parameters
         ----------
         project_path : Union[str, Path]
             The path to the project directory.
+        max_workers : int, optional
+            The number of threads used to walk the top-level subdirectories concurrently.
+            Defaults to 1, walking the tree in the calling thread.
 
         Returns
         -------
         List[str]
             A list of strings representing the relative paths of all files in the project directory.
         """
-        all_files = []
         project_path = Path(
             project_path
         ).resolve()  # Ensure path is absolute and resolved
 
-        file_list = project_path.glob("**/*")
-
-        for path in file_list:  # Recursively list all files
-            if path.is_file():
-                relpath = path.relative_to(project_path)
-                parts = relpath.parts
-                if any(part.startswith(".") for part in parts):
-                    continue  # Skip hidden files
-                if any(part in self.IGNORE_FOLDERS for part in parts):
-                    continue
-                if relpath.name == "prompt":
-                    continue  # Skip files named 'prompt'
+        specs = self._load_gitignore(project_path, "", [])
+        all_files, subdirs = self._scan_dir(project_path, "", specs)
 
-                all_files.append(str(relpath))
+        if max_workers > 1 and len(subdirs) > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for files in executor.map(
+                    lambda subdir: self._walk(project_path, [subdir], specs), subdirs
+                ):
+                    all_files.extend(files)
+        else:
+            all_files.extend(self._walk(project_path, subdirs, specs))
 
-        if is_git_repo(project_path) and "projects" not in project_path.parts:
+        if os.sep != "/":
+            all_files = [str(Path(f)) for f in all_files]
+
+        if find_git_root(project_path) is not None:
+            # one git call picks up the rules the walk cannot see: global excludes,
+            # .git/info/exclude and .gitignore files above the project directory
             all_files = filter_by_gitignore(project_path, all_files)
 
         return sorted(all_files, key=lambda x: Path(x).as_posix())
 
+    def _walk(
+        self,
+        root: Path,
+        subdirs: List[str],
+        specs: List[Tuple[str, GitignoreSpec]],
+    ) -> List[str]:
+        """
+        Walks the given directories (relative to root) depth first, returning the relative
+        paths of the files that are not filtered out.
+        """
+        files = []
+        stack = [(relpath, specs) for relpath in reversed(subdirs)]
+        while stack:
+            relpath, parent_specs = stack.pop()
+            dir_specs = self._load_gitignore(root / relpath, relpath, parent_specs)
+            dir_files, dir_subdirs = self._scan_dir(root / relpath, relpath, dir_specs)
+            files.extend(dir_files)
+            stack.extend((subdir, dir_specs) for subdir in reversed(dir_subdirs))
+        return files
+
+    def _scan_dir(
+        self,
+        path: Path,
+        relpath: str,
+        specs: List[Tuple[str, GitignoreSpec]],
+    ) -> Tuple[List[str], List[str]]:
+        """
+        Lists a single directory, returning the relative posix paths of its selectable files
+        and of the subdirectories that should be descended into.
+        """
+        files, subdirs = [], []
+        try:
+            entries = list(os.scandir(path))
+        except OSError:
+            return files, subdirs
+
+        for entry in entries:
+            name = entry.name
+            if name.startswith("."):
+                continue  # Skip hidden files and directories
+            if name in self.IGNORE_FOLDERS:
+                continue
+            entry_relpath = f"{relpath}/{name}" if relpath else name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                is_file = not is_dir and entry.is_file()
+            except OSError:
+                continue
+            if is_dir:
+                if not is_ignored(specs, entry_relpath, True):
+                    subdirs.append(entry_relpath)
+            elif is_file:
+                if name == "prompt":
+                    continue  # Skip files named 'prompt'
+                if not is_ignored(specs, entry_relpath, False):
+                    files.append(entry_relpath)
+        return files, subdirs
+
+    @staticmethod
+    def _load_gitignore(
+        path: Path, relpath: str, specs: List[Tuple[str, GitignoreSpec]]
+    ) -> List[Tuple[str, GitignoreSpec]]:
+        """
+        Returns the spec stack extended with the .gitignore in path, if there is one.
+        """
+        gitignore = path / ".gitignore"
+        if not gitignore.is_file():
+            return specs
+        return specs + [(relpath, GitignoreSpec.from_file(gitignore))]
+
 
 class DisplayablePath(object):
     """
@@ -46,7 +46,10 @@ from termcolor import colored
 from gpt_engineer.applications.cli.cli_agent import CliAgent
 from gpt_engineer.applications.cli.collect import collect_and_send_human_review
 from gpt_engineer.applications.cli.file_selector import FileSelector
+from gpt_engineer.core import profiling
 from gpt_engineer.core.ai import AI, ClipboardAI
+from gpt_engineer.core.cassette_ai import cassette_ai_from_env
+from gpt_engineer.core.checkpoints import StepCheckpoints
 from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
 from gpt_engineer.core.default.disk_memory import DiskMemory
 from gpt_engineer.core.default.file_store import FileStore
@@ -61,7 +64,13 @@ from gpt_engineer.core.files_dict import FilesDict
 from gpt_engineer.core.git import stage_uncommitted_to_git
 from gpt_engineer.core.preprompts_holder import PrepromptsHolder
 from gpt_engineer.core.prompt import Prompt
-from gpt_engineer.tools.custom_steps import clarified_gen, lite_gen, self_heal
+from gpt_engineer.core.token_usage import Tokenizer
+from gpt_engineer.tools.custom_steps import (
+    clarified_gen,
+    improve_fn_map_reduce,
+    lite_gen,
+    self_heal,
+)
 
 app = typer.Typer(
     context_settings={"help_option_names": ["-h", "--help"]}
@@ -194,8 +203,9 @@ def get_preprompts_path(use_custom_preprompts: bool, input_path: Path) -> Path:
     if not custom_preprompts_path.exists():
         custom_preprompts_path.mkdir()
 
+    existing = {file.name for file in custom_preprompts_path.iterdir()}
     for file in original_preprompts_path.glob("*"):
-        if not (custom_preprompts_path / file.name).exists():
+        if file.name not in existing:
             (custom_preprompts_path / file.name).write_text(file.read_text())
     return custom_preprompts_path
 
@@ -363,6 +373,16 @@ def main(
         "-s",
         help="Skip interactive file selection in improve mode and use the generated TOML file directly.",
     ),
+    auto_select_files: bool = typer.Option(
+        False,
+        "--auto-select-files",
+        help="In improve mode, select the files most relevant to the prompt automatically instead of interactively.",
+    ),
+    file_token_budget: int = typer.Option(
+        16000,
+        "--file-token-budget",
+        help="Maximum number of tokens the automatically selected files may take up. Default: 16000.",
+    ),
     no_execution: bool = typer.Option(
         False,
         "--no_execution",
@@ -378,6 +398,41 @@ def main(
         "--diff_timeout",
         help="Diff regexp timeout. Default: 3. Increase if regexp search timeouts.",
     ),
+    code_map: bool = typer.Option(
+        False,
+        "--code-map",
+        help="In improve mode, send full bodies only for the functions and classes relevant to the prompt, and signatures for the rest.",
+    ),
+    targeted_retry: bool = typer.Option(
+        False,
+        "--targeted-retry",
+        help="In improve mode, retry failed diffs with only the failed hunks and the affected parts of the files instead of the whole conversation.",
+    ),
+    map_reduce: bool = typer.Option(
+        False,
+        "--map-reduce",
+        help="In improve mode, plan the changes per file first, then edit the files concurrently.",
+    ),
+    speculative_entrypoint: bool = typer.Option(
+        False,
+        "--speculative-entrypoint",
+        help="Request the entrypoint while the code is still being generated, once the dependency file is written.",
+    ),
+    candidates: int = typer.Option(
+        1,
+        "--candidates",
+        help="Generate this many candidate implementations of a new project concurrently, and keep the first whose entrypoint runs successfully. Use with a temperature above 0.",
+    ),
+    resume: bool = typer.Option(
+        False,
+        "--resume",
+        help="Resume an interrupted run: reuse the checkpointed output of the steps that completed with the same inputs.",
+    ),
+    profile: bool = typer.Option(
+        False,
+        "--profile",
+        help="Time the steps and the requests to the model, and write a Chrome trace to the memory logs. Set GPTE_PROFILE=cprofile,tracemalloc to also profile the steps with cProfile and tracemalloc.",
+    ),
 ):
     """
     The main entry point for the CLI tool that generates or improves a project.
@@ -418,10 +473,30 @@ def main(
         Flag indicating whether to enable verbose logging.
     skip_file_selection: bool
         Skip interactive file selection in improve mode and use the generated TOML file directly
+    auto_select_files: bool
+        Select the files most relevant to the prompt automatically in improve mode, with a local lexical index.
+    file_token_budget: int
+        Maximum number of tokens the automatically selected files may take up.
     no_execution: bool
         Run setup but to not call LLM or write any code. For testing purposes.
     sysinfo: bool
         Flag indicating whether to output system information for debugging.
+    diff_timeout: int
+        Diff regexp timeout.
+    code_map: bool
+        Flag indicating whether to condense the selected files to the symbols relevant to the prompt in improve mode.
+    targeted_retry: bool
+        Flag indicating whether to retry failed diffs with a minimal conversation in improve mode.
+    map_reduce: bool
+        Flag indicating whether to plan the changes per file and edit the files concurrently in improve mode.
+    speculative_entrypoint: bool
+        Flag indicating whether to generate the entrypoint concurrently with the code of new projects.
+    candidates: int
+        Number of candidate implementations generated concurrently for new projects.
+    resume: bool
+        Flag indicating whether to skip the steps that completed with the same inputs in a previous run.
+    profile: bool
+        Flag indicating whether to time the steps of the run and write a trace of them, also enabled by GPTE_PROFILE.
 
     Returns
     -------
@@ -443,118 +518,152 @@ def main(
     if improve_mode and (clarify_mode or lite_mode):
         typer.echo("Error: Clarify and lite mode are not compatible with improve mode.")
         raise typer.Exit(code=1)
+    if candidates > 1 and clarify_mode:
+        typer.echo("Error: Clarify mode is not compatible with several candidates.")
+        raise typer.Exit(code=1)
 
     # Set up logging
     logging.basicConfig(level=logging.DEBUG if verbose else logging.INFO)
-    if use_cache:
-        set_llm_cache(SQLiteCache(database_path=".langchain.db"))
-    if improve_mode:
-        assert not (
-            clarify_mode or lite_mode
-        ), "Clarify and lite mode are not active for improve mode"
+    profiling.enable_from_env(force=profile)
+    try:
+        if use_cache:
+            set_llm_cache(SQLiteCache(database_path=".langchain.db"))
+        if improve_mode:
+            assert not (
+                clarify_mode or lite_mode
+            ), "Clarify and lite mode are not active for improve mode"
 
-    load_env_if_needed()
+        load_env_if_needed()
 
-    if llm_via_clipboard:
-        ai = ClipboardAI()
-    else:
-        ai = AI(
-            model_name=model,
-            temperature=temperature,
-            azure_endpoint=azure_endpoint,
+        if llm_via_clipboard:
+            ai = ClipboardAI()
+        else:
+            ai_kwargs = dict(
+                model_name=model,
+                temperature=temperature,
+                azure_endpoint=azure_endpoint,
+            )
+            # GPTE_CASSETTE records the requests to the model, or replays them offline
+            ai = cassette_ai_from_env(**ai_kwargs) or AI(**ai_kwargs)
+
+        path = Path(project_path)
+        print("Running gpt-engineer in", path.absolute(), "\n")
+
+        prompt = load_prompt(
+            DiskMemory(path),
+            improve_mode,
+            prompt_file,
+            image_directory,
+            entrypoint_prompt_file,
         )
 
-    path = Path(project_path)
-    print("Running gpt-engineer in", path.absolute(), "\n")
-
-    prompt = load_prompt(
-        DiskMemory(path),
-        improve_mode,
-        prompt_file,
-        image_directory,
-        entrypoint_prompt_file,
-    )
-
-    # todo: if ai.vision is false and not llm_via_clipboard - ask if they would like to use gpt-4-vision-preview instead? If so recreate AI
-    if not ai.vision:
-        prompt.image_urls = None
-
-    # configure generation function
-    if clarify_mode:
-        code_gen_fn = clarified_gen
-    elif lite_mode:
-        code_gen_fn = lite_gen
-    else:
-        code_gen_fn = gen_code
+        # todo: if ai.vision is false and not llm_via_clipboard - ask if they would like to use gpt-4-vision-preview instead? If so recreate AI
+        if not ai.vision:
+            prompt.image_urls = None
 
-    # configure execution function
-    if self_heal_mode:
-        execution_fn = self_heal
-    else:
-        execution_fn = execute_entrypoint
-
-    preprompts_holder = PrepromptsHolder(
-        get_preprompts_path(use_custom_preprompts, Path(project_path))
-    )
-
-    memory = DiskMemory(memory_path(project_path))
-    memory.archive_logs()
-
-    execution_env = DiskExecutionEnv()
-    agent = CliAgent.with_default_config(
-        memory,
-        execution_env,
-        ai=ai,
-        code_gen_fn=code_gen_fn,
-        improve_fn=improve_fn,
-        process_code_fn=execution_fn,
-        preprompts_holder=preprompts_holder,
-    )
-
-    files = FileStore(project_path)
-    if not no_execution:
-        if improve_mode:
-            files_dict_before, is_linting = FileSelector(project_path).ask_for_files(
-                skip_file_selection=skip_file_selection
-            )
+        # configure generation function
+        if clarify_mode:
+            code_gen_fn = clarified_gen
+        elif lite_mode:
+            code_gen_fn = lite_gen
+        else:
+            code_gen_fn = gen_code
 
-            # lint the code
-            if is_linting:
-                files_dict_before = files.linting(files_dict_before)
+        # configure improvement function
+        if map_reduce:
+            improve_code_fn = improve_fn_map_reduce
+        else:
+            improve_code_fn = improve_fn
 
-            files_dict = handle_improve_mode(
-                prompt, agent, memory, files_dict_before, diff_timeout=diff_timeout
-            )
-            if not files_dict or files_dict_before == files_dict:
-                print(
-                    f"No changes applied. Could you please upload the debug_log_file.txt in {memory.path}/logs folder in a github issue?"
+        # configure execution function
+        if self_heal_mode:
+            execution_fn = self_heal
+        else:
+            execution_fn = execute_entrypoint
+
+        preprompts_holder = PrepromptsHolder(
+            get_preprompts_path(use_custom_preprompts, Path(project_path))
+        )
+
+        memory = DiskMemory(memory_path(project_path))
+        memory.archive_logs()
+
+        execution_env = DiskExecutionEnv()
+        agent = CliAgent.with_default_config(
+            memory,
+            execution_env,
+            ai=ai,
+            code_gen_fn=code_gen_fn,
+            improve_fn=improve_code_fn,
+            process_code_fn=execution_fn,
+            preprompts_holder=preprompts_holder,
+            checkpoints=StepCheckpoints(memory, resume=resume),
+            speculative_entrypoint=speculative_entrypoint,
+            candidates=candidates,
+        )
+
+        files = FileStore(project_path)
+        if not no_execution:
+            if improve_mode:
+                if auto_select_files and not skip_file_selection:
+                    files_dict_before, is_linting = FileSelector(
+                        project_path
+                    ).auto_select_files(
+                        prompt.text, file_token_budget, Tokenizer(model).num_tokens
+                    )
+                else:
+                    files_dict_before, is_linting = FileSelector(
+                        project_path
+                    ).ask_for_files(skip_file_selection=skip_file_selection)
+
+                # lint the code
+                if is_linting:
+                    files_dict_before = files.linting(files_dict_before, cache=memory)
+
+                files_dict = handle_improve_mode(
+                    prompt,
+                    agent,
+                    memory,
+                    files_dict_before,
+                    diff_timeout=diff_timeout,
+                    code_map=code_map,
+                    targeted_retry=targeted_retry,
                 )
+                if not files_dict or files_dict_before == files_dict:
+                    print(
+                        f"No changes applied. Could you please upload the debug_log_file.txt in {memory.path}/logs folder in a github issue?"
+                    )
 
-            else:
-                print("\nChanges to be made:")
-                compare(files_dict_before, files_dict)
+                else:
+                    print("\nChanges to be made:")
+                    compare(files_dict_before, files_dict)
 
-                print()
-                print(colored("Do you want to apply these changes?", "light_green"))
-                if not prompt_yesno():
-                    files_dict = files_dict_before
+                    print()
+                    print(colored("Do you want to apply these changes?", "light_green"))
+                    if not prompt_yesno():
+                        files_dict = files_dict_before
 
-        else:
-            files_dict = agent.init(prompt)
-            # collect user feedback if user consents
-            config = (code_gen_fn.__name__, execution_fn.__name__)
-            collect_and_send_human_review(prompt, model, temperature, config, memory)
+            else:
+                files_dict = agent.init(prompt)
+                # collect user feedback if user consents
+                config = (code_gen_fn.__name__, execution_fn.__name__)
+                collect_and_send_human_review(
+                    prompt, model, temperature, config, memory
+                )
 
-        stage_uncommitted_to_git(path, files_dict, improve_mode)
+            stage_uncommitted_to_git(path, files_dict, improve_mode)
 
-        files.push(files_dict)
+            files.push(files_dict)
 
-    if ai.token_usage_log.is_openai_model():
-        print("Total api cost: $ ", ai.token_usage_log.usage_cost())
-    elif os.getenv("LOCAL_MODEL"):
-        print("Total api cost: $ 0.0 since we are using local LLM.")
-    else:
-        print("Total tokens used: ", ai.token_usage_log.total_tokens())
+        if ai.token_usage_log.is_openai_model():
+            print("Total api cost: $ ", ai.token_usage_log.usage_cost())
+        elif os.getenv("LOCAL_MODEL"):
+            print("Total api cost: $ 0.0 since we are using local LLM.")
+        else:
+            print("Total tokens used: ", ai.token_usage_log.total_tokens())
+    finally:
+        # a failed run still writes the trace of the steps it ran
+        profiling.finish(Path(memory_path(project_path)) / "logs")
 
 
 if __name__ == "__main__":
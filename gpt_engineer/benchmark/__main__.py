@@ -2,8 +2,10 @@
 Main entry point for the benchmarking tool.
 
 This module provides a command-line interface for running benchmarks using Typer.
-It allows users to specify the path to an agent, the benchmark(s) to run, and other
-options such as verbosity.
+`bench run` runs benchmarks against an agent, with options such as verbosity,
+`bench compare` compares the results of two runs, and `bench import-dataset` imports a
+benchmark dataset into the shared dataset cache. For compatibility, `bench AGENT
+[CONFIG]` is the same as `bench run AGENT [CONFIG]`.
 
 Functions
 ---------
@@ -14,6 +16,15 @@ main : function
     The main function that runs the specified benchmarks with the given agent.
     Outputs the results to the console.
 
+compare_command : function
+    Compares the results of two benchmark runs and flags latency regressions.
+
+import_dataset_command : function
+    Imports a benchmark dataset into the shared cache, without network access.
+
+cli : function
+    The entry point of `bench`.
+
 Attributes
 ----------
 __name__ : str
@@ -23,6 +34,7 @@ import importlib
 import os.path
 import sys
 
+from pathlib import Path
 from typing import Annotated, Optional
 
 import typer
@@ -33,7 +45,22 @@ from langchain_community.cache import SQLiteCache
 from gpt_engineer.applications.cli.main import load_env_if_needed
 from gpt_engineer.benchmark.bench_config import BenchConfig
 from gpt_engineer.benchmark.benchmarks.load import get_benchmark
-from gpt_engineer.benchmark.run import export_yaml_results, print_results, run
+from gpt_engineer.benchmark.compare import (
+    compare_results,
+    format_comparison,
+    load_results,
+)
+from gpt_engineer.benchmark.dataset_cache import default_cache_dir, import_dataset
+from gpt_engineer.benchmark.result_store import ResultStore, run_fingerprint
+from gpt_engineer.benchmark.run import (
+    export_csv_results,
+    export_json_results,
+    export_yaml_results,
+    print_results,
+    run,
+    timing_percentiles,
+)
+from gpt_engineer.core import profiling
 
 app = typer.Typer(
     context_settings={"help_option_names": ["-h", "--help"]}
@@ -55,18 +82,20 @@ def get_agent(path):
         An instance of the imported default configuration agent.
     """
     # Dynamically import the python module at path
-    sys.path.append(os.path.dirname(path))
+    if os.path.dirname(path) not in sys.path:
+        sys.path.append(os.path.dirname(path))
     agent_module = importlib.import_module(path.replace("/", ".").replace(".py", ""))
     return agent_module.default_config_agent()
 
 
 @app.command(
+    "run",
     help="""
         Run any benchmark(s) against the specified agent.
 
         \b
         Currently available benchmarks are: apps and mbpp
-    """
+    """,
 )
 def main(
     path_to_agent: Annotated[
@@ -82,6 +111,20 @@ def main(
         Optional[str],
         typer.Option(help="print results for each task", show_default=False),
     ] = None,
+    json_output: Annotated[
+        Optional[str],
+        typer.Option(
+            help="JSON file the results and their percentiles are written to.",
+            show_default=False,
+        ),
+    ] = None,
+    csv_output: Annotated[
+        Optional[str],
+        typer.Option(
+            help="CSV file the p50/p90/p99 of the timings and token usage are written to.",
+            show_default=False,
+        ),
+    ] = None,
     verbose: Annotated[
         Optional[bool],
         typer.Option(help="print results for each task", show_default=False),
@@ -93,6 +136,24 @@ def main(
             show_default=False,
         ),
     ] = True,
+    workers: Annotated[
+        int,
+        typer.Option(
+            help="Number of tasks run concurrently, each with an agent and a sandbox of its own."
+        ),
+    ] = 1,
+    result_store: Annotated[
+        str,
+        typer.Option(
+            help="JSON Lines file the result of every task is appended to as it completes."
+        ),
+    ] = "bench_results.jsonl",
+    resume: Annotated[
+        bool,
+        typer.Option(
+            help="Skip the tasks completed in a previous run with the same agent, config and model, per the result store."
+        ),
+    ] = False,
 ):
     """
     The main function that runs the specified benchmarks with the given agent and outputs the results to the console.
@@ -105,10 +166,26 @@ def main(
         Configuration file for choosing which benchmark problems to run. See default config for more details.
     yaml_output: Optional[str], default=None
         Pass a path to a yaml file to have results written to file.
+    json_output: Optional[str], default=None
+        Pass a path to a json file to have results written to file.
+    csv_output: Optional[str], default=None
+        Pass a path to a csv file to have the percentiles of the task timings and token
+        usage written to file.
     verbose : Optional[bool], default=False
         A flag to indicate whether to print results for each task.
     use_cache : Optional[bool], default=True
         Speeds up computations and saves tokens when running the same prompt multiple times by caching the LLM response.
+    workers : int, default=1
+        Number of tasks run concurrently, each with an agent and a sandbox of its own.
+    result_store : str, default=bench_results.jsonl
+        JSON Lines file the result of every task is appended to as it completes.
+    resume : bool, default=False
+        Skip the tasks completed in a previous run with the same agent, config and model, per the result store.
+
+    Setting the GPTE_PROFILE environment variable profiles the run, see
+    `gpt_engineer.core.profiling`: the trace is written next to the yaml output, or to
+    the working directory.
+
     Returns
     -------
     None
@@ -116,39 +193,202 @@ def main(
     if use_cache:
         set_llm_cache(SQLiteCache(database_path=".langchain.db"))
     load_env_if_needed()
-    config = BenchConfig.from_toml(bench_config)
-    print("using config file: " + bench_config)
-    benchmarks = list()
-    benchmark_results = dict()
-    for specific_config_name in vars(config):
-        specific_config = getattr(config, specific_config_name)
-        if hasattr(specific_config, "active"):
-            if specific_config.active:
-                benchmarks.append(specific_config_name)
-
-    for benchmark_name in benchmarks:
-        benchmark = get_benchmark(benchmark_name, config)
-        if len(benchmark.tasks) == 0:
+    profiling.enable_from_env()
+    try:
+        config = BenchConfig.from_toml(bench_config)
+        print("using config file: " + bench_config)
+        benchmarks = list()
+        benchmark_results = dict()
+        for specific_config_name in vars(config):
+            specific_config = getattr(config, specific_config_name)
+            if hasattr(specific_config, "active"):
+                if specific_config.active:
+                    benchmarks.append(specific_config_name)
+
+        for benchmark_name in benchmarks:
+            benchmark = get_benchmark(benchmark_name, config)
+            if len(benchmark.tasks) == 0:
+                print(
+                    benchmark_name
+                    + " was skipped, since no tasks are specified. Increase the number of tasks in the config file at: "
+                    + bench_config
+                )
+                continue
+            agent = get_agent(path_to_agent)
+            model = getattr(
+                getattr(agent, "ai", None),
+                "model_name",
+                os.environ.get("MODEL_NAME", ""),
+            )
+            store = ResultStore(
+                result_store,
+                run_fingerprint(
+                    path_to_agent, config.to_dict()[benchmark_name], str(model)
+                ),
+            )
+
+            results = run(
+                agent,
+                benchmark,
+                verbose=verbose,
+                workers=workers,
+                agent_factory=lambda: get_agent(path_to_agent),
+                result_store=store,
+                resume=resume,
+            )
             print(
-                benchmark_name
-                + " was skipped, since no tasks are specified. Increase the number of tasks in the config file at: "
-                + bench_config
+                f"\n--- Results for agent {path_to_agent}, benchmark: {benchmark_name} ---"
             )
-            continue
-        agent = get_agent(path_to_agent)
-
-        results = run(agent, benchmark, verbose=verbose)
-        print(
-            f"\n--- Results for agent {path_to_agent}, benchmark: {benchmark_name} ---"
-        )
-        print_results(results)
-        print()
-        benchmark_results[benchmark_name] = {
-            "detailed": [result.to_dict() for result in results]
-        }
-    if yaml_output is not None:
-        export_yaml_results(yaml_output, benchmark_results, config.to_dict())
+            print_results(results)
+            print()
+            benchmark_results[benchmark_name] = {
+                "detailed": [result.to_dict() for result in results],
+                "percentiles": timing_percentiles(results),
+            }
+        if yaml_output is not None:
+            export_yaml_results(yaml_output, benchmark_results, config.to_dict())
+        if json_output is not None:
+            export_json_results(json_output, benchmark_results, config.to_dict())
+        if csv_output is not None:
+            export_csv_results(csv_output, benchmark_results)
+    finally:
+        # a failed run still writes the trace of the tasks it ran
+        profiling.finish(Path(yaml_output).parent if yaml_output else Path.cwd())
+
+
+@app.command(
+    "compare",
+    help="Compare the results of two benchmark runs and flag latency regressions.",
+)
+def compare_command(
+    baseline: Annotated[
+        Path,
+        typer.Argument(
+            help="results of the baseline run: a yaml or json export, or a jsonl result store"
+        ),
+    ],
+    candidate: Annotated[
+        Path,
+        typer.Argument(help="results of the candidate run, in any of the same formats"),
+    ],
+    alpha: Annotated[
+        float, typer.Option(help="significance level of the latency tests")
+    ] = 0.05,
+    threshold: Annotated[
+        float,
+        typer.Option(help="relative slowdown below which no regression is flagged"),
+    ] = 0.1,
+    baseline_fingerprint: Annotated[
+        Optional[str],
+        typer.Option(
+            help="only compare the records of the baseline result store with this fingerprint",
+            show_default=False,
+        ),
+    ] = None,
+    candidate_fingerprint: Annotated[
+        Optional[str],
+        typer.Option(
+            help="only compare the records of the candidate result store with this fingerprint",
+            show_default=False,
+        ),
+    ] = None,
+):
+    """
+    Compares the results of two benchmark runs, task by task, and flags latency
+    regressions, see `gpt_engineer.benchmark.compare`.
+
+    Parameters
+    ----------
+    baseline : Path
+        The results of the baseline run: a yaml or json export, or a jsonl result store.
+    candidate : Path
+        The results of the candidate run, in any of the same formats.
+    alpha : float, default=0.05
+        The significance level of the latency tests.
+    threshold : float, default=0.1
+        The relative slowdown below which no regression is flagged.
+    baseline_fingerprint : Optional[str], default=None
+        Only compare the records of the baseline result store with this fingerprint.
+    candidate_fingerprint : Optional[str], default=None
+        Only compare the records of the candidate result store with this fingerprint.
+
+    Exits with code 1 when a latency regression is flagged, so that releases can be
+    gated on the comparison.
+
+    Returns
+    -------
+    None
+    """
+    comparisons = compare_results(
+        load_results(baseline, baseline_fingerprint),
+        load_results(candidate, candidate_fingerprint),
+        alpha=alpha,
+        threshold=threshold,
+    )
+    if not comparisons:
+        typer.echo("Error: the runs have no benchmark in common")
+        raise typer.Exit(code=2)
+    print(format_comparison(comparisons))
+    regressions = [c.name for c in comparisons if c.regression or c.task_regressions]
+    if regressions:
+        print("Latency regressions in: " + ", ".join(regressions))
+        raise typer.Exit(code=1)
+
+
+@app.command(
+    "import-dataset",
+    help="Import a benchmark dataset into the shared cache from an archive, offline.",
+)
+def import_dataset_command(
+    name: Annotated[str, typer.Argument(help="name of the dataset, e.g. apps or mbpp")],
+    source: Annotated[
+        Path,
+        typer.Argument(
+            help="zip or tar archive, or directory, of a dataset saved with save_to_disk"
+        ),
+    ],
+    cache_dir: Annotated[
+        Optional[Path],
+        typer.Option(
+            help="dataset cache directory, $GPTE_DATASET_CACHE or ~/.cache/gpt-engineer/datasets by default",
+            show_default=False,
+        ),
+    ] = None,
+):
+    """
+    Imports a benchmark dataset into the shared cache, without network access.
+
+    Parameters
+    ----------
+    name : str
+        The name of the dataset, e.g. apps or mbpp.
+    source : Path
+        A zip or tar archive, or a directory, holding a dataset saved with `save_to_disk`.
+    cache_dir : Optional[Path], default=None
+        The dataset cache directory, `default_cache_dir()` by default.
+
+    Returns
+    -------
+    None
+    """
+    try:
+        path = import_dataset(name, source, cache_dir or default_cache_dir())
+    except ValueError as e:
+        typer.echo(f"Error: {e}")
+        raise typer.Exit(code=1)
+    print(f"Imported {name} version {path.name} into {path.parent}")
+
+
+def cli():
+    """
+    The entry point of `bench`, which runs `bench run` when no command is given.
+    """
+    args = sys.argv[1:]
+    commands = {command.name for command in app.registered_commands}
+    if args and args[0] not in commands and not args[0].startswith("-"):
+        args = ["run"] + args
+    app(args=args, prog_name="bench")
 
 
 if __name__ == "__main__":
-    typer.run(main)
+    cli()
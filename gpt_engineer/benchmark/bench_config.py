@@ -14,6 +14,13 @@ class AppsConfig:
     train_start_index: int | None = 0
     train_end_index: int | None = 0
     examples_per_problem: int | None = 10
+    # Examples of a problem run concurrently in the sandbox of the task
+    assertion_workers: int | None = 4
+    # Stop running the examples of a problem once one fails, counting the rest as failed
+    fast_fail: bool | None = False
+    # Limits of the process running an example, in CPU seconds and MB of address space
+    cpu_time_limit: int | None = 10
+    memory_limit_mb: int | None = 1024
 
 
 @dataclass
@@ -10,53 +10,96 @@ Functions
 load_apps : function
     Loads the APPS benchmark, which consists of a series coding problems.
 """
+import time
+
 from pathlib import Path
 from subprocess import TimeoutExpired
-from typing import Union
+from typing import Optional, Union
 
 from datasets import Dataset, DatasetDict, load_dataset, load_from_disk
 
 from gpt_engineer.benchmark.bench_config import AppsConfig
 from gpt_engineer.benchmark.benchmarks.apps.problem import Problem
+from gpt_engineer.benchmark.dataset_cache import load_cached_dataset, store_dataset
 from gpt_engineer.benchmark.types import Assertable, Benchmark, Task
-from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
+from gpt_engineer.core.default.disk_execution_env import kill_process_group
 from gpt_engineer.core.files_dict import FilesDict
 from gpt_engineer.core.prompt import Prompt
 
+DATASET_NAME = "apps"
 DATASET_PATH = Path(__file__).parent / "dataset"
+# how often a running example checks whether the other examples failed
+CANCEL_POLL_INTERVAL = 0.1
 
 
 class AppsAssertion:
-    def __init__(self, expected: str, command: str):
+    def __init__(
+        self,
+        expected: str,
+        command: str,
+        timeout: float = 2,
+        cpu_time_limit: Optional[int] = None,
+        memory_limit_mb: Optional[int] = None,
+    ):
         self.expected_output = self._format(expected)
         self.command = command
+        self.timeout = timeout
+        self.cpu_time_limit = cpu_time_limit
+        self.memory_limit_mb = memory_limit_mb
 
     def evaluate(self, assertable: Assertable) -> bool:
-        # Create new execution environment for every run to avoid side effects
-        env = DiskExecutionEnv()
-        env.upload(assertable.files)
-        pro = env.popen(self.command)
-        try:
-            stdout, stderr = pro.communicate(timeout=2)
-            stdout, stderr = stdout.decode("utf-8"), stderr.decode("utf-8")
-        except TimeoutExpired:
-            print("Execution Timeout")
-            return False
+        # The examples of a problem only read their arguments and write to stdout, so
+        # they share the sandbox the code was uploaded to, and can run concurrently
+        pro = assertable.env.popen(self._limited(self.command), new_session=True)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            if assertable.cancelled is not None and assertable.cancelled.is_set():
+                kill_process_group(pro)
+                return False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                kill_process_group(pro)
+                print("Execution Timeout")
+                return False
+            try:
+                # wake up regularly to notice a fast fail of another example
+                stdout, stderr = pro.communicate(
+                    timeout=min(remaining, CANCEL_POLL_INTERVAL)
+                )
+                break
+            except TimeoutExpired:
+                continue
+        stdout, stderr = stdout.decode("utf-8"), stderr.decode("utf-8")
 
         return self.expected_output in self._format(stdout)
 
+    def _limited(self, command: str) -> str:
+        limits = []
+        if self.cpu_time_limit:
+            limits.append(f"-t {self.cpu_time_limit}")
+        if self.memory_limit_mb:
+            limits.append(f"-v {self.memory_limit_mb * 1024}")
+        if not limits:
+            return command
+        # exec, so that killing the process on timeout kills the program
+        return f"ulimit {' '.join(limits)} && exec {command}"
+
     def _format(self, string: str) -> str:
         return string.replace(" ", "").replace("\n", "")
 
 
 def _get_dataset() -> Union[Dataset, DatasetDict]:
+    dataset = load_cached_dataset(DATASET_NAME)
+    if dataset is not None:
+        return dataset
     try:
+        # a copy saved in the checkout before the shared cache existed
         return load_from_disk(str(DATASET_PATH))
     except FileNotFoundError:
-        print("Dataset not found locally, downloading...")
+        print("Dataset not found in the cache, downloading...")
 
     dataset = load_dataset("codeparrot/apps", trust_remote_code=True)
-    dataset.save_to_disk(str(DATASET_PATH))
+    store_dataset(DATASET_NAME, dataset)
 
     return dataset
 
@@ -104,6 +147,8 @@ def load_apps(config: AppsConfig) -> Benchmark:
                     f"correct output {i}": AppsAssertion(
                         expected=problem.outputs[i],
                         command="python main.py" + ' "' + problem.inputs[i] + '"',
+                        cpu_time_limit=config.cpu_time_limit,
+                        memory_limit_mb=config.memory_limit_mb,
                     ).evaluate
                     for i in range(
                         min(len(problem.outputs), config.examples_per_problem)
@@ -115,4 +160,6 @@ def load_apps(config: AppsConfig) -> Benchmark:
     return Benchmark(
         name="apps",
         tasks=tasks,
+        assertion_workers=config.assertion_workers or 1,
+        fast_fail=bool(config.fast_fail),
     )
@@ -18,11 +18,13 @@ from datasets import Dataset, DatasetDict, load_dataset, load_from_disk
 
 from gpt_engineer.benchmark.bench_config import MbppConfig
 from gpt_engineer.benchmark.benchmarks.mbpp.problem import Problem
+from gpt_engineer.benchmark.dataset_cache import load_cached_dataset, store_dataset
 from gpt_engineer.benchmark.types import Assertable, Benchmark, Task
 from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
 from gpt_engineer.core.files_dict import FilesDict
 from gpt_engineer.core.prompt import Prompt
 
+DATASET_NAME = "mbpp"
 DATASET_PATH = Path(__file__).parent / "dataset"
 
 
@@ -50,13 +52,17 @@ class MbppAssertion:
 
 
 def _get_dataset() -> Union[Dataset, DatasetDict]:
+    dataset = load_cached_dataset(DATASET_NAME)
+    if dataset is not None:
+        return dataset
     try:
+        # a copy saved in the checkout before the shared cache existed
         return load_from_disk(str(DATASET_PATH))
     except FileNotFoundError:
-        print("Dataset not found locally, downloading...")
+        print("Dataset not found in the cache, downloading...")
 
     dataset = load_dataset("mbpp", "sanitized", trust_remote_code=True)
-    dataset.save_to_disk(str(DATASET_PATH))
+    store_dataset(DATASET_NAME, dataset)
 
     return dataset
 
@@ -0,0 +1,431 @@
+"""
+Module for comparing the results of two benchmark runs.
+
+The results of a baseline and a candidate run, exported with `export_yaml_results` or
+`export_json_results`, or appended to a `ResultStore`, are aligned by benchmark and task
+name. For every benchmark, the comparison reports the change in pass rate, duration and
+token usage, and flags latency regressions that are statistically significant:
+
+- across tasks, with a one-sided Wilcoxon signed-rank test on the durations of every
+  task in both runs, exact for small benchmarks without ties;
+- per task, when a result store holds repeated runs of the task, with a one-sided
+  Mann-Whitney U test on the durations of its runs.
+
+A regression is only flagged when it is also larger than a relative threshold, so that
+large benchmarks do not flag slowdowns too small to matter.
+
+Classes
+-------
+TaskComparison
+    The comparison of a task between the two runs.
+
+BenchmarkComparison
+    The comparison of a benchmark between the two runs.
+
+Functions
+---------
+load_results : function
+    Loads the task results of a YAML or JSON export, or of a JSON Lines result store.
+
+wilcoxon_signed_rank_test : function
+    One-sided p-value of paired samples being larger in the candidate.
+
+mann_whitney_u_test : function
+    One-sided p-value of a sample being larger than another.
+
+compare_results : function
+    Compares the results of two runs, benchmark by benchmark.
+
+format_comparison : function
+    Formats a comparison as a report for the console.
+"""
+import dataclasses
+import json
+import math
+import statistics
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import yaml
+
+from gpt_engineer.benchmark.types import TaskResult
+
+# Results of a run, by benchmark name and task name, with a result per repetition
+RunResults = Dict[str, Dict[str, List[TaskResult]]]
+# Below this many samples per run, a task is not tested on its own
+MIN_TASK_SAMPLES = 5
+# Up to this many pairs without ties, the signed-rank test is exact
+MAX_EXACT_PAIRS = 50
+
+
+def _task_result(record: dict) -> TaskResult:
+    fields = {f.name for f in dataclasses.fields(TaskResult)}
+    return TaskResult(**{key: value for key, value in record.items() if key in fields})
+
+
+def load_results(
+    path: Union[str, Path], fingerprint: Optional[str] = None
+) -> RunResults:
+    """
+    Loads the task results of a run.
+
+    Parameters
+    ----------
+    path : str or Path
+        A YAML or JSON export of `bench run`, or a JSON Lines result store, ending with
+        .jsonl, whose records of a task are all kept as repetitions of the task.
+    fingerprint : str, optional
+        Only load the records of a result store with this fingerprint, see
+        `run_fingerprint`.
+
+    Returns
+    -------
+    RunResults
+        The results by benchmark name and task name, in the order they were recorded.
+    """
+    path = Path(path)
+    results: RunResults = {}
+    if path.suffix == ".jsonl":
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # the last record of a run that crashed while writing it
+                    continue
+                if fingerprint is not None and record.get("fingerprint") != fingerprint:
+                    continue
+                results.setdefault(record["benchmark"], {}).setdefault(
+                    record["task_name"], []
+                ).append(_task_result(record))
+        return results
+
+    with open(path, encoding="utf-8") as f:
+        export = json.load(f) if path.suffix == ".json" else yaml.safe_load(f)
+    for name, benchmark_results in export.items():
+        if name == "config":
+            continue
+        for record in benchmark_results["detailed"]:
+            results.setdefault(name, {}).setdefault(record["task_name"], []).append(
+                _task_result(record)
+            )
+    return results
+
+
+def _ranks(values: Sequence[float]) -> Tuple[List[float], List[int]]:
+    """The ranks of values, from 1, ties getting their average rank, and the sizes of the ties."""
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    ranks = [0.0] * len(values)
+    ties = []
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[order[k]] = (i + j) / 2 + 1
+        if j > i:
+            ties.append(j - i + 1)
+        i = j + 1
+    return ranks, ties
+
+
+def _upper_tail(z: float) -> float:
+    """The probability of a standard normal variable being larger than z."""
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def wilcoxon_signed_rank_test(
+    baseline: Sequence[float], candidate: Sequence[float]
+) -> float:
+    """
+    One-sided p-value of the Wilcoxon signed-rank test that the candidate values are
+    larger than the paired baseline values.
+
+    Pairs with equal values are dropped. The test is exact for up to MAX_EXACT_PAIRS
+    pairs without ties, and uses the normal approximation with continuity and tie
+    corrections otherwise.
+
+    Returns
+    -------
+    float
+        The p-value, 1.0 without pairs of different values.
+    """
+    differences = [c - b for b, c in zip(baseline, candidate) if c != b]
+    n = len(differences)
+    if n == 0:
+        return 1.0
+    ranks, ties = _ranks([abs(d) for d in differences])
+    w_plus = sum(rank for rank, d in zip(ranks, differences) if d > 0)
+
+    if not ties and n <= MAX_EXACT_PAIRS:
+        # number of subsets of the ranks 1..n by sum of their ranks
+        max_sum = n * (n + 1) // 2
+        counts = [1] + [0] * max_sum
+        for rank in range(1, n + 1):
+            for total in range(max_sum, rank - 1, -1):
+                counts[total] += counts[total - rank]
+        return sum(counts[math.ceil(w_plus) :]) / 2**n
+
+    mean = n * (n + 1) / 4
+    variance = n * (n + 1) * (2 * n + 1) / 24 - sum(t**3 - t for t in ties) / 48
+    if variance <= 0:
+        return 1.0
+    return _upper_tail((w_plus - mean - 0.5) / math.sqrt(variance))
+
+
+def mann_whitney_u_test(baseline: Sequence[float], candidate: Sequence[float]) -> float:
+    """
+    One-sided p-value of the Mann-Whitney U test that the candidate values are larger
+    than the baseline values, with the normal approximation and continuity and tie
+    corrections.
+
+    Returns
+    -------
+    float
+        The p-value, 1.0 if either sample is empty.
+    """
+    n1, n2 = len(baseline), len(candidate)
+    if n1 == 0 or n2 == 0:
+        return 1.0
+    ranks, ties = _ranks(list(baseline) + list(candidate))
+    u = sum(ranks[n1:]) - n2 * (n2 + 1) / 2
+    n = n1 + n2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - sum(t**3 - t for t in ties) / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    return _upper_tail((u - mean - 0.5) / math.sqrt(variance))
+
+
+@dataclass
+class TaskComparison:
+    """
+    The comparison of a task between the baseline and the candidate run.
+
+    The values of a run are averaged over the repetitions of the task.
+
+    Attributes
+    ----------
+    task_name : str
+        The name of the task.
+    solved_baseline, solved_candidate : float
+        The fraction of the runs of the task solving it completely.
+    duration_baseline, duration_candidate : float
+        The mean duration of the task, in seconds.
+    tokens_baseline, tokens_candidate : float
+        The mean number of prompt and completion tokens used by the task.
+    p_value : Optional[float]
+        The p-value of the task being slower in the candidate, None if there are too
+        few repetitions of the task to tell.
+    regression : bool
+        Whether the task is significantly slower in the candidate.
+    """
+
+    task_name: str
+    solved_baseline: float
+    solved_candidate: float
+    duration_baseline: float
+    duration_candidate: float
+    tokens_baseline: float
+    tokens_candidate: float
+    p_value: Optional[float] = None
+    regression: bool = False
+
+
+@dataclass
+class BenchmarkComparison:
+    """
+    The comparison of a benchmark between the baseline and the candidate run.
+
+    Attributes
+    ----------
+    name : str
+        The name of the benchmark.
+    tasks : List[TaskComparison]
+        The comparisons of the tasks of both runs.
+    only_baseline, only_candidate : List[str]
+        The tasks of a single run, which are not compared.
+    p_value : float
+        The p-value of the tasks being slower in the candidate, across tasks.
+    regression : bool
+        Whether the benchmark is significantly slower in the candidate.
+    """
+
+    name: str
+    tasks: List[TaskComparison] = field(default_factory=list)
+    only_baseline: List[str] = field(default_factory=list)
+    only_candidate: List[str] = field(default_factory=list)
+    p_value: float = 1.0
+    regression: bool = False
+
+    def _mean(self, attribute: str) -> float:
+        values = [getattr(task, attribute) for task in self.tasks]
+        return statistics.fmean(values) if values else 0.0
+
+    def _sum(self, attribute: str) -> float:
+        return sum(getattr(task, attribute) for task in self.tasks)
+
+    @property
+    def pass_rate_baseline(self) -> float:
+        return self._mean("solved_baseline")
+
+    @property
+    def pass_rate_candidate(self) -> float:
+        return self._mean("solved_candidate")
+
+    @property
+    def duration_baseline(self) -> float:
+        return self._sum("duration_baseline")
+
+    @property
+    def duration_candidate(self) -> float:
+        return self._sum("duration_candidate")
+
+    @property
+    def tokens_baseline(self) -> float:
+        return self._sum("tokens_baseline")
+
+    @property
+    def tokens_candidate(self) -> float:
+        return self._sum("tokens_candidate")
+
+    @property
+    def task_regressions(self) -> List[TaskComparison]:
+        return [task for task in self.tasks if task.regression]
+
+
+def _slower(baseline: float, candidate: float, threshold: float) -> bool:
+    return candidate > baseline * (1 + threshold)
+
+
+def _compare_task(
+    name: str,
+    baseline: List[TaskResult],
+    candidate: List[TaskResult],
+    alpha: float,
+    threshold: float,
+) -> TaskComparison:
+    durations_baseline = [result.duration for result in baseline]
+    durations_candidate = [result.duration for result in candidate]
+    comparison = TaskComparison(
+        task_name=name,
+        solved_baseline=statistics.fmean(r.success_rate == 1 for r in baseline),
+        solved_candidate=statistics.fmean(r.success_rate == 1 for r in candidate),
+        duration_baseline=statistics.fmean(durations_baseline),
+        duration_candidate=statistics.fmean(durations_candidate),
+        tokens_baseline=statistics.fmean(
+            r.prompt_tokens + r.completion_tokens for r in baseline
+        ),
+        tokens_candidate=statistics.fmean(
+            r.prompt_tokens + r.completion_tokens for r in candidate
+        ),
+    )
+    if min(len(baseline), len(candidate)) >= MIN_TASK_SAMPLES:
+        comparison.p_value = mann_whitney_u_test(
+            durations_baseline, durations_candidate
+        )
+        comparison.regression = comparison.p_value < alpha and _slower(
+            comparison.duration_baseline, comparison.duration_candidate, threshold
+        )
+    return comparison
+
+
+def compare_results(
+    baseline: RunResults,
+    candidate: RunResults,
+    alpha: float = 0.05,
+    threshold: float = 0.1,
+) -> List[BenchmarkComparison]:
+    """
+    Compares the results of two runs, benchmark by benchmark.
+
+    Parameters
+    ----------
+    baseline, candidate : RunResults
+        The results of the runs, see `load_results`.
+    alpha : float, optional
+        The significance level of the tests.
+    threshold : float, optional
+        The relative slowdown below which no regression is flagged, e.g. 0.1 for 10%.
+
+    Returns
+    -------
+    List[BenchmarkComparison]
+        The comparisons of the benchmarks of both runs.
+    """
+    comparisons = []
+    for name in [name for name in baseline if name in candidate]:
+        tasks_baseline, tasks_candidate = baseline[name], candidate[name]
+        comparison = BenchmarkComparison(
+            name,
+            tasks=[
+                _compare_task(
+                    task_name,
+                    tasks_baseline[task_name],
+                    tasks_candidate[task_name],
+                    alpha,
+                    threshold,
+                )
+                for task_name in tasks_baseline
+                if task_name in tasks_candidate
+            ],
+            only_baseline=[t for t in tasks_baseline if t not in tasks_candidate],
+            only_candidate=[t for t in tasks_candidate if t not in tasks_baseline],
+        )
+        comparison.p_value = wilcoxon_signed_rank_test(
+            [task.duration_baseline for task in comparison.tasks],
+            [task.duration_candidate for task in comparison.tasks],
+        )
+        comparison.regression = comparison.p_value < alpha and _slower(
+            comparison.duration_baseline, comparison.duration_candidate, threshold
+        )
+        comparisons.append(comparison)
+    return comparisons
+
+
+def _change(baseline: float, candidate: float) -> str:
+    if baseline == 0:
+        return "n/a" if candidate == 0 else "new"
+    return f"{(candidate - baseline) / baseline * 100:+.1f}%"
+
+
+def format_comparison(comparisons: List[BenchmarkComparison]) -> str:
+    """Formats the comparisons of the benchmarks as a report for the console."""
+    lines = []
+    for c in comparisons:
+        lines.append(f"--- Benchmark {c.name}: {len(c.tasks)} tasks compared ---")
+        lines.append(
+            f"Pass rate: {c.pass_rate_baseline * 100:.1f}% -> "
+            f"{c.pass_rate_candidate * 100:.1f}%"
+        )
+        lines.append(
+            f"Duration: {c.duration_baseline:.2f}s -> {c.duration_candidate:.2f}s "
+            f"({_change(c.duration_baseline, c.duration_candidate)}, "
+            f"p={c.p_value:.3f})" + (" REGRESSION" if c.regression else "")
+        )
+        lines.append(
+            f"Tokens: {c.tokens_baseline:.0f} -> {c.tokens_candidate:.0f} "
+            f"({_change(c.tokens_baseline, c.tokens_candidate)})"
+        )
+        lines.append(
+            f"{'task':<32} {'solved':>13} {'duration (s)':>26} {'tokens':>9} {'p':>6}"
+        )
+        for t in c.tasks:
+            p_value = "" if t.p_value is None else f"{t.p_value:.3f}"
+            lines.append(
+                f"{t.task_name[:32]:<32} "
+                f"{t.solved_baseline:>6.0%} {t.solved_candidate:>6.0%} "
+                f"{t.duration_baseline:>8.2f} {t.duration_candidate:>8.2f} "
+                f"{_change(t.duration_baseline, t.duration_candidate):>8} "
+                f"{_change(t.tokens_baseline, t.tokens_candidate):>9} {p_value:>6}"
+                + (" REGRESSION" if t.regression else "")
+            )
+        if c.only_baseline:
+            lines.append("Only in baseline: " + ", ".join(c.only_baseline))
+        if c.only_candidate:
+            lines.append("Only in candidate: " + ", ".join(c.only_candidate))
+        lines.append("")
+    return "\n".join(lines)
@@ -0,0 +1,217 @@
+"""
+Module for the shared cache of benchmark datasets.
+
+The datasets of the benchmarks, as written by `datasets.Dataset.save_to_disk`, are kept
+in a cache directory that can be shared by all checkouts and workers of a host, e.g. on
+a network or read-only mount: $GPTE_DATASET_CACHE, or ~/.cache/gpt-engineer/datasets.
+Every dataset is stored under a version derived from its contents, so that importing the
+same data twice stores it once, and a pointer file selects the current version. The
+files of a version are made read-only and loaded memory-mapped, so that concurrent
+benchmark processes share a single copy in the page cache.
+
+Importing a dataset from an archive never touches the network, which lets air-gapped
+machines be bootstrapped from a dataset downloaded elsewhere.
+
+Functions
+---------
+default_cache_dir : function
+    The cache directory, from the environment.
+
+import_dataset : function
+    Imports a dataset into the cache from an archive or a directory.
+
+store_dataset : function
+    Stores a loaded dataset in the cache.
+
+cached_dataset_path : function
+    The directory of the current version of a cached dataset, if any.
+
+load_cached_dataset : function
+    Loads the current version of a cached dataset, memory-mapped, if any.
+"""
+import hashlib
+import os
+import re
+import shutil
+import stat
+import tarfile
+import tempfile
+import zipfile
+
+from pathlib import Path
+from typing import Any, Optional, Union
+
+DATASET_CACHE_ENV_VAR = "GPTE_DATASET_CACHE"
+# The file of a dataset directory holding its current version
+CURRENT_VERSION_FILE = "CURRENT"
+# Files marking the root of a dataset saved with `save_to_disk`
+DATASET_MARKERS = ("dataset_dict.json", "dataset_info.json")
+
+
+def default_cache_dir() -> Path:
+    """The cache directory: $GPTE_DATASET_CACHE, or gpt-engineer/datasets in the user cache."""
+    if os.environ.get(DATASET_CACHE_ENV_VAR):
+        return Path(os.environ[DATASET_CACHE_ENV_VAR]).expanduser()
+    user_cache = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(user_cache) / "gpt-engineer" / "datasets"
+
+
+def _dataset_dir(name: str, cache_dir: Optional[Path]) -> Path:
+    if not re.fullmatch(r"[\w.-]+", name) or name.startswith("."):
+        raise ValueError(f"Invalid dataset name: {name!r}")
+    return Path(cache_dir or default_cache_dir()) / name
+
+
+def _extract(archive: Path, destination: Path) -> None:
+    if zipfile.is_zipfile(archive):
+        with zipfile.ZipFile(archive) as zf:
+            for member in zf.namelist():
+                target = (destination / member).resolve()
+                if not target.is_relative_to(destination.resolve()):
+                    raise ValueError(f"Unsafe path in {archive}: {member}")
+            zf.extractall(destination)
+    elif tarfile.is_tarfile(archive):
+        with tarfile.open(archive) as tf:
+            if hasattr(tarfile, "data_filter"):
+                tf.extractall(destination, filter="data")
+            else:
+                for member in tf.getmembers():
+                    target = (destination / member.name).resolve()
+                    if not (member.isfile() or member.isdir()) or (
+                        not target.is_relative_to(destination.resolve())
+                    ):
+                        raise ValueError(f"Unsafe member in {archive}: {member.name}")
+                tf.extractall(destination)
+    else:
+        raise ValueError(f"{archive} is neither a directory, a zip nor a tar archive")
+
+
+def _find_root(directory: Path) -> Path:
+    """The shallowest directory holding a saved dataset."""
+    roots = sorted(
+        (marker.parent for m in DATASET_MARKERS for marker in directory.rglob(m)),
+        key=lambda path: len(path.parts),
+    )
+    if not roots:
+        raise ValueError(
+            "No dataset found: expected the output of `save_to_disk`, with "
+            + " or ".join(DATASET_MARKERS)
+        )
+    return roots[0]
+
+
+def _content_version(root: Path) -> str:
+    digest = hashlib.sha256()
+    for path in sorted(p for p in root.rglob("*") if p.is_file()):
+        digest.update(path.relative_to(root).as_posix().encode() + b"\0")
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def _make_read_only(root: Path) -> None:
+    read_only = ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+    for path in list(root.rglob("*")) + [root]:
+        path.chmod(path.stat().st_mode & read_only)
+
+
+def _commit(name: str, staged_root: Path, dataset_dir: Path) -> Path:
+    """Move a staged dataset to its version, and make the version current."""
+    version = _content_version(staged_root)
+    version_dir = dataset_dir / version
+    if not version_dir.exists():
+        try:
+            os.rename(staged_root, version_dir)
+            _make_read_only(version_dir)
+        except OSError:
+            # imported concurrently by another process
+            if not version_dir.exists():
+                raise
+    pointer = dataset_dir / f".{CURRENT_VERSION_FILE}.{os.getpid()}"
+    pointer.write_text(version)
+    os.replace(pointer, dataset_dir / CURRENT_VERSION_FILE)
+    return version_dir
+
+
+def import_dataset(
+    name: str, source: Union[str, Path], cache_dir: Optional[Path] = None
+) -> Path:
+    """
+    Imports a dataset into the cache, without network access.
+
+    Parameters
+    ----------
+    name : str
+        The name of the dataset, e.g. "apps".
+    source : str or Path
+        A zip or tar archive, possibly compressed, or a directory, holding a dataset
+        saved with `save_to_disk`.
+    cache_dir : Path, optional
+        The cache directory, `default_cache_dir()` by default.
+
+    Returns
+    -------
+    Path
+        The directory of the imported version, now the current one.
+    """
+    source = Path(source)
+    dataset_dir = _dataset_dir(name, cache_dir)
+    dataset_dir.mkdir(parents=True, exist_ok=True)
+    # staged within the cache, so that the version is moved in place atomically
+    staging = Path(tempfile.mkdtemp(prefix=".import-", dir=dataset_dir))
+    try:
+        if source.is_dir():
+            shutil.copytree(_find_root(source), staging / "dataset")
+        else:
+            _extract(source, staging)
+        return _commit(name, _find_root(staging), dataset_dir)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def store_dataset(name: str, dataset: Any, cache_dir: Optional[Path] = None) -> Path:
+    """
+    Stores a dataset, e.g. just downloaded, in the cache.
+
+    Returns
+    -------
+    Path
+        The directory of the stored version, now the current one.
+    """
+    dataset_dir = _dataset_dir(name, cache_dir)
+    dataset_dir.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=".store-", dir=dataset_dir))
+    try:
+        dataset.save_to_disk(str(staging / "dataset"))
+        return _commit(name, staging / "dataset", dataset_dir)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def cached_dataset_path(name: str, cache_dir: Optional[Path] = None) -> Optional[Path]:
+    """The directory of the current version of a dataset, None if not cached."""
+    dataset_dir = _dataset_dir(name, cache_dir)
+    try:
+        version = (dataset_dir / CURRENT_VERSION_FILE).read_text().strip()
+    except FileNotFoundError:
+        return None
+    version_dir = dataset_dir / version
+    return version_dir if version_dir.is_dir() else None
+
+
+def load_cached_dataset(name: str, cache_dir: Optional[Path] = None) -> Optional[Any]:
+    """
+    Loads the current version of a dataset from the cache, memory-mapped.
+
+    Returns
+    -------
+    Optional[Union[Dataset, DatasetDict]]
+        The dataset, or None if it is not cached.
+    """
+    path = cached_dataset_path(name, cache_dir)
+    if path is None:
+        return None
+    from datasets import load_from_disk
+
+    return load_from_disk(str(path), keep_in_memory=False)
@@ -0,0 +1,149 @@
+"""
+Module for storing benchmark results as the tasks complete.
+
+The result of every task is appended to a JSON Lines file as soon as the task completes,
+so that a run that crashes or is interrupted keeps the results of its completed tasks.
+Every record holds the fingerprint of the run, which identifies the agent, the benchmark
+configuration and the model, so that a resumed run only reuses the results obtained
+with the same settings.
+
+Classes
+-------
+ResultStore
+    Appends task results to a JSON Lines file and reads them back.
+
+Functions
+---------
+run_fingerprint : function
+    Fingerprints the agent, benchmark configuration and model of a run.
+
+files_hash : function
+    Hashes the files generated for a task.
+"""
+import dataclasses
+import hashlib
+import json
+import os
+import threading
+import time
+
+from pathlib import Path
+from typing import Dict, Iterator, Union
+
+from gpt_engineer.benchmark.types import TaskResult
+from gpt_engineer.core.files_dict import FilesDict
+
+
+def run_fingerprint(agent_path: Union[str, Path], config: dict, model: str) -> str:
+    """
+    Fingerprints the agent, benchmark configuration and model of a run.
+
+    Parameters
+    ----------
+    agent_path : str or Path
+        The python file of the agent, whose contents are hashed.
+    config : dict
+        The configuration of the benchmark.
+    model : str
+        The name of the model the agent uses.
+
+    Returns
+    -------
+    str
+        A hex digest that changes with any of them.
+    """
+    digest = hashlib.sha256(Path(agent_path).read_bytes())
+    digest.update(json.dumps(config, sort_keys=True, default=str).encode())
+    digest.update(model.encode())
+    return digest.hexdigest()[:16]
+
+
+def files_hash(files_dict: FilesDict) -> str:
+    """Hashes the names and contents of files, independently of their order."""
+    digest = hashlib.sha256()
+    for name in sorted(files_dict):
+        digest.update(name.encode() + b"\0" + files_dict[name].encode() + b"\0")
+    return digest.hexdigest()[:16]
+
+
+class ResultStore:
+    """
+    Appends task results to a JSON Lines file and reads them back.
+
+    Records are appended and synced to disk one at a time, from any thread, so that a
+    crash loses at most the task running at the time. A record cut short by a crash is
+    ignored when reading, and terminated before the next record is appended.
+
+    Attributes
+    ----------
+    path : Path
+        The JSON Lines file.
+    fingerprint : str
+        The fingerprint of the run, see `run_fingerprint`.
+    """
+
+    def __init__(self, path: Union[str, Path], fingerprint: str):
+        self.path = Path(path)
+        self.fingerprint = fingerprint
+        self._lock = threading.Lock()
+        self._checked_end = False
+
+    def append(self, benchmark_name: str, result: TaskResult) -> None:
+        """Appends the result of a task of a benchmark."""
+        record = {
+            "fingerprint": self.fingerprint,
+            "benchmark": benchmark_name,
+            "timestamp": time.time(),
+            **result.to_dict(),
+        }
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                if not self._checked_end:
+                    # a crash mid-write leaves a partial last line, which the first
+                    # record must not be appended to
+                    if f.tell() and not self._ends_with_newline():
+                        line = "\n" + line
+                    self._checked_end = True
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def records(self) -> Iterator[dict]:
+        """Yields the records of the file, of every run."""
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # the last record of a run that crashed while writing it
+                    continue
+
+    def completed(self, benchmark_name: str) -> Dict[str, TaskResult]:
+        """
+        The results of the tasks of a benchmark completed with the same fingerprint.
+
+        Returns
+        -------
+        Dict[str, TaskResult]
+            The latest result of every completed task, by task name.
+        """
+        fields = {field.name for field in dataclasses.fields(TaskResult)}
+        results = {}
+        for record in self.records():
+            if (
+                record.get("fingerprint") == self.fingerprint
+                and record.get("benchmark") == benchmark_name
+            ):
+                results[record["task_name"]] = TaskResult(
+                    **{key: value for key, value in record.items() if key in fields}
+                )
+        return results
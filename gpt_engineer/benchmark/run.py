@@ -9,28 +9,84 @@ Functions
 run : function
     Runs the benchmark tasks using the provided agent and returns a list of TaskResult objects.
 
+run_task : function
+    Runs a single benchmark task and returns its TaskResult.
+
+evaluate_assertions : function
+    Evaluates the assertions of a task, possibly concurrently.
+
+percentile : function
+    The q-th percentile of values, interpolated linearly.
+
+timing_percentiles : function
+    The p50, p90 and p99 of the durations, timings and token usage of the tasks.
+
 print_results : function
     Prints the results of the benchmark tasks to the console.
+
+export_yaml_results : function
+    Writes the results of the benchmarks and their configuration to a YAML file.
+
+export_json_results : function
+    Writes the results of the benchmarks and their configuration to a JSON file.
+
+export_csv_results : function
+    Writes the percentiles of the benchmarks to a CSV file.
 """
+import csv
+import dataclasses
+import json
+import math
+import threading
 import time
 
-from typing import List
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Sequence
 
 import yaml
 
-from gpt_engineer.benchmark.types import Assertable, Benchmark, TaskResult
+from gpt_engineer.benchmark.result_store import ResultStore, files_hash
+from gpt_engineer.benchmark.types import (
+    Assertable,
+    Assertion,
+    Benchmark,
+    Task,
+    TaskResult,
+)
 from gpt_engineer.core.base_agent import BaseAgent
 from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
+from gpt_engineer.core.profiling import LLM_CATEGORY, collect_timings
+
+# The metrics of the tasks summarized by their percentiles
+TIMING_METRICS = (
+    "duration",
+    "llm_time",
+    "diff_time",
+    "upload_time",
+    "execution_time",
+    "assertion_time",
+    "prompt_tokens",
+    "completion_tokens",
+)
+PERCENTILES = (50, 90, 99)
 
 
 def run(
     agent: BaseAgent,
     benchmark: Benchmark,
     verbose=False,
+    workers: int = 1,
+    agent_factory: Optional[Callable[[], BaseAgent]] = None,
+    result_store: Optional[ResultStore] = None,
+    resume: bool = False,
 ) -> List[TaskResult]:
     """
     Runs the benchmark tasks using the provided agent and returns a list of TaskResult objects.
 
+    With several workers, the tasks run concurrently on a thread pool, mostly waiting on
+    the language model, and every task runs its code in a temporary directory and a
+    process of its own.
+
     Parameters
     ----------
     agent : BaseAgent
@@ -39,52 +95,246 @@ def run(
         The benchmark containing the tasks to run.
     verbose : bool, default=False
         A flag to indicate whether to print verbose output during the benchmark.
+    workers : int, default=1
+        The number of tasks run concurrently.
+    agent_factory : Callable[[], BaseAgent], optional
+        Creates an agent for every worker thread, as agents keep state, e.g. their
+        memory and token usage log, that is not safe to share between threads. Without
+        it, the workers share the agent.
+    result_store : ResultStore, optional
+        Where the result of every task is appended as soon as the task completes.
+    resume : bool, default=False
+        Reuse the results of the tasks completed in a previous run with the same
+        fingerprint in result_store, instead of running them again.
 
     Returns
     -------
     List[TaskResult]
-        A list of TaskResult objects representing the results of the benchmark tasks.
+        A list of TaskResult objects representing the results of the benchmark tasks,
+        in the order of the tasks.
     """
-    task_results = []
-    for task in benchmark.tasks:
-        print(f"--> Running task: {task.name}\n")
+    task_results: List[Optional[TaskResult]] = [None] * len(benchmark.tasks)
+    completed = (
+        result_store.completed(benchmark.name) if result_store and resume else {}
+    )
+    local = threading.local()
+    print_lock = threading.Lock()
 
-        t0 = time.time()
-        files_dict = agent.improve(task.initial_code, task.prompt)
-        t1 = time.time()
-
-        env = DiskExecutionEnv()
-        env.upload(files_dict)
-
-        if task.command:
-            p = env.popen(task.command)
-            stdout, stderr = p.communicate(benchmark.timeout)
-            stdout, stderr = stdout.decode("utf-8"), stderr.decode("utf-8")
-        else:
-            p, stdout, stderr = None, None, None
-
-        exec_result = Assertable(
-            files=files_dict,
-            env=env,
-            process=p,
-            stdout=stdout,
-            stderr=stderr,
-        )
+    def worker_agent() -> BaseAgent:
+        if workers <= 1 or agent_factory is None:
+            return agent
+        if not hasattr(local, "agent"):
+            local.agent = agent_factory()
+        return local.agent
+
+    def run_indexed_task(i: int) -> None:
+        task = benchmark.tasks[i]
+        if task.name in completed:
+            print(f"--> Skipping task: {task.name}, completed in a previous run\n")
+            task_results[i] = completed[task.name]
+            return
+        task_results[i] = run_task(worker_agent(), task, benchmark)
+        if result_store is not None:
+            result_store.append(benchmark.name, task_results[i])
+        if verbose:
+            with print_lock:
+                print_results([result for result in task_results if result])
+
+    t0 = time.time()
+    if workers <= 1:
+        for i in range(len(benchmark.tasks)):
+            run_indexed_task(i)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(run_indexed_task, range(len(benchmark.tasks))))
+    wall_time = time.time() - t0
 
-        task_results.append(
-            TaskResult(
-                task_name=task.name,
-                assertion_results={
-                    assertion_name: assertion(exec_result)
-                    for assertion_name, assertion in task.assertions.items()
-                },
-                duration=t1 - t0,
-            )
+    n_run = len(task_results) - len(completed)
+    if wall_time > 0:
+        print(
+            f"Ran {n_run} tasks in {wall_time:.2f}s with {workers} "
+            f"worker(s): {60 * n_run / wall_time:.2f} tasks/min"
         )
+    return task_results  # type: ignore[return-value]
 
-        if verbose:
-            print_results(task_results)
-    return task_results
+
+def run_task(agent: BaseAgent, task: Task, benchmark: Benchmark) -> TaskResult:
+    """
+    Runs a benchmark task in an execution environment of its own.
+
+    Parameters
+    ----------
+    agent : BaseAgent
+        The agent improving the initial code of the task.
+    task : Task
+        The task to run.
+    benchmark : Benchmark
+        The benchmark of the task, giving the timeout of its command.
+
+    Returns
+    -------
+    TaskResult
+        The result of the assertions of the task, with the tokens used by the agent and
+        the time taken by every stage of the task.
+    """
+    print(f"--> Running task: {task.name}\n")
+
+    usage_log = getattr(getattr(agent, "ai", None), "token_usage_log", None)
+    n_usage = len(usage_log.log()) if usage_log is not None else 0
+
+    t0 = time.time()
+    with collect_timings() as timings:
+        files_dict = agent.improve(task.initial_code, task.prompt)
+    t1 = time.time()
+
+    usage = usage_log.log()[n_usage:] if usage_log is not None else []
+
+    upload_start = time.perf_counter()
+    env = DiskExecutionEnv()
+    env.upload(files_dict)
+    upload_time = time.perf_counter() - upload_start
+
+    execution_start = time.perf_counter()
+    if task.command:
+        p = env.popen(task.command)
+        stdout, stderr = p.communicate(benchmark.timeout)
+        stdout, stderr = stdout.decode("utf-8"), stderr.decode("utf-8")
+    else:
+        p, stdout, stderr = None, None, None
+    execution_time = time.perf_counter() - execution_start
+
+    exec_result = Assertable(
+        files=files_dict,
+        env=env,
+        process=p,
+        stdout=stdout,
+        stderr=stderr,
+    )
+
+    assertion_start = time.perf_counter()
+    assertion_results = evaluate_assertions(
+        task.assertions,
+        exec_result,
+        workers=benchmark.assertion_workers,
+        fast_fail=benchmark.fast_fail,
+    )
+    assertion_time = time.perf_counter() - assertion_start
+
+    return TaskResult(
+        task_name=task.name,
+        assertion_results=assertion_results,
+        duration=t1 - t0,
+        prompt_tokens=sum(u.in_step_prompt_tokens for u in usage),
+        completion_tokens=sum(u.in_step_completion_tokens for u in usage),
+        files_hash=files_hash(files_dict),
+        llm_time=sum(
+            duration
+            for (category, _), duration in timings.items()
+            if category == LLM_CATEGORY
+        ),
+        diff_time=timings.get(("step", "parse_diffs"), 0.0)
+        + timings.get(("step", "apply_diffs"), 0.0),
+        upload_time=upload_time,
+        execution_time=execution_time,
+        assertion_time=assertion_time,
+    )
+
+
+def evaluate_assertions(
+    assertions: Dict[str, Assertion],
+    assertable: Assertable,
+    workers: int = 1,
+    fast_fail: bool = False,
+) -> Dict[str, bool]:
+    """
+    Evaluates the assertions of a task, possibly concurrently.
+
+    Parameters
+    ----------
+    assertions : Dict[str, Assertion]
+        The assertions of the task, by name.
+    assertable : Assertable
+        The outcome of the task the assertions are evaluated against.
+    workers : int, default=1
+        The number of assertions evaluated concurrently.
+    fast_fail : bool, default=False
+        Stop evaluating the assertions once one fails: the assertions not started are
+        cancelled, and the running ones are signalled through `Assertable.cancelled`.
+        The assertions not evaluated count as failed, so that only whether the task
+        passed is meaningful.
+
+    Returns
+    -------
+    Dict[str, bool]
+        The result of every assertion, in the order of the assertions.
+    """
+    results: Dict[str, bool] = {}
+    if workers <= 1:
+        for name, assertion in assertions.items():
+            results[name] = assertion(assertable)
+            if fast_fail and not results[name]:
+                break
+    else:
+        cancelled = threading.Event()
+        if isinstance(assertable, Assertable):
+            assertable = dataclasses.replace(assertable, cancelled=cancelled)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(assertion, assertable): name
+                for name, assertion in assertions.items()
+            }
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                if fast_fail and not results[futures[future]]:
+                    for pending in futures:
+                        pending.cancel()
+                    # the running assertions kill their process instead of finishing
+                    cancelled.set()
+                    break
+    return {name: results.get(name, False) for name in assertions}
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    The q-th percentile of values, interpolated linearly between the closest ranks.
+
+    Parameters
+    ----------
+    values : Sequence[float]
+        The values, in any order.
+    q : float
+        The percentile, between 0 and 100.
+
+    Returns
+    -------
+    float
+        The percentile, 0.0 if there are no values.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def timing_percentiles(results: List[TaskResult]) -> Dict[str, Dict[str, float]]:
+    """
+    The p50, p90 and p99 of the durations, timings and token usage of the tasks.
+
+    Returns
+    -------
+    Dict[str, Dict[str, float]]
+        The percentiles, e.g. {"p50": 1.2, "p90": 3.4, "p99": 5.6}, by metric, in
+        seconds or tokens.
+    """
+    return {
+        metric: {
+            f"p{q}": percentile([getattr(result, metric) for result in results], q)
+            for q in PERCENTILES
+        }
+        for metric in TIMING_METRICS
+    }
 
 
 def print_results(results: list[TaskResult]):
@@ -132,19 +382,65 @@ def print_results(results: list[TaskResult]):
     print(f"Completely correct tasks: {len(correct_tasks)}/{len(results)}")
     print(f"Total correct assertions: {correct_assertions}/{total_assertions}")
     print(f"Average success rate: {avg_success_rate * 100}% on {len(results)} tasks")
+    print(f"{'metric':<18}" + "".join(f"{f'p{q}':>12}" for q in PERCENTILES))
+    for metric, values in timing_percentiles(results).items():
+        print(f"{metric:<18}" + "".join(f"{value:>12.2f}" for value in values.values()))
     print("--- Results ---")
     print()
 
 
-def export_yaml_results(yaml_path, complete_results, config):
-    for results in complete_results.values():
+def _with_summary(complete_results: dict, config: dict) -> dict:
+    """The results of the benchmarks with their fraction of solved tasks and the config."""
+    out = {}
+    for name, results in complete_results.items():
         correct_tasks = [
             task_result
             for task_result in results["detailed"]
             if task_result["solved"] == 1.0
         ]
-        fraction_correct = len(correct_tasks) / len(results["detailed"])
-        results["fully_solved"] = fraction_correct
-    complete_results["config"] = config
+        out[name] = {
+            **results,
+            "fully_solved": len(correct_tasks) / len(results["detailed"]),
+        }
+    out["config"] = config
+    return out
+
+
+def export_yaml_results(yaml_path, complete_results, config):
+    """
+    Writes the results of the benchmarks and their configuration to a YAML file.
+
+    Parameters
+    ----------
+    yaml_path : str
+        The YAML file.
+    complete_results : dict
+        The results by benchmark name, with the "detailed" results of the tasks and
+        optionally their "percentiles".
+    config : dict
+        The configuration of the benchmarks.
+    """
     with open(yaml_path, "w") as f:
-        yaml.dump(complete_results, f, indent=4)
+        yaml.dump(_with_summary(complete_results, config), f, indent=4)
+
+
+def export_json_results(json_path, complete_results, config):
+    """
+    Writes the results of the benchmarks and their configuration to a JSON file, see
+    `export_yaml_results`.
+    """
+    with open(json_path, "w") as f:
+        json.dump(_with_summary(complete_results, config), f, indent=4)
+
+
+def export_csv_results(csv_path, complete_results):
+    """
+    Writes the percentiles of the benchmarks to a CSV file, a row per benchmark and
+    metric, see `timing_percentiles`.
+    """
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["benchmark", "metric"] + [f"p{q}" for q in PERCENTILES])
+        for name, results in complete_results.items():
+            for metric, values in results.get("percentiles", {}).items():
+                writer.writerow([name, metric] + list(values.values()))
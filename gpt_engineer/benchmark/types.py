@@ -20,6 +20,8 @@ Classes:
     TaskResult:
         Represents the result of running a single task within a benchmark.
 """
+import threading
+
 from dataclasses import dataclass
 from subprocess import Popen
 from typing import Callable, Dict, Optional
@@ -40,6 +42,9 @@ class Assertable:
         process (Popen): The subprocess in which the code is run.
         stdout (str): The standard output from the code execution.
         stderr (str): The standard error from the code execution.
+        cancelled (threading.Event): Set when the result of the assertions running is
+            not needed anymore, e.g. once an assertion failed with fast_fail. Assertions
+            running a process should then kill it and return.
     """
 
     files: FilesDict
@@ -47,6 +52,7 @@ class Assertable:
     process: Optional[Popen]
     stdout: Optional[str]
     stderr: Optional[str]
+    cancelled: Optional[threading.Event] = None
 
 
 Assertion = Callable[[Assertable], bool]
@@ -68,13 +74,34 @@ class Benchmark:
     name: str
     tasks: list[Task]
     timeout: Optional[int] = None
+    # Assertions of a task evaluated concurrently
+    assertion_workers: int = 1
+    # Stop evaluating the assertions of a task once one fails
+    fast_fail: bool = False
 
 
 @dataclass
 class TaskResult:
+    """
+    The result of a benchmark task.
+
+    `duration` is the time the agent took. It breaks down further, in seconds, into
+    `llm_time` waiting on the model and `diff_time` parsing and applying diffs, the
+    rest being the overhead of the agent; the harness then takes `upload_time`,
+    `execution_time` and `assertion_time`.
+    """
+
     task_name: str
     assertion_results: dict[str, bool]
     duration: float
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    files_hash: str = ""
+    llm_time: float = 0.0
+    diff_time: float = 0.0
+    upload_time: float = 0.0
+    execution_time: float = 0.0
+    assertion_time: float = 0.0
 
     # Returns success rate from 0.00 up to 1.00
     @property
@@ -19,8 +19,9 @@ import json
 import logging
 import os
 
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Any, List, Optional, Union
+from typing import Any, Callable, List, Optional, Union
 
 import backoff
 import openai
@@ -38,6 +39,9 @@ from langchain.schema import (
 from langchain_anthropic import ChatAnthropic
 from langchain_openai import AzureChatOpenAI, ChatOpenAI
 
+from gpt_engineer.core.context_window import DEFAULT_POLICIES, ContextWindowManager
+from gpt_engineer.core.profiling import LLM_CATEGORY, span
+from gpt_engineer.core.rate_limiter import RateLimiter
 from gpt_engineer.core.token_usage import TokenUsageLog
 
 # Type hint for a chat message
@@ -68,6 +72,10 @@ class AI:
         The language model instance for conversation management.
     token_usage_log : TokenUsageLog
         A log for tracking token usage during conversations.
+    context_window : ContextWindowManager
+        Trims conversations that would overflow the context window of the model.
+    rate_limiter : Optional[RateLimiter]
+        Bounds the requests sent to the model, shared between AI instances.
 
     Methods
     -------
@@ -75,7 +83,7 @@ class AI:
         Start the conversation with a system message and a user message.
     next(messages: List[Message], prompt: Optional[str], step_name: str) -> List[Message]
         Advances the conversation by sending message history to LLM and updating with the response.
-    backoff_inference(messages: List[Message]) -> Any
+    backoff_inference(messages: List[Message], on_text=None) -> Any
         Perform inference using the language model with an exponential backoff strategy.
     serialize_messages(messages: List[Message]) -> str
         Serialize a list of messages to a JSON string.
@@ -92,6 +100,9 @@ class AI:
         azure_endpoint=None,
         streaming=True,
         vision=False,
+        context_policies=DEFAULT_POLICIES,
+        rate_limiter: Optional[RateLimiter] = None,
+        context_window: Optional[int] = None,
     ):
         """
         Initialize the AI class.
@@ -102,6 +113,15 @@ class AI:
             The name of the model to use, by default "gpt-4".
         temperature : float, optional
             The temperature to use for the model, by default 0.1.
+        context_policies : Sequence[str], optional
+            The policies applied, in order, to keep conversations within the context
+            window of the model, see `ContextWindowManager`.
+        rate_limiter : RateLimiter, optional
+            Bounds the requests sent to the model, for instance by all the AI instances
+            of a batch run.
+        context_window : int, optional
+            The context window of the model, in tokens, by default that of the known
+            models; conversations sent to other models are not trimmed to a window.
         """
         self.temperature = temperature
         self.azure_endpoint = azure_endpoint
@@ -114,10 +134,21 @@ class AI:
         )
         self.llm = self._create_chat_model()
         self.token_usage_log = TokenUsageLog(model_name)
+        self.context_window = ContextWindowManager(
+            model_name, context_policies, context_window=context_window
+        )
+        self.rate_limiter = rate_limiter
 
         logger.debug(f"Using model {self.model_name}")
 
-    def start(self, system: str, user: Any, *, step_name: str) -> List[Message]:
+    def start(
+        self,
+        system: str,
+        user: Any,
+        *,
+        step_name: str,
+        on_text: Optional[Callable[[str], None]] = None,
+    ) -> List[Message]:
         """
         Start the conversation with a system message and a user message.
 
@@ -129,6 +160,8 @@ class AI:
             The content of the user message.
         step_name : str
             The name of the step.
+        on_text : Callable[[str], None], optional
+            Called with the answer received so far while it is streamed.
 
         Returns
         -------
@@ -140,7 +173,7 @@ class AI:
             SystemMessage(content=system),
             HumanMessage(content=user),
         ]
-        return self.next(messages, step_name=step_name)
+        return self.next(messages, step_name=step_name, on_text=on_text)
 
     def _extract_content(self, content):
         """
@@ -195,12 +228,20 @@ class AI:
                 )
             else:
                 collapsed_messages.append(
-                    previous_message.__class__(content=combined_content)
+                    previous_message.__class__(
+                        content=combined_content,
+                        additional_kwargs=previous_message.additional_kwargs,
+                    )
                 )
                 previous_message = current_message
                 combined_content = self._extract_content(current_message.content)
 
-        collapsed_messages.append(previous_message.__class__(content=combined_content))
+        collapsed_messages.append(
+            previous_message.__class__(
+                content=combined_content,
+                additional_kwargs=previous_message.additional_kwargs,
+            )
+        )
         return collapsed_messages
 
     def next(
@@ -209,6 +250,7 @@ class AI:
         prompt: Optional[str] = None,
         *,
         step_name: str,
+        on_text: Optional[Callable[[str], None]] = None,
     ) -> List[Message]:
         """
         Advances the conversation by sending message history
@@ -222,11 +264,15 @@ class AI:
             The prompt to use, by default None.
         step_name : str
             The name of the step.
+        on_text : Callable[[str], None], optional
+            Called with the answer received so far every time a chunk of it is
+            streamed, so that callers can act on the beginning of long answers.
 
         Returns
         -------
         List[Message]
-            The updated list of messages in the conversation.
+            The updated list of messages in the conversation. The whole conversation is
+            kept, even when only part of it was sent to fit the context window.
         """
 
         if prompt:
@@ -237,21 +283,26 @@ class AI:
             "\n".join([m.pretty_repr() for m in messages]),
         )
 
+        with span("fit_context_window", "context"):
+            sent, _ = self.context_window.fit(messages)
+
         if not self.vision:
             messages = self._collapse_text_messages(messages)
+            sent = self._collapse_text_messages(sent)
 
-        response = self.backoff_inference(messages)
+        response = self.backoff_inference(sent, on_text=on_text)
 
-        self.token_usage_log.update_log(
-            messages=messages, answer=response.content, step_name=step_name
-        )
+        with span("count_tokens", "tokenizer"):
+            self.token_usage_log.update_log(
+                messages=sent, answer=response.content, step_name=step_name
+            )
         messages.append(response)
         logger.debug(f"Chat completion finished: {messages}")
 
         return messages
 
     @backoff.on_exception(backoff.expo, openai.RateLimitError, max_tries=7, max_time=45)
-    def backoff_inference(self, messages):
+    def backoff_inference(self, messages, on_text=None):
         """
         Perform inference using the language model while implementing an exponential backoff strategy.
 
@@ -264,9 +315,9 @@ class AI:
         messages : List[Message]
             A list of chat messages which will be passed to the language model for processing.
 
-        callbacks : List[Callable]
-            A list of callback functions that are triggered after each inference. These functions
-            can be used for logging, monitoring, or other auxiliary tasks.
+        on_text : Callable[[str], None], optional
+            When given, the answer is streamed and on_text is called with the text received
+            so far after every chunk.
 
         Returns
         -------
@@ -284,7 +335,17 @@ class AI:
         >>> messages = [SystemMessage(content="Hello"), HumanMessage(content="How's the weather?")]
         >>> response = backoff_inference(messages)
         """
-        return self.llm.invoke(messages)  # type: ignore
+        # the limiter is held by the request only, not by the backoff waits
+        with self.rate_limiter or nullcontext(), span(
+            "llm_request", LLM_CATEGORY, model=self.model_name
+        ):
+            if on_text is None:
+                return self.llm.invoke(messages)  # type: ignore
+            content = ""
+            for chunk in self.llm.stream(messages):
+                content += chunk.content
+                on_text(content)
+            return AIMessage(content=content)
 
     @staticmethod
     def serialize_messages(messages: List[Message]) -> str:
@@ -411,6 +472,7 @@ class ClipboardAI(AI):
         prompt: Optional[str] = None,
         *,
         step_name: str,
+        on_text: Optional[Callable[[str], None]] = None,
     ) -> List[Message]:
         """
         Not yet fully supported
@@ -430,6 +492,8 @@ class ClipboardAI(AI):
         )
 
         response = self.multiline_input()
+        if on_text is not None:
+            on_text(response)
 
         messages.append(AIMessage(content=response))
         logger.debug(f"Chat completion finished: {messages}")
@@ -21,9 +21,12 @@ class BaseExecutionEnv(ABC):
         raise NotImplementedError
 
     @abstractmethod
-    def popen(self, command: str) -> Popen:
+    def popen(self, command: str, new_session: bool = False) -> Popen:
         """
         Runs a command in the execution environment.
+
+        With new_session, the command runs in a process group of its own, so that it can
+        be killed together with the processes it starts.
         """
         raise NotImplementedError
 
@@ -0,0 +1,202 @@
+"""
+Cassette AI Module
+
+This module provides an AI that records the requests sent to the language model, with
+their responses and latencies, to a cassette file, and replays them offline. Replaying
+makes runs deterministic and free, so that the cost of gpt-engineer itself, e.g. of the
+benchmark harness, the agents, the diff pipeline and the execution of the code, can be
+measured and regression-tested on a machine without network access.
+
+A replayed response is served instantly, after the latency recorded with it, or after a
+latency drawn from all the latencies of the cassette. Setting GPTE_CASSETTE makes the
+CLI and the default agents, hence the benchmark, use a cassette:
+
+    GPTE_CASSETTE=run.jsonl GPTE_CASSETTE_MODE=record bench run agent.py
+    GPTE_CASSETTE=run.jsonl GPTE_REPLAY_LATENCY=recorded bench run agent.py
+
+Classes:
+    CassetteAI: An AI recording its requests to a cassette, or replaying them from it.
+    CassetteMissError: Raised when replaying a request that was not recorded.
+
+Functions:
+    request_fingerprint(model_name: str, messages: List[Message]) -> str
+        Identifies a request to the model.
+    cassette_ai_from_env(**kwargs) -> Optional[CassetteAI]
+        The cassette AI configured by the environment, if any.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Union
+
+from langchain.schema import AIMessage
+
+from gpt_engineer.core.ai import AI, Message
+from gpt_engineer.core.profiling import LLM_CATEGORY, span
+
+CASSETTE_ENV_VAR = "GPTE_CASSETTE"
+CASSETTE_MODE_ENV_VAR = "GPTE_CASSETTE_MODE"
+REPLAY_LATENCY_ENV_VAR = "GPTE_REPLAY_LATENCY"
+MODES = ("record", "replay")
+LATENCIES = ("none", "recorded", "simulated")
+
+
+class CassetteMissError(LookupError):
+    """Raised when replaying a request that is not in the cassette."""
+
+
+def request_fingerprint(model_name: str, messages: List[Message]) -> str:
+    """Identifies a request by the model and the type and content of its messages."""
+    payload = json.dumps(
+        [model_name] + [[m.type, m.content] for m in messages], default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class CassetteAI(AI):
+    """
+    An AI recording its requests to a cassette, or replaying them from it.
+
+    The cassette is a JSON Lines file with, for every request, its fingerprint, the
+    response and the seconds the model took to answer. A request sent several times
+    is answered with its responses in the order they were recorded, the last one being
+    repeated once they are exhausted.
+
+    Attributes
+    ----------
+    cassette_path : Path
+        The cassette file.
+    mode : str
+        "record" to send the requests to the model and record them, "replay" to answer
+        them from the cassette without a model.
+    latency : str
+        When replaying, "none" to answer instantly, "recorded" to wait for the latency
+        recorded with the response, "simulated" to wait for a latency drawn from all
+        the latencies of the cassette.
+    """
+
+    def __init__(
+        self,
+        cassette_path: Union[str, Path],
+        mode: str = "replay",
+        latency: str = "none",
+        seed: int = 0,
+        **kwargs,
+    ):
+        """
+        Initialize the cassette AI.
+
+        Parameters
+        ----------
+        cassette_path : str or Path
+            The cassette file, appended to when recording.
+        mode : str, optional
+            "record" or "replay".
+        latency : str, optional
+            "none", "recorded" or "simulated", see the attributes.
+        seed : int, optional
+            The seed of the simulated latencies.
+        **kwargs
+            The arguments of `AI`.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}, expected one of {MODES}")
+        if latency not in LATENCIES:
+            raise ValueError(
+                f"Unknown latency {latency!r}, expected one of {LATENCIES}"
+            )
+        self.cassette_path = Path(cassette_path)
+        self.mode = mode
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._recorded: Dict[str, Deque[dict]] = {}
+        self._latencies: List[float] = []
+        if mode == "replay":
+            self._load()
+        super().__init__(**kwargs)
+
+    def _load(self) -> None:
+        if not self.cassette_path.exists():
+            raise FileNotFoundError(f"No cassette at {self.cassette_path}")
+        with open(self.cassette_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._recorded.setdefault(entry["fingerprint"], deque()).append(entry)
+                self._latencies.append(entry["latency"])
+
+    def _create_chat_model(self):
+        if self.mode == "replay":
+            # the responses come from the cassette
+            return None
+        return super()._create_chat_model()
+
+    def backoff_inference(self, messages, on_text=None):
+        fingerprint = request_fingerprint(self.model_name, messages)
+        if self.mode == "record":
+            start = time.perf_counter()
+            response = super().backoff_inference(messages, on_text=on_text)
+            entry = {
+                "fingerprint": fingerprint,
+                "model": self.model_name,
+                "response": response.content,
+                "latency": time.perf_counter() - start,
+            }
+            with self._lock:
+                with open(self.cassette_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+            return response
+
+        with self._lock:
+            entries = self._recorded.get(fingerprint)
+            if not entries:
+                raise CassetteMissError(
+                    f"No response recorded in {self.cassette_path} for this request, "
+                    "record the cassette again"
+                )
+            entry = entries.popleft() if len(entries) > 1 else entries[0]
+            if self.latency == "recorded":
+                delay = entry["latency"]
+            elif self.latency == "simulated":
+                delay = self._random.choice(self._latencies)
+            else:
+                delay = 0.0
+        with span("llm_request", LLM_CATEGORY, model=self.model_name, replayed=True):
+            time.sleep(delay)
+        if on_text is not None:
+            on_text(entry["response"])
+        return AIMessage(content=entry["response"])
+
+
+def cassette_ai_from_env(**kwargs) -> Optional[CassetteAI]:
+    """
+    The cassette AI configured by the environment, None if GPTE_CASSETTE is not set.
+
+    GPTE_CASSETTE is the cassette file, GPTE_CASSETTE_MODE "record" or "replay", the
+    default, and GPTE_REPLAY_LATENCY "none", the default, "recorded" or "simulated".
+
+    Parameters
+    ----------
+    **kwargs
+        The arguments of `AI`.
+    """
+    cassette_path = os.environ.get(CASSETTE_ENV_VAR)
+    if not cassette_path:
+        return None
+    return CassetteAI(
+        cassette_path,
+        mode=os.environ.get(CASSETTE_MODE_ENV_VAR, "replay"),
+        latency=os.environ.get(REPLAY_LATENCY_ENV_VAR, "none"),
+        **kwargs,
+    )
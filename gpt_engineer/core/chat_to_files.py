@@ -30,6 +30,7 @@ from regex import regex
 
 from gpt_engineer.core.diff import ADD, REMOVE, RETAIN, Diff, Hunk
 from gpt_engineer.core.files_dict import FilesDict, file_to_lines_dict
+from gpt_engineer.core.profiling import profiled
 
 # Initialize a logger for this module
 logger = logging.getLogger(__name__)
@@ -66,6 +67,7 @@ def chat_to_files_dict(chat: str) -> FilesDict:
     return files_dict
 
 
+@profiled()
 def apply_diffs(diffs: Dict[str, Diff], files: FilesDict) -> FilesDict:
     """
     Applies diffs to the provided files.
@@ -120,6 +122,7 @@ def apply_diffs(diffs: Dict[str, Diff], files: FilesDict) -> FilesDict:
     return files
 
 
+@profiled()
 def parse_diffs(diff_string: str, diff_timeout=3) -> dict:
     """
     Parses a diff string in the unified git diff format.
@@ -0,0 +1,136 @@
+"""
+Checkpoints Module
+
+This module records the outputs of the steps of a run in the project memory, so that an
+interrupted run can be resumed without paying again for the steps that completed. Each
+checkpoint is keyed by the step name and a hash of the step inputs (prompt, files,
+model settings, preprompts...), and is only reused when the inputs are unchanged.
+
+Classes:
+    StepCheckpoints: Stores and reuses the outputs of steps.
+"""
+
+import hashlib
+import json
+
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Sequence
+
+from gpt_engineer.core.base_memory import BaseMemory
+from gpt_engineer.core.default.paths import CHECKPOINTS_DIR
+from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.prompt import Prompt
+
+
+def _fingerprint(value: Any) -> Any:
+    """Convert step inputs to a JSON serializable form that identifies them."""
+    if isinstance(value, Prompt):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return sorted((str(k), _fingerprint(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [_fingerprint(v) for v in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if callable(value):
+        return (
+            f"{getattr(value, '__module__', '')}.{getattr(value, '__qualname__', '')}"
+        )
+    return repr(value)
+
+
+class StepCheckpoints:
+    """
+    Stores the outputs of steps in a memory and, when resuming, reuses them instead of
+    running the steps again if their inputs are unchanged.
+
+    Attributes
+    ----------
+    memory : BaseMemory
+        The memory the checkpoints are stored in, usually the project memory.
+    resume : bool
+        Whether completed steps are skipped. Checkpoints are recorded either way, so
+        that any run can be resumed.
+    """
+
+    def __init__(self, memory: BaseMemory, resume: bool = False):
+        self.memory = memory
+        self.resume = resume
+
+    @staticmethod
+    def input_hash(step_name: str, inputs: Sequence[Any]) -> str:
+        """
+        Hash the name and inputs of a step.
+
+        Parameters
+        ----------
+        step_name : str
+            The name of the step.
+        inputs : Sequence[Any]
+            Everything the output of the step depends on.
+
+        Returns
+        -------
+        str
+            The hex digest of the hash.
+        """
+        data = json.dumps([step_name, _fingerprint(list(inputs))], sort_keys=True)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def key(self, step_name: str) -> str:
+        return (Path(CHECKPOINTS_DIR) / f"{step_name}.json").as_posix()
+
+    def load(self, step_name: str, input_hash: str):
+        """
+        Return the files recorded for a step with the given input hash, or None.
+        """
+        key = self.key(step_name)
+        if key not in self.memory:
+            return None
+        try:
+            record = json.loads(self.memory[key])
+        except ValueError:
+            return None
+        if record.get("input_hash") != input_hash:
+            return None
+        return FilesDict(record["files"])
+
+    def run(
+        self, step_name: str, inputs: Sequence[Any], step: Callable[[], FilesDict]
+    ) -> FilesDict:
+        """
+        Run a step and record its output, or when resuming, return the recorded output
+        of a previous run with the same inputs.
+
+        Parameters
+        ----------
+        step_name : str
+            The name of the step, one checkpoint is kept per name.
+        inputs : Sequence[Any]
+            Everything the output of the step depends on.
+        step : Callable[[], FilesDict]
+            Runs the step.
+
+        Returns
+        -------
+        FilesDict
+            The output of the step.
+        """
+        input_hash = self.input_hash(step_name, inputs)
+        if self.resume:
+            files_dict = self.load(step_name, input_hash)
+            if files_dict is not None:
+                print(f"Resuming: reusing the checkpointed output of {step_name}")
+                return files_dict
+
+        files_dict = step()
+        self.memory[self.key(step_name)] = json.dumps(
+            {
+                "step": step_name,
+                "input_hash": input_hash,
+                "completed_at": datetime.now().isoformat(),
+                "files": {str(k): v for k, v in files_dict.items()},
+            }
+        )
+        return files_dict
@@ -0,0 +1,362 @@
+"""
+Code Map Module
+
+This module builds a map of the top-level symbols of a source file (classes, functions
+and their methods, with their signatures and line ranges) and uses it to render files
+for the LLM in a condensed form: full bodies for the symbols relevant to the prompt, and
+only signatures for the rest. Line numbers are the real ones, so diffs produced against
+the condensed view still apply to the full files.
+
+Python files are mapped with `ast`; JavaScript and TypeScript files with a lightweight
+bracket-depth scanner. Maps are cached per file extension and content hash.
+
+Classes:
+    Symbol: A class, function or method and the lines it spans.
+
+Functions:
+    build_code_map(file_name: str, content: str) -> Optional[List[Symbol]]
+        Map the top-level symbols of a file.
+    condensed_to_chat(files_dict: FilesDict, prompt: str) -> str
+        Render files like `FilesDict.to_chat`, eliding the bodies of irrelevant symbols.
+"""
+
+import ast
+import hashlib
+import re
+import threading
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from gpt_engineer.core.files_dict import FilesDict, file_to_lines_dict
+from gpt_engineer.core.relevance_index import tokenize
+
+PYTHON_EXTENSIONS = {".py", ".pyw"}
+JS_EXTENSIONS = {".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx"}
+# Files shorter than this are always sent in full
+MIN_CONDENSED_LINES = 80
+# Bodies shorter than this are not worth eliding
+MIN_ELIDED_LINES = 3
+
+_CODE_MAP_CACHE: Dict[Tuple[str, str], Optional[List["Symbol"]]] = {}
+_CODE_MAP_CACHE_SIZE = 256
+_CODE_MAP_LOCK = threading.Lock()
+
+_JS_DECLARATION = re.compile(
+    r"^\s*(?:export\s+)?(?:default\s+)?(?:declare\s+)?(?:abstract\s+)?(?:async\s+)?"
+    r"(?:function\s*\*?\s*(?P<function>[A-Za-z_$][\w$]*)"
+    r"|class\s+(?P<class>[A-Za-z_$][\w$]*)"
+    r"|(?:interface|enum|namespace)\s+(?P<type>[A-Za-z_$][\w$]*)"
+    r"|(?:const|let|var)\s+(?P<variable>[A-Za-z_$][\w$]*)\s*(?::[^=]+)?=\s*"
+    r"(?:async\s+)?(?:function\b|\([^)]*\)?|[A-Za-z_$][\w$]*\s*=>))"
+)
+_JS_METHOD = re.compile(
+    r"^\s*(?:(?:public|private|protected|static|async|readonly|override|get|set)\s+)*"
+    r"\*?\s*(?P<name>[A-Za-z_$#][\w$]*)\s*(?:<[^>]*>)?\s*(?:\(|=\s*(?:async\s+)?\()"
+)
+_JS_KEYWORDS = {"if", "for", "while", "switch", "catch", "return", "function", "with"}
+
+
+@dataclass
+class Symbol:
+    """
+    A class, function or method of a source file.
+
+    Attributes
+    ----------
+    name : str
+        The name of the symbol.
+    kind : str
+        "class", "function" or, for TypeScript interfaces, enums and namespaces, "type".
+    start : int
+        The first line of the symbol, including decorators, 1-based.
+    end : int
+        The last line of the symbol, inclusive.
+    body_start : int
+        The first line after the signature.
+    children : List[Symbol]
+        The methods of a class.
+    """
+
+    name: str
+    kind: str
+    start: int
+    end: int
+    body_start: int
+    children: List["Symbol"] = field(default_factory=list)
+
+
+def build_code_map(file_name: str, content: str) -> Optional[List[Symbol]]:
+    """
+    Map the top-level symbols of a file, using a cache keyed by the content hash.
+
+    Parameters
+    ----------
+    file_name : str
+        The name of the file, its extension selects the language.
+    content : str
+        The content of the file.
+
+    Returns
+    -------
+    Optional[List[Symbol]]
+        The top-level symbols in order, or None if the language is not supported or the
+        file cannot be parsed.
+    """
+    suffix = Path(file_name).suffix.lower()
+    if suffix not in PYTHON_EXTENSIONS and suffix not in JS_EXTENSIONS:
+        return None
+    key = (suffix, hashlib.sha256(content.encode("utf-8")).hexdigest())
+    with _CODE_MAP_LOCK:
+        if key in _CODE_MAP_CACHE:
+            return _CODE_MAP_CACHE[key]
+    if suffix in PYTHON_EXTENSIONS:
+        symbols = _python_code_map(content)
+    else:
+        symbols = _js_code_map(content)
+    with _CODE_MAP_LOCK:
+        if key not in _CODE_MAP_CACHE:
+            while len(_CODE_MAP_CACHE) >= _CODE_MAP_CACHE_SIZE:
+                _CODE_MAP_CACHE.pop(next(iter(_CODE_MAP_CACHE)))
+            _CODE_MAP_CACHE[key] = symbols
+    return symbols
+
+
+def _python_symbol(node: ast.AST) -> Symbol:
+    start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+    body_start = node.body[0].lineno
+    if body_start == node.lineno:
+        # one-liner, there is no body to elide
+        body_start = node.end_lineno + 1
+    kind = "class" if isinstance(node, ast.ClassDef) else "function"
+    symbol = Symbol(node.name, kind, start, node.end_lineno, body_start)
+    if isinstance(node, ast.ClassDef):
+        symbol.children = [
+            _python_symbol(child)
+            for child in node.body
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))
+        ]
+    return symbol
+
+
+def _python_code_map(content: str) -> Optional[List[Symbol]]:
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        return None
+    return [
+        _python_symbol(node)
+        for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+    ]
+
+
+def _js_depths(lines: List[str]) -> List[Tuple[int, int]]:
+    """
+    The bracket depth at the start and end of every line, ignoring brackets in strings
+    and comments. Regex literals are not recognized.
+    """
+    depths = []
+    depth = 0
+    in_block_comment = False
+    quote = None
+    for line in lines:
+        start_depth = depth
+        i = 0
+        while i < len(line):
+            c = line[i]
+            if in_block_comment:
+                if line.startswith("*/", i):
+                    in_block_comment = False
+                    i += 1
+            elif quote:
+                if c == "\\":
+                    i += 1
+                elif c == quote:
+                    quote = None
+            elif line.startswith("//", i):
+                break
+            elif line.startswith("/*", i):
+                in_block_comment = True
+                i += 1
+            elif c in "\"'`":
+                quote = c
+            elif c in "([{":
+                depth += 1
+            elif c in ")]}":
+                depth = max(0, depth - 1)
+            i += 1
+        if quote != "`":
+            # only template literals span lines
+            quote = None
+        depths.append((start_depth, depth))
+    return depths
+
+
+def _js_block_end(depths: List[Tuple[int, int]], start: int, level: int) -> int:
+    """
+    The index of the line closing the block opened on line start, or -1 if the line
+    does not leave a bracket open, like single line declarations.
+    """
+    if depths[start][1] <= level:
+        return -1
+    for i in range(start + 1, len(depths)):
+        if depths[i][1] <= level:
+            return i
+    return len(depths) - 1
+
+
+def _js_body_start(lines: List[str], start: int, end: int) -> int:
+    """The line after the signature: the first line ending with an opening brace."""
+    for i in range(start, min(end, start + 5) + 1):
+        if lines[i].rstrip().endswith("{"):
+            return i + 1
+    return start + 1
+
+
+def _js_code_map(content: str) -> List[Symbol]:
+    lines = content.split("\n")
+    depths = _js_depths(lines)
+    symbols = []
+    i = 0
+    while i < len(lines):
+        match = _JS_DECLARATION.match(lines[i]) if depths[i][0] == 0 else None
+        end = _js_block_end(depths, i, 0) if match else -1
+        if end <= i:
+            i += 1
+            continue
+        name = next(group for group in match.groups() if group)
+        kind = "class" if match.group("class") else "function"
+        if match.group("type"):
+            kind = "type"
+        symbol = Symbol(name, kind, i + 1, end + 1, _js_body_start(lines, i, end) + 1)
+        if kind == "class":
+            j = symbol.body_start - 1
+            while j < end:
+                method = _JS_METHOD.match(lines[j]) if depths[j][0] == 1 else None
+                method_end = _js_block_end(depths, j, 1) if method else -1
+                if method_end <= j or method.group("name") in _JS_KEYWORDS:
+                    j += 1
+                    continue
+                symbol.children.append(
+                    Symbol(
+                        method.group("name"),
+                        "function",
+                        j + 1,
+                        method_end + 1,
+                        _js_body_start(lines, j, method_end) + 1,
+                    )
+                )
+                j = method_end + 1
+        symbols.append(symbol)
+        i = end + 1
+    return symbols
+
+
+def _relevant_symbols(
+    symbols: List[Symbol], prompt_terms: Set[str]
+) -> Optional[Set[int]]:
+    """
+    The ids of the symbols relevant to the prompt: those named in the prompt, and
+    failing that, those whose names share the most terms with it. None if no symbol
+    shares any term with the prompt.
+    """
+    flat = [s for symbol in symbols for s in [symbol, *symbol.children]]
+    named = {id(s) for s in flat if s.name.lower() in prompt_terms}
+    if named:
+        return named
+    scores = {id(s): len(set(tokenize(s.name)) & prompt_terms) for s in flat}
+    best = max(scores.values(), default=0)
+    if not best:
+        return None
+    return {key for key, score in scores.items() if score == best}
+
+
+def _condensed_lines(
+    content: str, symbols: List[Symbol], relevant: Set[int]
+) -> List[Tuple[Optional[int], str]]:
+    """
+    The lines to show, as pairs of line number and content, with None as line number
+    for the markers of elided bodies.
+    """
+    lines = file_to_lines_dict(content)
+    hidden: List[Tuple[int, int]] = []
+
+    def hide_body(symbol: Symbol) -> None:
+        if symbol.end - symbol.body_start + 1 >= MIN_ELIDED_LINES:
+            hidden.append((symbol.body_start, symbol.end))
+
+    for symbol in symbols:
+        if id(symbol) in relevant:
+            continue
+        relevant_children = [c for c in symbol.children if id(c) in relevant]
+        if not relevant_children:
+            hide_body(symbol)
+        else:
+            for child in symbol.children:
+                if id(child) not in relevant:
+                    hide_body(child)
+
+    shown: List[Tuple[Optional[int], str]] = []
+    hidden_starts = {start: end for start, end in hidden}
+    line_number = 1
+    while line_number <= len(lines):
+        if line_number in hidden_starts:
+            end = hidden_starts[line_number]
+            indent = re.match(r"\s*", lines[line_number]).group()
+            shown.append((None, f"{indent}... (lines {line_number}-{end} omitted)"))
+            line_number = end + 1
+        else:
+            shown.append((line_number, lines[line_number]))
+            line_number += 1
+    return shown
+
+
+def condensed_to_chat(files_dict: FilesDict, prompt: str) -> str:
+    """
+    Formats files like `FilesDict.to_chat`, but sends the bodies of classes and
+    functions only when they are relevant to the prompt. Other symbols are reduced to
+    their signatures followed by a marker line without line number.
+
+    Files shorter than MIN_CONDENSED_LINES, files in unsupported languages, files that do
+    not parse, files named in the prompt and files without any symbol related to the
+    prompt are sent in full.
+
+    Parameters
+    ----------
+    files_dict : FilesDict
+        The files to format.
+    prompt : str
+        The prompt the relevance of symbols is judged against.
+
+    Returns
+    -------
+    str
+        A string representation of the files.
+    """
+    prompt_terms = set(tokenize(prompt))
+    chat_str = ""
+    for file_name, file_content in files_dict.items():
+        relevant = None
+        if (
+            file_content.count("\n") + 1 >= MIN_CONDENSED_LINES
+            and Path(file_name).name not in prompt
+        ):
+            symbols = build_code_map(file_name, file_content)
+            if symbols:
+                relevant = _relevant_symbols(symbols, prompt_terms)
+        chat_str += f"File: {file_name}\n"
+        if relevant is not None:
+            for line_number, line_content in _condensed_lines(
+                file_content, symbols, relevant
+            ):
+                if line_number is None:
+                    chat_str += f"{line_content}\n"
+                else:
+                    chat_str += f"{line_number} {line_content}\n"
+        else:
+            for line_number, line_content in file_to_lines_dict(file_content).items():
+                chat_str += f"{line_number} {line_content}\n"
+        chat_str += "\n"
+    return f"```\n{chat_str}```"
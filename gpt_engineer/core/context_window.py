@@ -0,0 +1,345 @@
+"""
+Context Window Module
+
+This module keeps conversations within the context window of the model they are sent
+to. Before every call, `ContextWindowManager.fit` measures the messages and, while they
+exceed the window minus the tokens reserved for the answer, applies trimming policies in
+order:
+
+- "drop_retries": remove the stale turns of earlier retries, only the latest failed
+  answer and its feedback are kept. Applied before every call, whatever the size.
+- "summarize": replace the oldest turns with a short extractive summary.
+- "shrink_files": elide the middle of the largest files in `FilesDict.to_chat` payloads.
+
+If the conversation still does not fit, the largest messages are truncated in the middle
+as a last resort, so that requests never fail on context overflow. The window of models
+that are not known, and not given explicitly, is not limited: only stale retries are
+dropped, and conversations are never summarized or truncated.
+
+Classes:
+    ContextWindowManager: Fits conversations in the context window of a model.
+
+Functions:
+    context_window_size(model_name: str) -> Optional[int]
+        The context window of a model, in tokens, if known.
+    retry_message(content: str) -> HumanMessage
+        A feedback message asking the model to retry, which may be dropped later.
+"""
+
+import logging
+import re
+
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+
+from gpt_engineer.core.token_usage import Tokenizer
+
+Message = Union[AIMessage, HumanMessage, SystemMessage]
+
+logger = logging.getLogger(__name__)
+
+# Context windows in tokens, matched by the longest model name prefix followed by the end
+# of the name or a dash, so that "gpt-4-0613" is a "gpt-4" but "gpt-4.1" is not
+MODEL_CONTEXT_WINDOWS: Dict[str, int] = {
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4-1106": 128000,
+    "gpt-4-0125": 128000,
+    "gpt-4-vision": 128000,
+    "gpt-4-32k": 32768,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo-instruct": 4096,
+    "gpt-3.5-turbo": 16385,
+    "claude": 200000,
+}
+DEFAULT_RESERVED_OUTPUT_TOKENS = 4096
+DEFAULT_POLICIES = ("drop_retries", "summarize", "shrink_files")
+RETRY_MARKER = "gpte_retry"
+# Characters of every message kept in summaries of old turns
+SUMMARY_CHARS_PER_MESSAGE = 200
+
+_FILE_BLOCK = re.compile(
+    r"^File: (?P<name>.+)\n(?P<body>(?:(?:\d+ |\.\.\. \().*\n)+)", re.MULTILINE
+)
+
+
+def context_window_size(model_name: str) -> Optional[int]:
+    """
+    The context window of a model, in tokens.
+
+    Parameters
+    ----------
+    model_name : str
+        The name of the model.
+
+    Returns
+    -------
+    Optional[int]
+        The size of the window of the known model with the longest matching name
+        prefix, or None for unknown models.
+    """
+    matches = [
+        prefix
+        for prefix in MODEL_CONTEXT_WINDOWS
+        if model_name == prefix or model_name.startswith(prefix + "-")
+    ]
+    if not matches:
+        return None
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)]
+
+
+def retry_message(content: str) -> HumanMessage:
+    """
+    A feedback message asking the model to retry its previous answer. The
+    "drop_retries" policy removes it, along with the answer it replies to, once a newer
+    retry supersedes it.
+    """
+    return HumanMessage(content=content, additional_kwargs={RETRY_MARKER: True})
+
+
+def _is_retry(message: Message) -> bool:
+    return isinstance(message, HumanMessage) and message.additional_kwargs.get(
+        RETRY_MARKER, False
+    )
+
+
+def _text(message: Message) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    return "\n".join(
+        item.get("text", "") for item in message.content if isinstance(item, dict)
+    )
+
+
+def _with_content(message: Message, content: str) -> Message:
+    return message.__class__(
+        content=content, additional_kwargs=message.additional_kwargs
+    )
+
+
+def _line_number(line: str) -> Optional[int]:
+    match = re.match(r"(\d+) ", line)
+    return int(match.group(1)) if match else None
+
+
+def _elide_middle(text: str, keep_chars: int) -> Tuple[str, int]:
+    """
+    Keep whole lines at the head and tail of text, up to keep_chars characters, and
+    replace the middle with a marker line. The marker of line-numbered text, as in
+    `FilesDict.to_chat`, gives the range of the omitted lines.
+
+    Returns
+    -------
+    Tuple[str, int]
+        The shortened text and the number of lines omitted.
+    """
+    lines = text.split("\n")
+    head: List[str] = []
+    tail: List[str] = []
+    size = 0
+    while len(head) + len(tail) < len(lines) and size < keep_chars:
+        if len(head) <= len(tail):
+            head.append(lines[len(head)])
+            size += len(head[-1]) + 1
+        else:
+            tail.insert(0, lines[len(lines) - len(tail) - 1])
+            size += len(tail[0]) + 1
+    if len(head) + len(tail) >= len(lines):
+        return text, 0
+    # markers of earlier elisions next to the gap become part of it
+    while head and head[-1].startswith("... ("):
+        head.pop()
+    while tail and tail[0].startswith("... ("):
+        tail.pop(0)
+    before = _line_number(head[-1]) if head else None
+    after = _line_number(tail[0]) if tail else None
+    if before is not None and after is not None:
+        removed = after - before - 1
+        marker = f"... (lines {before + 1}-{after - 1} omitted)"
+    else:
+        removed = len(lines) - len(head) - len(tail)
+        marker = f"... ({removed} lines omitted)"
+    return "\n".join(head + [marker] + tail), removed
+
+
+class ContextWindowManager:
+    """
+    Fits conversations in the context window of a model.
+
+    Attributes
+    ----------
+    model_name : str
+        The model the conversations are sent to.
+    context_window : Optional[int]
+        The size of its context window, in tokens, None if it is not limited.
+    reserved_output_tokens : int
+        The tokens kept free for the answer.
+    policies : Sequence[str]
+        The trimming policies to apply, in order.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        policies: Sequence[str] = DEFAULT_POLICIES,
+        context_window: Optional[int] = None,
+        reserved_output_tokens: int = DEFAULT_RESERVED_OUTPUT_TOKENS,
+        count_tokens: Optional[Callable[[List[Message]], int]] = None,
+    ):
+        unknown = set(policies) - set(DEFAULT_POLICIES)
+        if unknown:
+            raise ValueError(f"Unknown context window policies: {sorted(unknown)}")
+        self.model_name = model_name
+        self.policies = tuple(policies)
+        self.context_window = context_window or context_window_size(model_name)
+        self.reserved_output_tokens = (
+            min(reserved_output_tokens, self.context_window // 4)
+            if self.context_window
+            else reserved_output_tokens
+        )
+        self._count_tokens = count_tokens
+
+    @property
+    def budget(self) -> Optional[int]:
+        """The tokens available for the messages sent, None if not limited."""
+        if self.context_window is None:
+            return None
+        return self.context_window - self.reserved_output_tokens
+
+    def count_tokens(self, messages: List[Message]) -> int:
+        """Count the tokens of messages, with the tokenizer of the model by default."""
+        if self._count_tokens is None:
+            self._count_tokens = Tokenizer(self.model_name).num_tokens_from_messages
+        return self._count_tokens(messages)
+
+    def _fits(self, messages: List[Message]) -> bool:
+        if self.budget is None:
+            return True
+        # a token is at least one character, so short text conversations need no tokenizer
+        if (
+            all(isinstance(m.content, str) for m in messages)
+            and sum(len(m.content) + 6 for m in messages) <= self.budget
+        ):
+            return True
+        return self.count_tokens(messages) <= self.budget
+
+    def fit(self, messages: List[Message]) -> Tuple[List[Message], List[str]]:
+        """
+        Trim messages so that they fit in the context window.
+
+        The list passed in is not modified.
+
+        Parameters
+        ----------
+        messages : List[Message]
+            The conversation about to be sent.
+
+        Returns
+        -------
+        Tuple[List[Message], List[str]]
+            The messages to send, and a description of every trim that was applied.
+        """
+        messages = list(messages)
+        trims: List[str] = []
+        if "drop_retries" in self.policies:
+            messages = self._drop_retries(messages, trims)
+
+        for policy in self.policies:
+            if self._fits(messages):
+                break
+            if policy == "summarize":
+                messages = self._summarize(messages, trims)
+            elif policy == "shrink_files":
+                messages = self._shrink_files(messages, trims)
+
+        if not self._fits(messages):
+            messages = self._truncate(messages, trims)
+
+        for trim in trims:
+            logger.info("Context window of %s: %s", self.model_name, trim)
+        return messages, trims
+
+    def _drop_retries(self, messages: List[Message], trims: List[str]) -> List[Message]:
+        retries = [i for i, m in enumerate(messages) if _is_retry(m)]
+        stale = set()
+        for i in retries[:-1]:
+            stale.add(i)
+            if i > 0 and isinstance(messages[i - 1], AIMessage):
+                stale.add(i - 1)
+        if stale:
+            trims.append(f"dropped {len(stale)} messages of earlier retries")
+        return [m for i, m in enumerate(messages) if i not in stale]
+
+    def _summarize(self, messages: List[Message], trims: List[str]) -> List[Message]:
+        """
+        Replace the turns between the opening messages (system prompt and first user
+        message) and the last two messages with the first characters of each.
+        """
+        first_answer = next(
+            (i for i, m in enumerate(messages) if isinstance(m, AIMessage)), None
+        )
+        if first_answer is None or len(messages) - 2 <= first_answer:
+            return messages
+        old = messages[first_answer:-2]
+        summary = "\n".join(
+            f"{m.type}: {_text(m)[:SUMMARY_CHARS_PER_MESSAGE].strip()}"
+            + (" [...]" if len(_text(m)) > SUMMARY_CHARS_PER_MESSAGE else "")
+            for m in old
+        )
+        trims.append(f"summarized {len(old)} earlier messages")
+        return (
+            messages[:first_answer]
+            + [HumanMessage(content=f"Summary of the earlier conversation:\n{summary}")]
+            + messages[-2:]
+        )
+
+    def _shrink_files(self, messages: List[Message], trims: List[str]) -> List[Message]:
+        """
+        Repeatedly halve the largest file of the file payloads, keeping the lines at its
+        start and end with their line numbers, until the conversation fits.
+        """
+        shrunk: Dict[str, int] = {}
+        for _ in range(32):
+            if self._fits(messages):
+                break
+            largest = None
+            for i, message in enumerate(messages):
+                if not isinstance(message.content, str):
+                    continue
+                for match in _FILE_BLOCK.finditer(message.content):
+                    size = len(match.group("body"))
+                    if largest is None or size > largest[0]:
+                        largest = (size, i, match)
+            if largest is None or largest[0] < 200:
+                break
+            size, i, match = largest
+            body, _ = _elide_middle(match.group("body")[:-1], size // 2)
+            shrunk[match.group("name")] = body.count("\n") + 1
+            content = messages[i].content
+            messages[i] = _with_content(
+                messages[i],
+                content[: match.start("body")] + body + "\n" + content[match.end() :],
+            )
+        for name, kept in shrunk.items():
+            trims.append(f"shrank {name} to {kept} lines")
+        return messages
+
+    def _truncate(self, messages: List[Message], trims: List[str]) -> List[Message]:
+        """Halve the largest messages until the conversation fits."""
+        for _ in range(32):
+            if self._fits(messages):
+                break
+            candidates = [
+                j for j, m in enumerate(messages) if isinstance(m.content, str)
+            ]
+            if not candidates:
+                break
+            i = max(candidates, key=lambda j: len(messages[j].content))
+            text = messages[i].content
+            if len(text) < 200:
+                break
+            truncated, removed = _elide_middle(text, len(text) // 2)
+            messages[i] = _with_content(messages[i], truncated)
+            trims.append(f"truncated {removed} lines of a {messages[i].type} message")
+        return messages
@@ -0,0 +1,318 @@
+"""
+Candidates Module
+
+This module generates several candidate implementations of a prompt concurrently and
+keeps the first one that passes a check, by default running its entrypoint in a sandbox
+directory of its own. The candidates still running when one passes are cancelled: their
+answer stops streaming, they stop before their next model call or, while their
+entrypoint runs, are killed. The token usage and cost of every candidate, including the
+tokens streamed before it was cancelled, is reported.
+
+Classes:
+    CandidateReport: The outcome and cost of a candidate.
+
+Functions:
+    gen_candidates(ai, prompt, memory, preprompts_holder, n_candidates, ...)
+        Generate candidates concurrently and keep the first that passes.
+    run_entrypoint(files_dict, execution_env, stop, timeout) -> bool
+        Run the entrypoint of a candidate and tell whether it succeeded.
+    format_reports(reports: List[CandidateReport]) -> str
+        Format the reports of the candidates as a table.
+"""
+
+import subprocess
+import tempfile
+import threading
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Tuple
+
+from langchain.schema import HumanMessage, SystemMessage
+
+from gpt_engineer.core.ai import AI
+from gpt_engineer.core.base_execution_env import BaseExecutionEnv
+from gpt_engineer.core.base_memory import BaseMemory
+from gpt_engineer.core.default.disk_execution_env import (
+    DiskExecutionEnv,
+    kill_process_group,
+)
+from gpt_engineer.core.default.paths import ENTRYPOINT_FILE
+from gpt_engineer.core.default.steps import gen_code, gen_entrypoint
+from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.preprompts_holder import PrepromptsHolder
+from gpt_engineer.core.prompt import Prompt
+
+# Seconds the entrypoint of a candidate may run
+DEFAULT_CANDIDATE_TIMEOUT = 120
+
+CandidateCheck = Callable[[FilesDict, BaseExecutionEnv], bool]
+
+
+class CandidateCancelled(Exception):
+    """Raised in a candidate when another candidate already passed."""
+
+
+@dataclass
+class CandidateReport:
+    """
+    The outcome and cost of a candidate.
+
+    Attributes
+    ----------
+    index : int
+        The number of the candidate, from 1.
+    status : str
+        "passed", "failed", "cancelled" or "error".
+    prompt_tokens : int
+        The prompt tokens used by the candidate.
+    completion_tokens : int
+        The completion tokens used by the candidate.
+    cost : Optional[float]
+        The cost in USD of the tokens, None if the price of the model is unknown.
+    duration : float
+        The seconds the candidate took.
+    error : str
+        The exception raised by the candidate, if any.
+    """
+
+    index: int
+    status: str = "cancelled"
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: Optional[float] = None
+    duration: float = 0.0
+    error: str = ""
+
+
+class _CandidateAI:
+    """
+    Forwards calls to an AI, tagging the step names with the candidate so that its
+    token usage can be told apart, and stopping once the candidates are cancelled.
+    """
+
+    def __init__(self, ai: AI, label: str, stop: threading.Event):
+        self._ai = ai
+        self.label = label
+        self._stop = stop
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._ai, name)
+
+    def start(self, system: str, user: Any, *, step_name: str, **kwargs) -> List:
+        messages = [SystemMessage(content=system), HumanMessage(content=user)]
+        return self.next(messages, step_name=step_name, **kwargs)
+
+    def next(
+        self,
+        messages: List,
+        prompt: Optional[str] = None,
+        *,
+        step_name,
+        on_text: Optional[Callable[[str], None]] = None,
+        **kwargs,
+    ):
+        if self._stop.is_set():
+            raise CandidateCancelled()
+        step_name = f"{step_name} [{self.label}]"
+        received = ""
+
+        def on_chunk(text: str) -> None:
+            nonlocal received
+            received = text
+            if on_text is not None:
+                on_text(text)
+            if self._stop.is_set():
+                # stops streaming the answer
+                raise CandidateCancelled()
+
+        try:
+            return self._ai.next(
+                messages, prompt, step_name=step_name, on_text=on_chunk, **kwargs
+            )
+        except CandidateCancelled:
+            # the tokens streamed so far are paid for all the same
+            self._ai.token_usage_log.update_log(
+                messages=messages, answer=received, step_name=step_name
+            )
+            raise
+
+
+def run_entrypoint(
+    files_dict: FilesDict,
+    execution_env: BaseExecutionEnv,
+    stop: Optional[threading.Event] = None,
+    timeout: float = DEFAULT_CANDIDATE_TIMEOUT,
+) -> bool:
+    """
+    Run the entrypoint of a candidate and tell whether it exited successfully.
+
+    Parameters
+    ----------
+    files_dict : FilesDict
+        The files of the candidate, including the entrypoint.
+    execution_env : BaseExecutionEnv
+        The environment the files are uploaded to and run in.
+    stop : threading.Event, optional
+        Kills the entrypoint when set.
+    timeout : float, optional
+        The seconds after which the entrypoint is killed and the candidate fails.
+
+    Returns
+    -------
+    bool
+        True if the entrypoint exited with code 0.
+
+    Raises
+    ------
+    CandidateCancelled
+        If stop was set while the entrypoint ran.
+    """
+    if not files_dict.get(ENTRYPOINT_FILE, "").strip():
+        return False
+    execution_env.upload(files_dict)
+    # in a session of its own, so that killing it also kills what the entrypoint starts
+    process = execution_env.popen(f"bash {ENTRYPOINT_FILE}", new_session=True)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            process.communicate(timeout=0.5)
+            return process.returncode == 0
+        except subprocess.TimeoutExpired:
+            if stop is not None and stop.is_set():
+                kill_process_group(process)
+                raise CandidateCancelled()
+            if time.time() > deadline:
+                kill_process_group(process)
+                return False
+
+
+def gen_candidates(
+    ai: AI,
+    prompt: Prompt,
+    memory: BaseMemory,
+    preprompts_holder: PrepromptsHolder,
+    n_candidates: int = 3,
+    code_gen_fn: Callable[..., FilesDict] = gen_code,
+    check: Optional[CandidateCheck] = None,
+    timeout: float = DEFAULT_CANDIDATE_TIMEOUT,
+) -> Tuple[FilesDict, List[CandidateReport]]:
+    """
+    Generate candidates concurrently and keep the first that passes its check.
+
+    Every candidate generates code with code_gen_fn and an entrypoint with
+    `gen_entrypoint`, then is checked in a temporary directory of its own. The other
+    candidates are cancelled as soon as one passes. Sampling only yields different
+    candidates with a temperature above zero.
+
+    Parameters
+    ----------
+    ai : AI
+        The AI model used for generating the candidates.
+    prompt : Prompt
+        The user prompt to generate code from.
+    memory : BaseMemory
+        The memory interface where the code and related data are stored.
+    preprompts_holder : PrepromptsHolder
+        The holder for preprompt messages that guide the AI model.
+    n_candidates : int, optional
+        The number of candidates generated concurrently.
+    code_gen_fn : Callable[..., FilesDict], optional
+        The function generating the code of a candidate, `gen_code` by default.
+    check : Callable[[FilesDict, BaseExecutionEnv], bool], optional
+        Tells whether a candidate passes, given its files and an execution environment
+        in an empty directory, for instance with benchmark assertions. By default, runs
+        the entrypoint with `run_entrypoint`.
+    timeout : float, optional
+        The seconds the entrypoint of a candidate may run with the default check.
+
+    Returns
+    -------
+    Tuple[FilesDict, List[CandidateReport]]
+        The files, including the entrypoint, of the first candidate that passed, or of
+        the first candidate generated if none passed, and the report of every candidate.
+    """
+    stop = threading.Event()
+    if check is None:
+
+        def check(files_dict: FilesDict, execution_env: BaseExecutionEnv) -> bool:
+            return run_entrypoint(files_dict, execution_env, stop, timeout)
+
+    reports = [CandidateReport(index=i + 1) for i in range(n_candidates)]
+    generated: List[Optional[FilesDict]] = [None] * n_candidates
+
+    def run_candidate(i: int) -> bool:
+        candidate_ai = _CandidateAI(ai, f"candidate {i + 1}", stop)
+        start = time.time()
+        try:
+            files_dict = code_gen_fn(candidate_ai, prompt, memory, preprompts_holder)
+            entrypoint = gen_entrypoint(
+                candidate_ai, prompt, files_dict, memory, preprompts_holder
+            )
+            generated[i] = FilesDict({**files_dict, **entrypoint})
+            if stop.is_set():
+                raise CandidateCancelled()
+            with tempfile.TemporaryDirectory(prefix="gpte-candidate-") as sandbox:
+                passed = check(generated[i], DiskExecutionEnv(sandbox))
+            reports[i].status = "passed" if passed else "failed"
+            return passed
+        except CandidateCancelled:
+            reports[i].status = "cancelled"
+            return False
+        except Exception as e:
+            reports[i].status = "error"
+            reports[i].error = repr(e)
+            return False
+        finally:
+            reports[i].duration = time.time() - start
+
+    winner = None
+    executor = ThreadPoolExecutor(max_workers=n_candidates)
+    futures = {executor.submit(run_candidate, i): i for i in range(n_candidates)}
+    pending = set(futures)
+    while pending and winner is None:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        winner = next((futures[f] for f in done if f.result()), None)
+    stop.set()
+    # the cancelled candidates stop at the next chunk of their answer, and are waited
+    # for so that their token usage is complete
+    executor.shutdown(wait=True)
+
+    _add_usage(ai, reports)
+    print(format_reports(reports))
+    if winner is None:
+        winner = next(
+            (i for i, files in enumerate(generated) if files is not None), None
+        )
+        if winner is None:
+            raise RuntimeError(
+                "No candidate could be generated: "
+                + "; ".join(report.error for report in reports if report.error)
+            )
+        print("No candidate passed, keeping candidate", winner + 1)
+    return generated[winner], reports
+
+
+def _add_usage(ai: AI, reports: List[CandidateReport]) -> None:
+    usage_log = ai.token_usage_log
+    for report in reports:
+        label = f"[candidate {report.index}]"
+        for usage in usage_log.log():
+            if usage.step_name.endswith(label):
+                report.prompt_tokens += usage.in_step_prompt_tokens
+                report.completion_tokens += usage.in_step_completion_tokens
+        report.cost = usage_log.cost(report.prompt_tokens, report.completion_tokens)
+
+
+def format_reports(reports: List[CandidateReport]) -> str:
+    """Format the reports of the candidates as a table."""
+    lines = ["candidate  status     tokens   cost ($)  time (s)"]
+    for report in reports:
+        cost = "n/a" if report.cost is None else f"{report.cost:.4f}"
+        lines.append(
+            f"{report.index:<10} {report.status:<10} "
+            f"{report.prompt_tokens + report.completion_tokens:<8} {cost:<9} "
+            f"{report.duration:.1f}"
+        )
+    return "\n".join(lines)
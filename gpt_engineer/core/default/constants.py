@@ -8,5 +8,26 @@ Constants
 ---------
 MAX_EDIT_REFINEMENT_STEPS : int
     The maximum number of refinement steps allowed when generating edit blocks.
+MANIFEST_FILES : Set[str]
+    The names of the dependency definition files of common package managers.
 """
 MAX_EDIT_REFINEMENT_STEPS = 2
+MANIFEST_FILES = {
+    "requirements.txt",
+    "pyproject.toml",
+    "setup.py",
+    "setup.cfg",
+    "Pipfile",
+    "Pipfile.lock",
+    "poetry.lock",
+    "environment.yml",
+    "package.json",
+    "package-lock.json",
+    "yarn.lock",
+    "pnpm-lock.yaml",
+    "Gemfile",
+    "Gemfile.lock",
+    "Cargo.toml",
+    "go.mod",
+    "composer.json",
+}
@@ -11,6 +11,11 @@ DiskExecutionEnv
     An execution environment that runs code on the local file system and captures
     the output of the execution.
 
+Functions
+---------
+kill_process_group
+    Kills a process started in a session of its own, and every process it started.
+
 Imports
 -------
 - subprocess: For running shell commands.
@@ -22,6 +27,8 @@ Imports
 - FilesDict: For handling collections of files.
 """
 
+import os
+import signal
 import subprocess
 import time
 
@@ -33,6 +40,23 @@ from gpt_engineer.core.default.file_store import FileStore
 from gpt_engineer.core.files_dict import FilesDict
 
 
+def kill_process_group(process: subprocess.Popen) -> None:
+    """
+    Kill a process started with `popen(..., new_session=True)` and every process it
+    started, then reap it.
+
+    Killing only the process would leave the programs started by the shell running.
+    """
+    if hasattr(os, "killpg"):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    else:
+        process.kill()
+    process.communicate()
+
+
 class DiskExecutionEnv(BaseExecutionEnv):
     """
     An execution environment that runs code on the local file system and captures
@@ -59,13 +83,14 @@ class DiskExecutionEnv(BaseExecutionEnv):
     def download(self) -> FilesDict:
         return self.files.pull()
 
-    def popen(self, command: str) -> subprocess.Popen:
+    def popen(self, command: str, new_session: bool = False) -> subprocess.Popen:
         p = subprocess.Popen(
             command,
             shell=True,
             cwd=self.files.working_dir,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
+            start_new_session=new_session,
         )
         return p
 
@@ -1,10 +1,12 @@
 import tempfile
 
 from pathlib import Path
-from typing import Union
+from typing import Optional, Union
 
+from gpt_engineer.core.base_memory import BaseMemory
 from gpt_engineer.core.files_dict import FilesDict
 from gpt_engineer.core.linting import Linting
+from gpt_engineer.core.profiling import profiled
 
 
 class FileStore:
@@ -44,9 +46,12 @@ class FileStore:
                 f.write(content)
         return self
 
-    def linting(self, files: FilesDict) -> FilesDict:
-        # lint the code
-        linting = Linting()
+    @profiled()
+    def linting(
+        self, files: FilesDict, cache: Optional[BaseMemory] = None
+    ) -> FilesDict:
+        # lint the code, remembering already formatted files in the cache, if given
+        linting = Linting(cache=cache)
         return linting.lint_files(files)
 
     def pull(self) -> FilesDict:
@@ -25,6 +25,24 @@ ENTRYPOINT_FILE : str
 ENTRYPOINT_LOG_FILE : str
     The filename for the log file that contains the chat related to entrypoint generation.
 
+README_FILE : str
+    The filename of the README generated along with the entrypoint.
+
+README_LOG_FILE : str
+    The filename for the log file that contains the chat related to README generation.
+
+LINT_CACHE_FILE : str
+    The filename, within the project memory, of the cache of already formatted file hashes.
+
+RELEVANCE_INDEX_FILE : str
+    The filename, within the metadata directory, of the lexical index used to select files.
+
+CHECKPOINTS_DIR : str
+    The directory, within the memory directory, where the outputs of completed steps are stored.
+
+PROFILE_TRACE_FILE : str
+    The filename, within the memory logs, of the Chrome trace written by `gpte --profile`.
+
 PREPROMPTS_PATH : Path
     The file system path to the directory containing preprompt files.
 
@@ -48,6 +66,12 @@ DIFF_LOG_FILE = "diff_errors.txt"
 DEBUG_LOG_FILE = "debug_log_file.txt"
 ENTRYPOINT_FILE = "run.sh"
 ENTRYPOINT_LOG_FILE = "gen_entrypoint_chat.txt"
+README_FILE = "README.md"
+README_LOG_FILE = "gen_readme_chat.txt"
+LINT_CACHE_FILE = "lint_cache.json"
+RELEVANCE_INDEX_FILE = "relevance_index.json"
+CHECKPOINTS_DIR = "checkpoints"
+PROFILE_TRACE_FILE = "profile_trace.json"
 ENTRYPOINT_FILE = "run.sh"
 PREPROMPTS_PATH = Path(__file__).parent.parent.parent / "preprompts"
 
@@ -15,13 +15,21 @@ from gpt_engineer.core.ai import AI
 from gpt_engineer.core.base_agent import BaseAgent
 from gpt_engineer.core.base_execution_env import BaseExecutionEnv
 from gpt_engineer.core.base_memory import BaseMemory
+from gpt_engineer.core.cassette_ai import cassette_ai_from_env
 from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
 from gpt_engineer.core.default.disk_memory import DiskMemory
 from gpt_engineer.core.default.paths import PREPROMPTS_PATH, memory_path
-from gpt_engineer.core.default.steps import gen_code, gen_entrypoint, improve_fn
+from gpt_engineer.core.default.steps import (
+    gen_code,
+    gen_code_with_entrypoint,
+    gen_entrypoint,
+    gen_readme,
+    improve_fn,
+)
 from gpt_engineer.core.files_dict import FilesDict
 from gpt_engineer.core.preprompts_holder import PrepromptsHolder
 from gpt_engineer.core.prompt import Prompt
+from gpt_engineer.core.step_graph import Step, StepGraph
 
 
 class SimpleAgent(BaseAgent):
@@ -42,6 +50,11 @@ class SimpleAgent(BaseAgent):
         The AI model used for generating and improving code.
     preprompts_holder : PrepromptsHolder
         The holder for preprompt messages that guide the AI model.
+    init_graph : StepGraph
+        The steps run to generate a codebase from a prompt. With speculative_entrypoint,
+        the entrypoint is requested while the code is still streaming, see
+        `gen_code_with_entrypoint`. With readme, a README is generated from the code
+        concurrently with the entrypoint.
     """
 
     def __init__(
@@ -50,11 +63,37 @@ class SimpleAgent(BaseAgent):
         execution_env: BaseExecutionEnv,
         ai: AI = None,
         preprompts_holder: PrepromptsHolder = None,
+        speculative_entrypoint: bool = False,
+        readme: bool = False,
     ):
         self.preprompts_holder = preprompts_holder or PrepromptsHolder(PREPROMPTS_PATH)
         self.memory = memory
         self.execution_env = execution_env
-        self.ai = ai or AI()
+        self.ai = ai or cassette_ai_from_env() or AI()
+        if speculative_entrypoint:
+            # the files come with their entrypoint
+            steps = [
+                Step(gen_code_with_entrypoint, inputs=["prompt"], output="files_dict")
+            ]
+            combined = ["files_dict"]
+        else:
+            steps = [
+                Step(gen_code, inputs=["prompt"], output="files_dict"),
+                Step(
+                    gen_entrypoint,
+                    inputs=["prompt", "files_dict"],
+                    output="entrypoint",
+                ),
+            ]
+            combined = ["files_dict", "entrypoint"]
+        if readme:
+            # only depends on the code, runs alongside the entrypoint
+            steps.append(
+                Step(gen_readme, inputs=["prompt", "files_dict"], output="readme")
+            )
+            combined.append("readme")
+        steps.append(Step(combine_files, inputs=combined, output="combined_dict"))
+        self.init_graph = StepGraph(steps)
 
     @classmethod
     def with_default_config(
@@ -68,13 +107,15 @@ class SimpleAgent(BaseAgent):
         )
 
     def init(self, prompt: Prompt) -> FilesDict:
-        files_dict = gen_code(self.ai, prompt, self.memory, self.preprompts_holder)
-        entrypoint = gen_entrypoint(
-            self.ai, prompt, files_dict, self.memory, self.preprompts_holder
+        values = self.init_graph.run(
+            {"prompt": prompt},
+            resources={
+                "ai": self.ai,
+                "memory": self.memory,
+                "preprompts_holder": self.preprompts_holder,
+            },
         )
-        combined_dict = {**files_dict, **entrypoint}
-        files_dict = FilesDict(combined_dict)
-        return files_dict
+        return values["combined_dict"]
 
     def improve(
         self,
@@ -88,6 +129,17 @@ class SimpleAgent(BaseAgent):
         return files_dict
 
 
+def combine_files(
+    files_dict: FilesDict,
+    entrypoint: Optional[FilesDict] = None,
+    readme: Optional[FilesDict] = None,
+) -> FilesDict:
+    """
+    Merges the generated code, its README and its entrypoint into a single FilesDict.
+    """
+    return FilesDict({**files_dict, **(readme or {}), **(entrypoint or {})})
+
+
 def default_config_agent():
     """
     Creates an instance of SimpleAgent with default configuration.
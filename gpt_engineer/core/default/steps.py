@@ -19,6 +19,12 @@ gen_code : function
 gen_entrypoint : function
     Generates an entrypoint for the codebase and returns the entrypoint files.
 
+gen_code_with_entrypoint : function
+    Generates code and, overlapping with it, its entrypoint.
+
+gen_readme : function
+    Generates a README for the codebase and returns it as a file.
+
 execute_entrypoint : function
     Executes the entrypoint of the codebase.
 
@@ -30,14 +36,16 @@ improve : function
     Improves the code based on user input and returns the updated files.
 """
 
+import functools
 import inspect
 import io
 import re
 import sys
 import traceback
 
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, MutableMapping, Union
+from typing import Dict, List, MutableMapping, Optional, Union
 
 from langchain.schema import HumanMessage, SystemMessage
 from termcolor import colored
@@ -46,7 +54,12 @@ from gpt_engineer.core.ai import AI
 from gpt_engineer.core.base_execution_env import BaseExecutionEnv
 from gpt_engineer.core.base_memory import BaseMemory
 from gpt_engineer.core.chat_to_files import apply_diffs, chat_to_files_dict, parse_diffs
-from gpt_engineer.core.default.constants import MAX_EDIT_REFINEMENT_STEPS
+from gpt_engineer.core.code_map import condensed_to_chat
+from gpt_engineer.core.context_window import retry_message
+from gpt_engineer.core.default.constants import (
+    MANIFEST_FILES,
+    MAX_EDIT_REFINEMENT_STEPS,
+)
 from gpt_engineer.core.default.paths import (
     CODE_GEN_LOG_FILE,
     DEBUG_LOG_FILE,
@@ -54,9 +67,13 @@ from gpt_engineer.core.default.paths import (
     ENTRYPOINT_FILE,
     ENTRYPOINT_LOG_FILE,
     IMPROVE_LOG_FILE,
+    README_FILE,
+    README_LOG_FILE,
 )
+from gpt_engineer.core.diff import ADD, Hunk
 from gpt_engineer.core.files_dict import FilesDict, file_to_lines_dict
-from gpt_engineer.core.preprompts_holder import PrepromptsHolder
+from gpt_engineer.core.preprompts_holder import PrepromptsHolder, on_preprompts_reload
+from gpt_engineer.core.profiling import INTERACTIVE_CATEGORY, profiled, span
 from gpt_engineer.core.prompt import Prompt
 
 
@@ -86,11 +103,11 @@ def setup_sys_prompt(preprompts: MutableMapping[Union[str, Path], str]) -> str:
     str
         The system prompt message for the AI model.
     """
-    return (
-        preprompts["roadmap"]
-        + preprompts["generate"].replace("FILE_FORMAT", preprompts["file_format"])
-        + "\nUseful to know:\n"
-        + preprompts["philosophy"]
+    return _assemble_sys_prompt(
+        preprompts["roadmap"],
+        preprompts["generate"],
+        preprompts["file_format"],
+        preprompts["philosophy"],
     )
 
 
@@ -110,14 +127,33 @@ def setup_sys_prompt_existing_code(
     str
         The system prompt message for the AI model to improve existing code.
     """
+    return _assemble_sys_prompt(
+        preprompts["roadmap"],
+        preprompts["improve"],
+        preprompts["file_format_diff"],
+        preprompts["philosophy"],
+    )
+
+
+@functools.lru_cache(maxsize=32)
+def _assemble_sys_prompt(
+    roadmap: str, instructions: str, file_format: str, philosophy: str
+) -> str:
+    # memoized: cached preprompts are the same string objects on every step, so the
+    # lookup neither rehashes nor compares them
     return (
-        preprompts["roadmap"]
-        + preprompts["improve"].replace("FILE_FORMAT", preprompts["file_format_diff"])
+        roadmap
+        + instructions.replace("FILE_FORMAT", file_format)
         + "\nUseful to know:\n"
-        + preprompts["philosophy"]
+        + philosophy
     )
 
 
+# the prompts assembled from preprompts that changed on disk are not used anymore
+on_preprompts_reload(_assemble_sys_prompt.cache_clear)
+
+
+@profiled()
 def gen_code(
     ai: AI, prompt: Prompt, memory: BaseMemory, preprompts_holder: PrepromptsHolder
 ) -> FilesDict:
@@ -150,6 +186,7 @@ def gen_code(
     return files_dict
 
 
+@profiled()
 def gen_entrypoint(
     ai: AI,
     prompt: Prompt,
@@ -202,6 +239,184 @@ def gen_entrypoint(
     return entrypoint_code
 
 
+@profiled()
+def gen_readme(
+    ai: AI,
+    prompt: Prompt,
+    files_dict: FilesDict,
+    memory: BaseMemory,
+    preprompts_holder: PrepromptsHolder,
+) -> FilesDict:
+    """
+    Generates a README for the codebase and returns it as a file.
+
+    It only depends on the code, so it can be generated concurrently with the
+    entrypoint, see `SimpleAgent`.
+
+    Parameters
+    ----------
+    ai : AI
+        The AI model used for generating the README.
+    prompt : Prompt
+        The prompt the codebase was generated from.
+    files_dict : FilesDict
+        The dictionary of file names to their respective source code content.
+    memory : BaseMemory
+        The memory interface where the code and related data are stored.
+    preprompts_holder : PrepromptsHolder
+        The holder for preprompt messages that guide the AI model.
+
+    Returns
+    -------
+    FilesDict
+        A dictionary containing the README file.
+    """
+    preprompts = preprompts_holder.get_preprompts()
+    messages = ai.start(
+        system=preprompts["readme"],
+        user="Write the README of this codebase, written for the request:\n"
+        + prompt.text
+        + "\nInformation about the codebase:\n\n"
+        + files_dict.to_chat(),
+        step_name=curr_fn(),
+    )
+    chat = messages[-1].content.strip()
+    # the README may hold code blocks of its own, it ends at the last fence
+    match = re.search(r"```\S*\n(.+)```", chat, re.DOTALL)
+    memory.log(README_LOG_FILE, "\n\n".join(x.pretty_repr() for x in messages))
+    return FilesDict({README_FILE: match.group(1) if match else chat})
+
+
+# Extensions of the files an entrypoint may refer to, checked when validating a
+# speculative entrypoint
+ENTRYPOINT_FILE_SUFFIXES = {
+    ".py", ".js", ".mjs", ".cjs", ".ts", ".jsx", ".tsx", ".sh", ".rb", ".go", ".rs",
+    ".java", ".php", ".c", ".cpp", ".html", ".json", ".toml", ".txt", ".cfg", ".yml",
+    ".yaml",
+}  # fmt: skip
+
+
+@profiled()
+def gen_code_with_entrypoint(
+    ai: AI, prompt: Prompt, memory: BaseMemory, preprompts_holder: PrepromptsHolder
+) -> FilesDict:
+    """
+    Generates code like `gen_code` and its entrypoint like `gen_entrypoint`, overlapping
+    the two requests.
+
+    The code is streamed, and the model is asked to write the dependency definition
+    file right after the entrypoint file. As soon as a dependency definition file is
+    complete, the entrypoint is requested in the background from the files complete
+    so far, while the rest of the code streams in. Once the code is complete, the
+    speculative entrypoint is kept unless the final files contradict it, see
+    `entrypoint_contradictions`, or its request failed, in which case it is generated
+    again from all files.
+
+    Parameters
+    ----------
+    ai : AI
+        The AI model used for generating the code and the entrypoint.
+    prompt : Prompt
+        The user prompt to generate code from.
+    memory : BaseMemory
+        The memory interface where the code and related data are stored.
+    preprompts_holder : PrepromptsHolder
+        The holder for preprompt messages that guide the AI model.
+
+    Returns
+    -------
+    FilesDict
+        The generated files, including the entrypoint.
+    """
+    preprompts = preprompts_holder.get_preprompts()
+    speculated: Dict[str, FilesDict] = {}
+    entrypoint_future: Optional[Future] = None
+    fences_seen = 0
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+
+        def on_text(text: str) -> None:
+            nonlocal entrypoint_future, fences_seen
+            fences = text.count("```")
+            # files only complete when a code block closes
+            if entrypoint_future is not None or fences == fences_seen or fences % 2:
+                return
+            fences_seen = fences
+            files_dict = chat_to_files_dict(text)
+            if any(Path(name).name in MANIFEST_FILES for name in files_dict):
+                speculated["files_dict"] = files_dict
+                entrypoint_future = executor.submit(
+                    gen_entrypoint, ai, prompt, files_dict, memory, preprompts_holder
+                )
+
+        messages = ai.start(
+            setup_sys_prompt(preprompts)
+            + "\nOutput the dependency definition file right after the entrypoint file.",
+            prompt.to_langchain_content(),
+            step_name=curr_fn(),
+            on_text=on_text,
+        )
+        chat = messages[-1].content.strip()
+        memory.log(CODE_GEN_LOG_FILE, "\n\n".join(x.pretty_repr() for x in messages))
+        files_dict = chat_to_files_dict(chat)
+
+        entrypoint = None
+        if entrypoint_future is not None:
+            try:
+                entrypoint = entrypoint_future.result()
+            except Exception as e:
+                # e.g. rate limited, the entrypoint is generated again from all files
+                print(
+                    f"Generating the entrypoint again: the speculative one failed: {e}"
+                )
+            if entrypoint is not None:
+                contradictions = entrypoint_contradictions(
+                    entrypoint[ENTRYPOINT_FILE], speculated["files_dict"], files_dict
+                )
+                if contradictions:
+                    print(
+                        "Generating the entrypoint again: " + "; ".join(contradictions)
+                    )
+                    entrypoint = None
+    if entrypoint is None:
+        entrypoint = gen_entrypoint(ai, prompt, files_dict, memory, preprompts_holder)
+    return FilesDict({**files_dict, **entrypoint})
+
+
+def entrypoint_contradictions(
+    entrypoint: str, speculated_files: FilesDict, files_dict: FilesDict
+) -> List[str]:
+    """
+    The reasons why an entrypoint written from part of the files does not fit the
+    complete files: dependency definition files that changed or appeared later, and
+    files the entrypoint refers to that do not exist.
+
+    Parameters
+    ----------
+    entrypoint : str
+        The entrypoint script.
+    speculated_files : FilesDict
+        The files the entrypoint was written from.
+    files_dict : FilesDict
+        The complete files.
+
+    Returns
+    -------
+    List[str]
+        The contradictions found, empty if the entrypoint is valid.
+    """
+    contradictions = []
+    for name, content in files_dict.items():
+        if Path(name).name in MANIFEST_FILES and speculated_files.get(name) != content:
+            contradictions.append(f"{name} changed after the entrypoint was written")
+    for token in re.findall(r"[\w./-]+", entrypoint):
+        name = token[2:] if token.startswith("./") else token
+        if Path(name).suffix in ENTRYPOINT_FILE_SUFFIXES and name not in files_dict:
+            contradictions.append(f"{name} does not exist")
+    return contradictions
+
+
+@profiled()
 def execute_entrypoint(
     ai: AI,
     execution_env: BaseExecutionEnv,
@@ -248,7 +463,9 @@ def execute_entrypoint(
     print()
     print(command)
     print()
-    if input("").lower() not in ["", "y", "yes"]:
+    with span("confirm_execution", INTERACTIVE_CATEGORY):
+        answer = input("")
+    if answer.lower() not in ["", "y", "yes"]:
         print("Ok, not executing the code.")
         return files_dict
     print("Executing the code...")
@@ -268,6 +485,7 @@ def execute_entrypoint(
     return files_dict
 
 
+@profiled()
 def improve_fn(
     ai: AI,
     prompt: Prompt,
@@ -275,6 +493,8 @@ def improve_fn(
     memory: BaseMemory,
     preprompts_holder: PrepromptsHolder,
     diff_timeout=3,
+    code_map=False,
+    targeted_retry=False,
 ) -> FilesDict:
     """
     Improves the code based on user input and returns the updated files.
@@ -291,6 +511,15 @@ def improve_fn(
         The memory interface where the code and related data are stored.
     preprompts_holder : PrepromptsHolder
         The holder for preprompt messages that guide the AI model.
+    diff_timeout : int, optional
+        The timeout, in seconds, of the regexp searches when correcting diffs.
+    code_map : bool, optional
+        Send the bodies of functions and classes only when they are relevant to the
+        prompt, and their signatures otherwise. Diffs still apply to the full files.
+    targeted_retry : bool, optional
+        When some diffs fail, ask for corrections in a fresh conversation holding only
+        the failed hunks, the problems found and windows of the affected files, instead
+        of resending the whole conversation.
 
     Returns
     -------
@@ -303,45 +532,165 @@ def improve_fn(
     ]
 
     # Add files as input
-    messages.append(HumanMessage(content=f"{files_dict.to_chat()}"))
+    if code_map:
+        messages.append(
+            HumanMessage(
+                content=f"{condensed_to_chat(files_dict, prompt.text)}\n"
+                "Lines like `... (lines 12-40 omitted)` stand for code that is not shown. "
+                "Do not edit omitted lines."
+            )
+        )
+    else:
+        messages.append(HumanMessage(content=f"{files_dict.to_chat()}"))
     messages.append(HumanMessage(content=prompt.to_langchain_content()))
     memory.log(
         DEBUG_LOG_FILE,
         "UPLOADED FILES:\n" + files_dict.to_log() + "\nPROMPT:\n" + prompt.text,
     )
-    return _improve_loop(ai, files_dict, memory, messages, diff_timeout=diff_timeout)
+    return _improve_loop(
+        ai,
+        files_dict,
+        memory,
+        messages,
+        diff_timeout=diff_timeout,
+        targeted_retry=targeted_retry,
+    )
 
 
 def _improve_loop(
-    ai: AI, files_dict: FilesDict, memory: BaseMemory, messages: List, diff_timeout=3
+    ai: AI,
+    files_dict: FilesDict,
+    memory: BaseMemory,
+    messages: List,
+    diff_timeout=3,
+    targeted_retry=False,
 ) -> FilesDict:
     messages = ai.next(messages, step_name=curr_fn())
-    files_dict, errors = salvage_correct_hunks(
+    files_dict, errors, failed_hunks = _salvage_correct_hunks(
         messages, files_dict, memory, diff_timeout=diff_timeout
     )
 
     retries = 0
     while errors and retries < MAX_EDIT_REFINEMENT_STEPS:
-        messages.append(
-            HumanMessage(
-                content="Some previously produced diffs were not on the requested format, or the code part was not found in the code. Details:\n"
-                + "\n".join(errors)
-                + "\n Only rewrite the problematic diffs, making sure that the failing ones are now on the correct format and can be found in the code. Make sure to not repeat past mistakes. \n"
+        if targeted_retry and failed_hunks:
+            # a fresh, minimal conversation: the diff format instructions, windows of
+            # the files around the failed hunks, and the failed hunks with their problems
+            retry_messages = [
+                messages[0],
+                HumanMessage(content=failed_hunks_context(files_dict, failed_hunks)),
+                HumanMessage(
+                    content="Some diffs you produced for the code above were not on the requested format, or the code part was not found in the code. The failing diffs:\n```diff\n"
+                    + "\n".join(
+                        f"--- {name}\n+++ {name}\n"
+                        + "".join(hunk.hunk_to_string() for hunk in hunks)
+                        for name, hunks in failed_hunks.items()
+                    )
+                    + "```\nDetails:\n"
+                    + "\n".join(errors)
+                    + "\n Only rewrite the failing diffs against the code above, making sure that they are now on the correct format and can be found in the code. Make sure to not repeat past mistakes. \n"
+                ),
+            ]
+            response = ai.next(retry_messages, step_name=curr_fn())
+        else:
+            messages.append(
+                retry_message(
+                    "Some previously produced diffs were not on the requested format, or the code part was not found in the code. Details:\n"
+                    + "\n".join(errors)
+                    + "\n Only rewrite the problematic diffs, making sure that the failing ones are now on the correct format and can be found in the code. Make sure to not repeat past mistakes. \n"
+                )
             )
-        )
-        messages = ai.next(messages, step_name=curr_fn())
-        files_dict, errors = salvage_correct_hunks(
-            messages, files_dict, memory, diff_timeout
+            messages = response = ai.next(messages, step_name=curr_fn())
+        files_dict, errors, failed_hunks = _salvage_correct_hunks(
+            response, files_dict, memory, diff_timeout
         )
         retries += 1
 
     return files_dict
 
 
+def failed_hunks_context(
+    files_dict: FilesDict, failed_hunks: Dict[str, List[Hunk]], window=20
+) -> str:
+    """
+    Formats the parts of the files where failed hunks were meant to apply, like
+    `FilesDict.to_chat` but only with the lines within `window` lines of the line
+    numbers the hunks claim, or of the lines matching their first original line.
+
+    Parameters
+    ----------
+    files_dict : FilesDict
+        The current files, with the valid hunks already applied.
+    failed_hunks : Dict[str, List[Hunk]]
+        The hunks that could not be applied, per file name.
+    window : int, optional
+        The number of lines shown before and after every anchor line.
+
+    Returns
+    -------
+    str
+        A string representation of the windows of the files.
+    """
+    chat_str = ""
+    for file_name, hunks in failed_hunks.items():
+        if file_name not in files_dict:
+            continue
+        lines_dict = file_to_lines_dict(files_dict[file_name])
+        anchors = set()
+        for hunk in hunks:
+            if 0 < hunk.start_line_pre_edit <= len(lines_dict):
+                anchors.add(hunk.start_line_pre_edit)
+            original = [line for line_type, line in hunk.lines if line_type != ADD]
+            if original and original[0].strip():
+                matches = [
+                    n
+                    for n, line in lines_dict.items()
+                    if line.strip() == original[0].strip()
+                ]
+                anchors.update(matches[:3])
+        file_window = window
+        if not anchors:
+            # nowhere to anchor the hunks, show the whole file
+            anchors = {1}
+            file_window = len(lines_dict)
+        shown = set()
+        for anchor in anchors:
+            shown.update(range(max(1, anchor - file_window), anchor + file_window + 1))
+
+        chat_str += f"File: {file_name}\n"
+        previous = 0
+        for line_number, line_content in lines_dict.items():
+            if line_number not in shown:
+                continue
+            if line_number > previous + 1:
+                chat_str += f"... (lines {previous + 1}-{line_number - 1} omitted)\n"
+            chat_str += f"{line_number} {line_content}\n"
+            previous = line_number
+        if previous < len(lines_dict):
+            chat_str += f"... (lines {previous + 1}-{len(lines_dict)} omitted)\n"
+        chat_str += "\n"
+    return f"```\n{chat_str}```"
+
+
 def salvage_correct_hunks(
     messages: List, files_dict: FilesDict, memory: BaseMemory, diff_timeout=3
 ) -> tuple[FilesDict, List[str]]:
+    files_dict, error_messages, _ = _salvage_correct_hunks(
+        messages, files_dict, memory, diff_timeout
+    )
+    return files_dict, error_messages
+
+
+# profiled here, since _improve_loop calls it directly
+@profiled("salvage_correct_hunks")
+def _salvage_correct_hunks(
+    messages: List, files_dict: FilesDict, memory: BaseMemory, diff_timeout=3
+) -> tuple[FilesDict, List[str], Dict[str, List[Hunk]]]:
+    """
+    Applies the valid hunks of the last message, and returns the updated files, the
+    problems found, and the hunks that failed validation per file name.
+    """
     error_messages = []
+    failed_hunks = {}
     ai_response = messages[-1].content.strip()
 
     diffs = parse_diffs(ai_response, diff_timeout=diff_timeout)
@@ -350,14 +699,18 @@ def salvage_correct_hunks(
     for _, diff in diffs.items():
         # if diff is a new file, validation and correction is unnecessary
         if not diff.is_new_file():
+            hunks = list(diff.hunks)
             problems = diff.validate_and_correct(
                 file_to_lines_dict(files_dict[diff.filename_pre])
             )
             error_messages.extend(problems)
+            failed = [hunk for hunk in hunks if hunk not in diff.hunks]
+            if failed:
+                failed_hunks[diff.filename_pre] = failed
     files_dict = apply_diffs(diffs, files_dict)
     memory.log(IMPROVE_LOG_FILE, "\n\n".join(x.pretty_repr() for x in messages))
     memory.log(DIFF_LOG_FILE, "\n\n".join(error_messages))
-    return files_dict, error_messages
+    return files_dict, error_messages, failed_hunks
 
 
 class Tee(object):
@@ -373,13 +726,27 @@ class Tee(object):
             file.flush()
 
 
-def handle_improve_mode(prompt, agent, memory, files_dict, diff_timeout=3):
+def handle_improve_mode(
+    prompt,
+    agent,
+    memory,
+    files_dict,
+    diff_timeout=3,
+    code_map=False,
+    targeted_retry=False,
+):
     captured_output = io.StringIO()
     old_stdout = sys.stdout
     sys.stdout = Tee(sys.stdout, captured_output)
 
     try:
-        files_dict = agent.improve(files_dict, prompt, diff_timeout=diff_timeout)
+        files_dict = agent.improve(
+            files_dict,
+            prompt,
+            diff_timeout=diff_timeout,
+            code_map=code_map,
+            targeted_retry=targeted_retry,
+        )
     except Exception as e:
         print(
             f"Error while improving the project: {e}\nCould you please upload the debug_log_file.txt in {memory.path}/logs folder to github?\nFULL STACK TRACE:\n"
@@ -1,11 +1,19 @@
+import os
+import re
 import shutil
 import subprocess
+import threading
 
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Pattern, Tuple
 
 from gpt_engineer.core.files_dict import FilesDict
 
+# Results of git invocations, keyed by the repository state they were computed for
+_GIT_RESULTS_CACHE: Dict[Tuple, List[str]] = {}
+_GIT_RESULTS_CACHE_SIZE = 64
+_GIT_RESULTS_LOCK = threading.Lock()
+
 
 def is_git_installed():
     return shutil.which("git") is not None
@@ -23,6 +31,93 @@ def is_git_repo(path: Path):
     )
 
 
+def find_git_root(path: Path) -> Optional[Path]:
+    """
+    Return the root of the git work tree containing path, without spawning git.
+
+    Parameters
+    ----------
+    path : Path
+        A path inside the work tree.
+
+    Returns
+    -------
+    Optional[Path]
+        The directory containing the `.git` entry, or None if path is not inside a work tree.
+    """
+    path = Path(path).resolve()
+    for directory in [path, *path.parents]:
+        if (directory / ".git").exists():
+            return directory
+    return None
+
+
+def _git_dir(root: Path) -> Path:
+    """Resolve the git directory of a work tree, following `gitdir:` files of worktrees and submodules."""
+    dot_git = root / ".git"
+    if dot_git.is_file():
+        content = dot_git.read_text(encoding="utf-8", errors="replace").strip()
+        if content.startswith("gitdir:"):
+            return (root / content[len("gitdir:") :].strip()).resolve()
+    return dot_git
+
+
+def _mtime_ns(path: Path) -> int:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _repo_state(root: Path) -> Tuple[str, int]:
+    """
+    A cheap fingerprint of the repository state: the commit HEAD points to and the
+    modification time of the index. It changes on every commit, checkout and staging.
+    """
+    git_dir = _git_dir(root)
+    try:
+        head = (git_dir / "HEAD").read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        head = ""
+    if head.startswith("ref:"):
+        ref = git_dir / head[len("ref:") :].strip()
+        try:
+            head += ref.read_text(encoding="utf-8", errors="replace")
+        except OSError:
+            # packed refs, fall back on their modification time
+            head += str(_mtime_ns(git_dir / "packed-refs"))
+    return head, _mtime_ns(git_dir / "index")
+
+
+def _gitignore_mtimes(
+    root: Path, path: Path, file_list: List[str]
+) -> Tuple[Tuple[str, int], ...]:
+    """
+    The modification times of every .gitignore consulted for file_list: those from the
+    work tree root down to path, and those of the directories below path holding files.
+    """
+    path = path.resolve()
+    directories = {path, *(d for d in path.parents if d.is_relative_to(root))}
+    for file in file_list:
+        for directory in Path(file).parents:
+            directories.add(path / directory)
+    return tuple(sorted((str(d), _mtime_ns(d / ".gitignore")) for d in directories))
+
+
+def _cached_git_result(key: Tuple, compute) -> List[str]:
+    with _GIT_RESULTS_LOCK:
+        if key in _GIT_RESULTS_CACHE:
+            return _GIT_RESULTS_CACHE[key]
+    # git runs outside the lock, so that concurrent lookups do not wait on each other
+    result = compute()
+    with _GIT_RESULTS_LOCK:
+        if key not in _GIT_RESULTS_CACHE:
+            while len(_GIT_RESULTS_CACHE) >= _GIT_RESULTS_CACHE_SIZE:
+                _GIT_RESULTS_CACHE.pop(next(iter(_GIT_RESULTS_CACHE)))
+            _GIT_RESULTS_CACHE[key] = result
+    return result
+
+
 def init_git_repo(path: Path):
     subprocess.run(["git", "init"], cwd=path)
 
@@ -41,14 +136,36 @@ def has_uncommitted_changes(path: Path):
 def filter_files_with_uncommitted_changes(
     basepath: Path, files_dict: FilesDict
 ) -> List[Path]:
-    files_with_diff = (
-        subprocess.run(
-            ["git", "diff", "--name-only"], cwd=basepath, stdout=subprocess.PIPE
+    """
+    Return the files of files_dict that have unstaged changes in the work tree.
+
+    The result of the single `git diff` call is cached per HEAD, index and the
+    modification times of the files, so repeated calls on an unchanged tree are free.
+    """
+    basepath = Path(basepath)
+    root = find_git_root(basepath)
+    if root is None:
+        return []
+
+    def files_with_diff() -> List[str]:
+        return (
+            subprocess.run(
+                ["git", "diff", "--name-only", "--relative", "-z"],
+                cwd=basepath,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+            .stdout.decode()
+            .split("\0")
         )
-        .stdout.decode()
-        .splitlines()
+
+    file_stats = tuple(
+        (str(f), _mtime_ns(basepath / f), (basepath / f).exists())
+        for f in files_dict.keys()
     )
-    return [f for f in files_dict.keys() if f in files_with_diff]
+    key = ("diff", str(basepath.resolve()), _repo_state(root), file_stats)
+    changed = set(_cached_git_result(key, files_with_diff))
+    return [f for f in files_dict.keys() if Path(f).as_posix() in changed]
 
 
 def stage_files(path: Path, files: List[str]):
@@ -56,16 +173,108 @@ def stage_files(path: Path, files: List[str]):
 
 
 def filter_by_gitignore(path: Path, file_list: List[str]) -> List[str]:
-    out = subprocess.run(
-        ["git", "-C", ".", "check-ignore", "--no-index", "--stdin"],
-        cwd=path,
-        input="\n".join(file_list).encode(),
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
+    """
+    Filter out the files that are ignored by .gitignore rules.
+
+    Inside a git work tree all candidates go through a single `git check-ignore` call,
+    which also honours global excludes and `.git/info/exclude`; the result is cached
+    per repository state. If path is not inside a work tree, or the whole project
+    directory is itself ignored by an enclosing repository, the .gitignore files of the
+    project are evaluated in-process instead.
+
+    Parameters
+    ----------
+    path : Path
+        The directory the paths in file_list are relative to.
+    file_list : List[str]
+        The candidate file paths.
+
+    Returns
+    -------
+    List[str]
+        file_list without the ignored files.
+    """
+    path = Path(path)
+    root = find_git_root(path)
+    if root is None:
+        return filter_by_gitignore_files(path, file_list)
+
+    def ignored_paths() -> List[str]:
+        # "." is checked along with the files, to detect a project nested in an ignored directory
+        out = subprocess.run(
+            ["git", "-C", ".", "check-ignore", "--no-index", "--stdin", "-z"],
+            cwd=path,
+            input="\0".join([".", *file_list]).encode(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        return out.stdout.decode().split("\0")
+
+    key = (
+        "check-ignore",
+        str(path.resolve()),
+        _repo_state(root),
+        _gitignore_mtimes(root, path, file_list),
+        _mtime_ns(_git_dir(root) / "info" / "exclude"),
+        tuple(file_list),
     )
-    paths = out.stdout.decode().splitlines()
+    ignored = set(_cached_git_result(key, ignored_paths))
+    if "." in ignored:
+        # the enclosing repository ignores the project as a whole, its rules do not apply inside it
+        return filter_by_gitignore_files(path, file_list)
     # return file_list but filter out the results from git check-ignore
-    return [f for f in file_list if f not in paths]
+    return [f for f in file_list if f not in ignored]
+
+
+def filter_by_gitignore_files(path: Path, file_list: List[str]) -> List[str]:
+    """
+    Filter out the files ignored by the .gitignore files found in path and its
+    subdirectories, evaluated in-process with compiled pattern sets per directory.
+
+    Parameters
+    ----------
+    path : Path
+        The directory the paths in file_list are relative to.
+    file_list : List[str]
+        The candidate file paths.
+
+    Returns
+    -------
+    List[str]
+        file_list without the ignored files.
+    """
+    path = Path(path)
+    specs_by_dir: Dict[str, List[Tuple[str, GitignoreSpec]]] = {}
+    ignored_dirs: Dict[str, bool] = {}
+
+    def specs_for(reldir: str) -> List[Tuple[str, GitignoreSpec]]:
+        if reldir not in specs_by_dir:
+            parent = specs_for(os.path.dirname(reldir)) if reldir else []
+            gitignore = path / reldir / ".gitignore"
+            if gitignore.is_file():
+                parent = parent + [(reldir, GitignoreSpec.from_file(gitignore))]
+            specs_by_dir[reldir] = parent
+        return specs_by_dir[reldir]
+
+    def dir_ignored(reldir: str) -> bool:
+        if not reldir:
+            return False
+        if reldir not in ignored_dirs:
+            parent = os.path.dirname(reldir)
+            ignored_dirs[reldir] = dir_ignored(parent) or is_ignored(
+                specs_for(parent), reldir, True
+            )
+        return ignored_dirs[reldir]
+
+    kept = []
+    for file in file_list:
+        relpath = Path(file).as_posix()
+        reldir = os.path.dirname(relpath)
+        if not dir_ignored(reldir) and not is_ignored(
+            specs_for(reldir), relpath, False
+        ):
+            kept.append(file)
+    return kept
 
 
 def stage_uncommitted_to_git(path, files_dict, improve_mode):
@@ -75,7 +284,7 @@ def stage_uncommitted_to_git(path, files_dict, improve_mode):
             print("\nInitializing an empty git repository")
             init_git_repo(path)
 
-    if is_git_repo(path):
+    if find_git_root(path) is not None:
         modified_files = filter_files_with_uncommitted_changes(path, files_dict)
         if modified_files:
             print(
@@ -83,3 +292,134 @@ def stage_uncommitted_to_git(path, files_dict, improve_mode):
                 ", ".join(modified_files),
             )
             stage_files(path, modified_files)
+
+
+def _gitignore_pattern_to_regex(pattern: str) -> str:
+    """Translate the body of a gitignore pattern to a regex matching posix relative paths."""
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i) and (i == 0 or pattern[i - 1] == "/"):
+            # leading or inner "**/" matches zero or more directories
+            regex += "(?:.*/)?"
+            i += 3
+        elif (
+            pattern.startswith("**", i)
+            and i + 2 == len(pattern)
+            and i > 0
+            and pattern[i - 1] == "/"
+        ):
+            # trailing "/**" matches everything inside
+            regex += ".*"
+            i += 2
+        elif c == "*":
+            regex += "[^/]*"
+            i += 1
+        elif c == "?":
+            regex += "[^/]"
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                regex += re.escape(c)
+                i += 1
+            else:
+                body = pattern[i + 1 : end]
+                if body[0] in "!^":
+                    body = "^" + body[1:]
+                regex += "[" + body.replace("\\", "\\\\") + "]"
+                i = end + 1
+        elif c == "\\" and i + 1 < len(pattern):
+            regex += re.escape(pattern[i + 1])
+            i += 2
+        else:
+            regex += re.escape(c)
+            i += 1
+    if not anchored:
+        # patterns without a slash match at any depth below the .gitignore
+        regex = "(?:.*/)?" + regex
+    return "^" + regex + "$"
+
+
+class GitignoreSpec:
+    """
+    The compiled patterns of a single .gitignore file.
+
+    Paths are matched relative to the directory containing the .gitignore, using posix
+    separators. Like git, the last matching pattern decides, and patterns ending in a
+    slash only match directories.
+    """
+
+    def __init__(self, lines: List[str]):
+        self.patterns: List[Tuple[Pattern, bool, bool]] = []
+        for line in lines:
+            line = line.rstrip("\n").rstrip("\r")
+            if line.endswith(" ") and not line.endswith("\\ "):
+                line = line.rstrip(" ")
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            self.patterns.append(
+                (re.compile(_gitignore_pattern_to_regex(line)), negate, dir_only)
+            )
+
+    @classmethod
+    def from_file(cls, path: Path) -> "GitignoreSpec":
+        try:
+            return cls(path.read_text(encoding="utf-8", errors="replace").splitlines())
+        except OSError:
+            return cls([])
+
+    def match(self, relpath: str, is_dir: bool) -> Optional[bool]:
+        """
+        Return True if the path is ignored, False if it is explicitly re-included with a
+        negated pattern, and None if no pattern matches it.
+        """
+        for regex, negate, dir_only in reversed(self.patterns):
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relpath):
+                return not negate
+        return None
+
+
+def is_ignored(
+    specs: List[Tuple[str, GitignoreSpec]], relpath: str, is_dir: bool
+) -> bool:
+    """
+    Check a path against a stack of .gitignore specs.
+
+    Parameters
+    ----------
+    specs : List[Tuple[str, GitignoreSpec]]
+        Pairs of the posix directory (relative to the walk root, "" for the root) each
+        .gitignore lives in and its compiled patterns, ordered from outermost to innermost.
+    relpath : str
+        The posix path relative to the walk root.
+    is_dir : bool
+        Whether the path is a directory.
+
+    Returns
+    -------
+    bool
+        True if the innermost matching .gitignore ignores the path.
+    """
+    for base, spec in reversed(specs):
+        if base:
+            if not relpath.startswith(base + "/"):
+                continue
+            matched = spec.match(relpath[len(base) + 1 :], is_dir)
+        else:
+            matched = spec.match(relpath, is_dir)
+        if matched is not None:
+            return matched
+    return False
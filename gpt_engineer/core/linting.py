@@ -1,37 +1,82 @@
+import hashlib
+import json
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, Optional, Tuple
+
 import black
 
+from gpt_engineer.core.base_memory import BaseMemory
+from gpt_engineer.core.default.paths import LINT_CACHE_FILE
 from gpt_engineer.core.files_dict import FilesDict
 
+# Spawning worker processes costs more than formatting a handful of files serially
+PARALLEL_LINTING_THRESHOLD = 8
+# Upper bound on the number of "already formatted" hashes remembered per black version and mode
+MAX_CACHED_HASHES = 20000
+
+
+def _content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _format_python(content: str, config: dict) -> Tuple[str, Optional[str], float]:
+    """
+    Format python source with black. Lives at module level so it can be sent to worker processes.
+
+    Returns the formatted content (the original content on failure), the error message if
+    formatting failed and the time spent formatting in seconds.
+    """
+    start = time.perf_counter()
+    error = None
+    try:
+        linted_content = black.format_str(content, mode=black.FileMode(**config))
+    except black.NothingChanged:
+        linted_content = content
+    except Exception as e:
+        error = str(e)
+        linted_content = content
+    return linted_content, error, time.perf_counter() - start
+
 
 class Linting:
-    def __init__(self):
+    def __init__(self, cache: BaseMemory = None, max_workers: int = None):
+        """
+        Parameters
+        ----------
+        cache : BaseMemory, optional
+            Memory in which hashes of already formatted files are stored, so unchanged files
+            are not formatted again on the next run. No caching is done if not provided.
+        max_workers : int, optional
+            The maximum number of processes used to format python files. Defaults to the
+            number of processors on the machine.
+        """
         # Dictionary to hold linting methods for different file types
         self.linters = {".py": self.lint_python}
-
-    import black
+        self.cache = cache
+        self.max_workers = max_workers
 
     def lint_python(self, content, config):
         """Lint Python files using the `black` library, handling all exceptions silently and logging them.
         This function attempts to format the code and returns the formatted code if successful.
         If any error occurs during formatting, it logs the error and returns the original content.
         """
-        try:
-            # Try to format the content using black
-            linted_content = black.format_str(content, mode=black.FileMode(**config))
-        except black.NothingChanged:
-            # If nothing changed, log the info and return the original content
-            print("\nInfo: No changes were made during formatting.\n")
-            linted_content = content
-        except Exception as error:
-            # If any other exception occurs, log the error and return the original content
+        linted_content, error, _ = _format_python(content, config)
+        if error is not None:
+            # If any exception occurs, log the error and return the original content
             print(f"\nError: Could not format due to {error}\n")
-            linted_content = content
         return linted_content
 
     def lint_files(self, files_dict: FilesDict, config: dict = None) -> FilesDict:
         """
         Lints files based on their extension using registered linting functions.
 
+        Python files are formatted across a process pool. Files whose content hash matches a
+        cached record of already formatted content, for the same black version and mode, are
+        skipped.
+
         Parameters
         ----------
         files_dict : FilesDict
@@ -47,11 +92,22 @@ class Linting:
         if config is None:
             config = {}
 
+        cache_key = self._cache_key(config)
+        formatted_hashes = self._load_formatted_hashes(cache_key)
+        python_files = {}
+
         for filename, content in files_dict.items():
             extension = filename[
                 filename.rfind(".") :
             ].lower()  # Ensure case insensitivity
-            if extension in self.linters:
+            if extension not in self.linters:
+                print(f"No linter registered for {filename}.")
+            elif self.linters[extension] == self.lint_python:
+                if _content_hash(content) in formatted_hashes:
+                    print(f"No changes made for {filename} (already formatted).")
+                else:
+                    python_files[filename] = content
+            else:
                 original_content = content
                 linted_content = self.linters[extension](content, config)
                 if linted_content != original_content:
@@ -59,6 +115,74 @@ class Linting:
                 else:
                     print(f"No changes made for {filename}.")
                 files_dict[filename] = linted_content
+
+        results = self._format_python_files(python_files, config)
+        for filename, (linted_content, error, seconds) in results.items():
+            if error is not None:
+                print(f"\nError: Could not format {filename} due to {error}\n")
+            elif linted_content != python_files[filename]:
+                print(f"Linted {filename} in {seconds:.3f}s.")
             else:
-                print(f"No linter registered for {filename}.")
+                print(f"No changes made for {filename} ({seconds:.3f}s).")
+            if error is None:
+                formatted_hashes[_content_hash(linted_content)] = None
+            files_dict[filename] = linted_content
+
+        if results:
+            self._save_formatted_hashes(cache_key, formatted_hashes)
         return files_dict
+
+    def _format_python_files(
+        self, python_files: Dict[str, str], config: dict
+    ) -> Dict[str, Tuple[str, Optional[str], float]]:
+        contents = list(python_files.values())
+        if len(contents) < PARALLEL_LINTING_THRESHOLD or self.max_workers == 1:
+            formatted = [_format_python(content, config) for content in contents]
+        else:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                formatted = list(
+                    executor.map(
+                        _format_python,
+                        contents,
+                        repeat(config),
+                        chunksize=max(1, len(contents) // 64),
+                    )
+                )
+        return dict(zip(python_files.keys(), formatted))
+
+    @staticmethod
+    def _cache_key(config: dict) -> str:
+        try:
+            mode_key = black.FileMode(**config).get_cache_key()
+        except Exception:
+            mode_key = json.dumps(config, sort_keys=True, default=str)
+        return f"black-{black.__version__}-{mode_key}"
+
+    def _load_formatted_hashes(self, cache_key: str) -> Dict[str, None]:
+        # A dict is used as an insertion ordered set, so the oldest hashes can be evicted first
+        if self.cache is None or LINT_CACHE_FILE not in self.cache:
+            return {}
+        try:
+            records = json.loads(self.cache[LINT_CACHE_FILE])
+        except ValueError:
+            return {}
+        return dict.fromkeys(records.get(cache_key, []))
+
+    def _save_formatted_hashes(self, cache_key: str, hashes: Dict[str, None]) -> None:
+        if self.cache is None:
+            return
+        records = {}
+        if LINT_CACHE_FILE in self.cache:
+            try:
+                records = json.loads(self.cache[LINT_CACHE_FILE])
+            except ValueError:
+                pass
+        # Records made by other black versions can never be hit again
+        version_prefix = f"black-{black.__version__}-"
+        records = {
+            key: value
+            for key, value in records.items()
+            if key.startswith(version_prefix)
+        }
+        records[cache_key] = list(hashes)[-MAX_CACHED_HASHES:]
+        self.cache[LINT_CACHE_FILE] = json.dumps(records)
@@ -1,14 +1,52 @@
+import os
+import threading
+
 from pathlib import Path
-from typing import Dict
+from typing import Callable, Dict, List, Tuple
 
 from gpt_engineer.core.default.disk_memory import DiskMemory
 
+# Preprompts read, per resolved directory, with the version of the directory they were
+# read from. Shared by all holders of the process.
+_PREPROMPTS_CACHE: Dict[str, Tuple[tuple, Dict[str, str]]] = {}
+_PREPROMPTS_CACHE_LOCK = threading.Lock()
+# Called when cached preprompts are read again, to drop what was derived from them
+_RELOAD_CALLBACKS: List[Callable[[], None]] = []
+
+
+def on_preprompts_reload(callback: Callable[[], None]) -> None:
+    """Call callback whenever preprompts that were cached change on disk."""
+    _RELOAD_CALLBACKS.append(callback)
+
+
+def _directory_version(path: Path) -> tuple:
+    """
+    The version of a directory: the name, modification time and size of its files.
+
+    One stat per file, about a dozen for the preprompts, so that files added, removed,
+    replaced or written in place are all seen.
+    """
+    entries = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((entry.name, st.st_mtime_ns, st.st_size))
+    except OSError:
+        return ()
+    return tuple(sorted(entries))
+
 
 class PrepromptsHolder:
     """
     A holder for preprompt texts that are stored on disk.
 
     This class provides methods to retrieve preprompt texts from a specified directory.
+    The texts are cached for the whole process, and read again only when a file of the
+    directory is added, removed or modified.
 
     Attributes
     ----------
@@ -25,5 +63,21 @@ class PrepromptsHolder:
         self.preprompts_path = preprompts_path
 
     def get_preprompts(self) -> Dict[str, str]:
-        preprompts_repo = DiskMemory(self.preprompts_path)
-        return {file_name: preprompts_repo[file_name] for file_name in preprompts_repo}
+        path = Path(self.preprompts_path).resolve()
+        version = _directory_version(path)
+        with _PREPROMPTS_CACHE_LOCK:
+            cached = _PREPROMPTS_CACHE.get(str(path))
+        if cached is None or cached[0] != version:
+            preprompts_repo = DiskMemory(path)
+            preprompts = {
+                file_name: preprompts_repo[file_name] for file_name in preprompts_repo
+            }
+            reloaded = cached is not None
+            cached = (version, preprompts)
+            with _PREPROMPTS_CACHE_LOCK:
+                _PREPROMPTS_CACHE[str(path)] = cached
+            if reloaded:
+                for callback in _RELOAD_CALLBACKS:
+                    callback()
+        # a copy, so that callers changing it do not change the cache
+        return dict(cached[1])
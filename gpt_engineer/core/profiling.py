@@ -0,0 +1,439 @@
+"""
+Profiling Module
+
+This module times the steps of a run and the hot paths they go through, to tell the time
+spent waiting on the language model from the time spent in gpt-engineer itself. Code is
+instrumented with the `profiled` decorator or the `span` context manager, which cost a
+couple of checks while profiling is disabled. Once enabled, with `gpte --profile` or the
+GPTE_PROFILE environment variable, every span is recorded with its thread, and the
+profile is written as a Chrome trace-event file, viewable in chrome://tracing or
+https://ui.perfetto.dev.
+
+GPTE_PROFILE takes a comma separated list of options: "1" only records spans,
+"cprofile" also runs cProfile over the outermost step of every thread and writes the
+statistics per step as .prof files, and "tracemalloc" records the memory allocated by
+every step.
+
+Classes:
+    Span: A timed section of a run.
+    Profiler: Records the spans of a run and writes them as a trace.
+
+Functions:
+    enable(cprofile: bool, trace_memory: bool) -> Profiler
+        Start profiling the process.
+    requested_in_env() -> bool
+        Whether GPTE_PROFILE asks for profiling.
+    enable_from_env(force: bool) -> Optional[Profiler]
+        Start profiling the process as configured by GPTE_PROFILE.
+    disable() -> Optional[Profiler]
+        Stop profiling the process.
+    finish(directory: Path) -> Optional[Path]
+        Stop profiling the process and write the trace.
+    active_profiler() -> Optional[Profiler]
+        The profiler recording the spans, if any.
+    span(name: str, category: str, **args)
+        Context manager timing a section of code.
+    collect_timings()
+        Context manager summing the spans of the current thread, by category and name.
+    profiled(name: Optional[str], category: str)
+        Decorator timing every call of a function.
+"""
+
+import cProfile
+import functools
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from gpt_engineer.core.default.paths import PROFILE_TRACE_FILE
+
+PROFILE_ENV_VAR = "GPTE_PROFILE"
+# The category of the spans waiting on the language model
+LLM_CATEGORY = "llm"
+# The category of the spans waiting on the user, e.g. in an editor
+INTERACTIVE_CATEGORY = "interactive"
+
+
+@dataclass
+class Span:
+    """
+    A timed section of a run.
+
+    Attributes
+    ----------
+    name : str
+        What was timed, e.g. the name of the step.
+    category : str
+        "step", "llm" for the requests to the model, or any other kind of work.
+    start : float
+        The seconds from the start of the profile to the start of the span.
+    duration : float
+        The seconds the span took.
+    thread_id : int
+        The thread the span ran in.
+    args : dict
+        Details of the span, e.g. the memory it allocated.
+    """
+
+    name: str
+    category: str
+    start: float
+    duration: float
+    thread_id: int
+    args: Dict[str, Any] = field(default_factory=dict)
+
+
+class Profiler:
+    """
+    Records the spans of a run and writes them as a trace.
+
+    Attributes
+    ----------
+    spans : List[Span]
+        The spans recorded, in the order they ended.
+    cprofile : bool
+        Whether the outermost step of every thread runs under cProfile.
+    trace_memory : bool
+        Whether the memory allocated by the steps is recorded with tracemalloc.
+    """
+
+    def __init__(self, cprofile: bool = False, trace_memory: bool = False):
+        self.spans: List[Span] = []
+        self.cprofile = cprofile
+        self.trace_memory = trace_memory
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # only one cProfile profiler can be active at a time
+        self._cprofile_lock = threading.Lock()
+        self._cprofiles: Dict[str, List[cProfile.Profile]] = {}
+
+    @contextmanager
+    def span(self, name: str, category: str = "step", **args) -> Iterator[None]:
+        """Time the section of code run in the context."""
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        outermost_step = depth == 0 and category == "step"
+
+        profile = None
+        if self.cprofile and outermost_step and self._cprofile_lock.acquire(False):
+            profile = cProfile.Profile()
+            profile.enable()
+        memory_before = 0
+        trace_memory = (
+            self.trace_memory and category == "step" and tracemalloc.is_tracing()
+        )
+        if trace_memory:
+            if outermost_step:
+                tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self._local.depth = depth
+            if profile is not None:
+                profile.disable()
+                self._cprofile_lock.release()
+                with self._lock:
+                    self._cprofiles.setdefault(name, []).append(profile)
+            if trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                args["allocated_kb"] = round((current - memory_before) / 1024, 1)
+                if outermost_step:
+                    args["peak_kb"] = round(peak / 1024, 1)
+            with self._lock:
+                self.spans.append(
+                    Span(
+                        name,
+                        category,
+                        start - self._origin,
+                        end - start,
+                        threading.get_ident(),
+                        args,
+                    )
+                )
+
+    def trace_events(self) -> dict:
+        """The spans in the Chrome trace-event format."""
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+        threads: Dict[int, int] = {}
+        events = []
+        for s in sorted(spans, key=lambda s: s.start):
+            tid = threads.setdefault(s.thread_id, len(threads) + 1)
+            events.append(
+                {
+                    "name": s.name,
+                    "cat": s.category,
+                    "ph": "X",
+                    "ts": round(s.start * 1e6, 1),
+                    "dur": round(s.duration * 1e6, 1),
+                    "pid": pid,
+                    "tid": tid,
+                    "args": s.args,
+                }
+            )
+        for thread_id, tid in threads.items():
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": tid,
+                    "args": {
+                        "name": "main"
+                        if thread_id == threading.main_thread().ident
+                        else f"thread {tid}"
+                    },
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def timings(self) -> Tuple[float, float]:
+        """
+        The wall time of the profile and the part of it spent waiting on the model.
+
+        Requests to the model overlapping in time, from different threads, count once.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        if not spans:
+            return 0.0, 0.0
+        wall = max(s.start + s.duration for s in spans) - min(s.start for s in spans)
+        return wall, self.busy_time(LLM_CATEGORY)
+
+    def busy_time(self, category: str) -> float:
+        """The time covered by the spans of a category, overlapping spans count once."""
+        with self._lock:
+            spans = [s for s in self.spans if s.category == category]
+        busy = 0.0
+        busy_until = float("-inf")
+        for s in sorted(spans, key=lambda s: s.start):
+            end = s.start + s.duration
+            if end > busy_until:
+                busy += end - max(s.start, busy_until)
+                busy_until = end
+        return busy
+
+    def summary(self) -> str:
+        """The total time per span name, and the time waiting on the model."""
+        totals: Dict[Tuple[str, str], List[float]] = {}
+        with self._lock:
+            for s in self.spans:
+                totals.setdefault((s.category, s.name), []).append(s.duration)
+        lines = [f"{'span':<32} {'category':<10} {'calls':>6} {'total (s)':>10}"]
+        for (category, name), durations in sorted(
+            totals.items(), key=lambda item: -sum(item[1])
+        ):
+            lines.append(
+                f"{name[:32]:<32} {category:<10} {len(durations):>6} "
+                f"{sum(durations):>10.3f}"
+            )
+        wall, llm = self.timings()
+        user = self.busy_time(INTERACTIVE_CATEGORY)
+        lines.append(
+            f"Wall time {wall:.2f}s: {llm:.2f}s waiting on the model, "
+            f"{user:.2f}s waiting on the user, {wall - llm - user:.2f}s in gpt-engineer"
+        )
+        return "\n".join(lines)
+
+    def write(self, directory: Path, trace_file: str = PROFILE_TRACE_FILE) -> Path:
+        """
+        Write the trace, and the cProfile statistics if any, to a directory.
+
+        Returns
+        -------
+        Path
+            The path of the trace file.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        trace_path = directory / trace_file
+        trace_path.write_text(json.dumps(self.trace_events()))
+        with self._lock:
+            cprofiles = dict(self._cprofiles)
+        for name, profiles in cprofiles.items():
+            stats = pstats.Stats(profiles[0])
+            if len(profiles) > 1:
+                stats.add(*profiles[1:])
+            file_name = re.sub(r"[^\w.-]+", "_", name)
+            stats.dump_stats(directory / f"profile_{file_name}.prof")
+        return trace_path
+
+
+_profiler: Optional[Profiler] = None
+# The totals of the spans collected by the current thread, see `collect_timings`
+_local = threading.local()
+
+
+def enable(cprofile: bool = False, trace_memory: bool = False) -> Profiler:
+    """Start profiling the process, replacing the current profiler if any."""
+    global _profiler
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _profiler = Profiler(cprofile=cprofile, trace_memory=trace_memory)
+    return _profiler
+
+
+def requested_in_env() -> bool:
+    """Whether GPTE_PROFILE asks for profiling, without enabling it."""
+    value = os.environ.get(PROFILE_ENV_VAR, "").strip().lower()
+    return value not in ("", "0", "false", "no", "off")
+
+
+def enable_from_env(force: bool = False) -> Optional[Profiler]:
+    """
+    Start profiling the process as configured by GPTE_PROFILE.
+
+    Parameters
+    ----------
+    force : bool, optional
+        Profile even if GPTE_PROFILE is not set, as with `gpte --profile`.
+
+    Returns
+    -------
+    Optional[Profiler]
+        The profiler, or None if profiling is not enabled.
+    """
+    if not requested_in_env():
+        if not force:
+            return None
+        value = "1"
+    else:
+        value = os.environ[PROFILE_ENV_VAR].strip().lower()
+    options = {option.strip() for option in value.split(",")}
+    return enable(cprofile="cprofile" in options, trace_memory="tracemalloc" in options)
+
+
+def disable() -> Optional[Profiler]:
+    """Stop profiling the process and return the profiler that was active."""
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is not None and profiler.trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return profiler
+
+
+def finish(directory: Path) -> Optional[Path]:
+    """
+    Stop profiling the process, write the trace to a directory and print its summary.
+
+    Called in a `finally` clause, so that a run that fails still writes its trace.
+
+    Returns
+    -------
+    Optional[Path]
+        The path of the trace file, or None if profiling was not enabled.
+    """
+    profiler = disable()
+    if profiler is None:
+        return None
+    trace_path = profiler.write(directory)
+    print(profiler.summary())
+    print("Profile trace written to", trace_path)
+    return trace_path
+
+
+def active_profiler() -> Optional[Profiler]:
+    """The profiler recording the spans, None while profiling is disabled."""
+    return _profiler
+
+
+@contextmanager
+def span(name: str, category: str = "step", **args) -> Iterator[None]:
+    """
+    Time the section of code run in the context, if profiling is enabled.
+
+    Parameters
+    ----------
+    name : str
+        What is timed.
+    category : str, optional
+        The kind of work, "llm" for the requests to the model, "interactive" while
+        waiting on the user.
+    **args
+        Details recorded with the span.
+    """
+    profiler = _profiler
+    totals = getattr(_local, "totals", None)
+    if profiler is None and totals is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        if profiler is None:
+            yield
+        else:
+            with profiler.span(name, category, **args):
+                yield
+    finally:
+        if totals is not None:
+            key = (category, name)
+            totals[key] = totals.get(key, 0.0) + time.perf_counter() - start
+
+
+@contextmanager
+def collect_timings() -> Iterator[Dict[Tuple[str, str], float]]:
+    """
+    Sum the durations of the spans of the current thread, whether profiling is enabled
+    or not, e.g. to break down the time of a benchmark task.
+
+    Spans of the threads started in the context are not collected.
+
+    Yields
+    ------
+    Dict[Tuple[str, str], float]
+        The total seconds of the spans by category and name, filled in as they end.
+    """
+    previous = getattr(_local, "totals", None)
+    totals: Dict[Tuple[str, str], float] = {}
+    _local.totals = totals
+    try:
+        yield totals
+    finally:
+        _local.totals = previous
+        if previous is not None:
+            for key, duration in totals.items():
+                previous[key] = previous.get(key, 0.0) + duration
+
+
+def profiled(
+    name: Optional[str] = None, category: str = "step"
+) -> Callable[[Callable], Callable]:
+    """
+    Time every call of the decorated function, if profiling is enabled.
+
+    Parameters
+    ----------
+    name : str, optional
+        The name of the spans, the name of the function by default.
+    category : str, optional
+        The kind of work done by the function.
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _profiler is None and getattr(_local, "totals", None) is None:
+                return fn(*args, **kwargs)
+            with span(span_name, category):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,71 @@
+"""
+Rate Limiter Module
+
+This module bounds the requests sent to a language model by the AI instances sharing a
+limiter, typically the projects of a batch run concurrently in one process. It caps the
+requests in flight and, optionally, spaces their starts to stay under a number of
+requests per minute, so that the provider's rate limit is not hit in the first place
+rather than retried with backoff.
+
+Classes:
+    RateLimiter: Bounds the concurrent requests and the requests per minute across threads.
+"""
+
+import threading
+import time
+
+from typing import Optional
+
+
+class RateLimiter:
+    """
+    Bounds the requests in flight and the requests started per minute across threads.
+
+    Used as a context manager around every request: entering blocks until the request
+    may start, exiting frees its slot.
+
+    Attributes
+    ----------
+    max_concurrent_requests : int
+        The maximum number of requests in flight.
+    requests_per_minute : Optional[int]
+        The maximum number of requests started per minute, unbounded if None.
+    """
+
+    def __init__(
+        self,
+        max_concurrent_requests: int = 4,
+        requests_per_minute: Optional[int] = None,
+    ):
+        if max_concurrent_requests < 1:
+            raise ValueError("max_concurrent_requests must be at least 1")
+        if requests_per_minute is not None and requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive")
+        self.max_concurrent_requests = max_concurrent_requests
+        self.requests_per_minute = requests_per_minute
+        self._slots = threading.BoundedSemaphore(max_concurrent_requests)
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def _wait_for_start(self) -> None:
+        if self.requests_per_minute is None:
+            return
+        interval = 60.0 / self.requests_per_minute
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + interval
+        if start > now:
+            time.sleep(start - now)
+
+    def __enter__(self) -> "RateLimiter":
+        self._slots.acquire()
+        try:
+            self._wait_for_start()
+        except BaseException:
+            self._slots.release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._slots.release()
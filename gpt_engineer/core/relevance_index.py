@@ -0,0 +1,258 @@
+"""
+Relevance Index Module
+
+This module provides a lexical index over the files of a project, used to rank files by
+their relevance to a prompt without calling a language model. Files are tokenized into
+identifier parts (splitting snake_case and camelCase) and path components, and ranked
+with BM25. The index is persisted in the project's metadata memory and updated
+incrementally, only re-reading files whose size or modification time changed.
+
+Classes:
+    RelevanceIndex: A persistent BM25 index over project files.
+
+Functions:
+    tokenize(text: str) -> List[str]
+        Split text into lowercase identifier parts.
+"""
+
+import json
+import math
+import os
+import re
+
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple, Union
+
+from gpt_engineer.core.base_memory import BaseMemory
+from gpt_engineer.core.default.paths import RELEVANCE_INDEX_FILE
+
+INDEX_VERSION = 1
+# Path components say a lot about a file, so they count as several occurrences
+PATH_TOKEN_WEIGHT = 3
+# Files larger than this are indexed by their path only
+MAX_INDEXED_FILE_SIZE = 1024 * 1024
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_CAMEL_CASE_PART = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase tokens: every identifier and, for compound identifiers,
+    each of their snake_case and camelCase parts.
+
+    Parameters
+    ----------
+    text : str
+        The text to tokenize.
+
+    Returns
+    -------
+    List[str]
+        The tokens, with repetitions, in order of appearance.
+    """
+    tokens = []
+    for identifier in _IDENTIFIER.findall(text):
+        lowered = identifier.lower()
+        if len(lowered) > 1:
+            tokens.append(lowered)
+        parts = [
+            part.lower()
+            for chunk in identifier.split("_")
+            for part in _CAMEL_CASE_PART.findall(chunk)
+        ]
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if len(part) > 1)
+    return tokens
+
+
+class RelevanceIndex:
+    """
+    A persistent BM25 index over the files of a project.
+
+    Attributes
+    ----------
+    memory : BaseMemory
+        The memory the index is stored in, usually the project's metadata memory.
+    docs : Dict[str, dict]
+        Per file: its size and modification time when indexed, its length in tokens and
+        its term frequencies.
+    """
+
+    def __init__(self, memory: BaseMemory, k1: float = 1.5, b: float = 0.75):
+        self.memory = memory
+        self.k1 = k1
+        self.b = b
+        self.docs: Dict[str, dict] = {}
+        self._doc_freqs: Counter = Counter()
+        if RELEVANCE_INDEX_FILE in memory:
+            try:
+                stored = json.loads(memory[RELEVANCE_INDEX_FILE])
+            except ValueError:
+                stored = {}
+            if stored.get("version") == INDEX_VERSION:
+                self.docs = stored["docs"]
+        for doc in self.docs.values():
+            self._doc_freqs.update(doc["tf"].keys())
+
+    def update(self, project_path: Union[str, Path], files: List[str]) -> int:
+        """
+        Bring the index up to date with the given files, re-indexing only those whose
+        size or modification time changed, and dropping files that are not listed.
+
+        Parameters
+        ----------
+        project_path : Union[str, Path]
+            The path to the project directory the files are relative to.
+        files : List[str]
+            The relative paths of the files to index.
+
+        Returns
+        -------
+        int
+            The number of files that were (re-)indexed.
+        """
+        wanted = set(files)
+        stale = [file for file in self.docs if file not in wanted]
+        for file in stale:
+            self._remove(file)
+        changed = bool(stale)
+
+        reindexed = 0
+        for file in files:
+            try:
+                st = os.stat(Path(project_path) / file)
+            except OSError:
+                if file in self.docs:
+                    self._remove(file)
+                    changed = True
+                continue
+            doc = self.docs.get(file)
+            if doc and doc["size"] == st.st_size and doc["mtime_ns"] == st.st_mtime_ns:
+                continue
+            if doc:
+                self._remove(file)
+            self._add(file, Path(project_path) / file, st.st_size, st.st_mtime_ns)
+            reindexed += 1
+
+        if reindexed or changed or RELEVANCE_INDEX_FILE not in self.memory:
+            self.save()
+        return reindexed
+
+    def _add(self, file: str, path: Path, size: int, mtime_ns: int) -> None:
+        terms = Counter()
+        for token in tokenize(Path(file).as_posix().replace("/", " ")):
+            terms[token] += PATH_TOKEN_WEIGHT
+        if size <= MAX_INDEXED_FILE_SIZE:
+            try:
+                terms.update(
+                    tokenize(path.read_text(encoding="utf-8", errors="ignore"))
+                )
+            except OSError:
+                pass
+        self.docs[file] = {
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "length": sum(terms.values()),
+            "tf": dict(terms),
+        }
+        self._doc_freqs.update(terms.keys())
+
+    def _remove(self, file: str) -> None:
+        doc = self.docs.pop(file)
+        self._doc_freqs.subtract(doc["tf"].keys())
+
+    def save(self) -> None:
+        """Persist the index in its memory."""
+        self.memory[RELEVANCE_INDEX_FILE] = json.dumps(
+            {"version": INDEX_VERSION, "docs": self.docs}
+        )
+
+    def rank(self, query: str) -> List[Tuple[str, float]]:
+        """
+        Rank the indexed files against a query with BM25.
+
+        Parameters
+        ----------
+        query : str
+            The text to rank files against, usually the user's prompt.
+
+        Returns
+        -------
+        List[Tuple[str, float]]
+            The files with a positive score and their scores, most relevant first.
+        """
+        if not self.docs:
+            return []
+        n_docs = len(self.docs)
+        avg_length = sum(doc["length"] for doc in self.docs.values()) / n_docs or 1
+        query_terms = set(tokenize(query))
+        idf = {
+            term: math.log(
+                1
+                + (n_docs - self._doc_freqs[term] + 0.5) / (self._doc_freqs[term] + 0.5)
+            )
+            for term in query_terms
+            if self._doc_freqs[term] > 0
+        }
+
+        scores = []
+        for file, doc in self.docs.items():
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * doc["length"] / avg_length)
+            for term, term_idf in idf.items():
+                tf = doc["tf"].get(term, 0)
+                if tf:
+                    score += term_idf * tf * (self.k1 + 1) / (tf + norm)
+            if score > 0:
+                scores.append((file, score))
+        return sorted(scores, key=lambda item: (-item[1], item[0]))
+
+    def select(
+        self,
+        query: str,
+        project_path: Union[str, Path],
+        token_budget: int,
+        num_tokens: Callable[[str], int],
+    ) -> List[str]:
+        """
+        Pick the most relevant files whose combined size fits in a token budget.
+
+        Files are taken in rank order; a file that does not fit in the remaining budget is
+        skipped, so smaller relevant files further down can still be included.
+
+        Parameters
+        ----------
+        query : str
+            The text to rank files against.
+        project_path : Union[str, Path]
+            The path to the project directory the files are relative to.
+        token_budget : int
+            The maximum number of tokens the selected files may take up.
+        num_tokens : Callable[[str], int]
+            Counts the tokens of a text, e.g. `Tokenizer.num_tokens`.
+
+        Returns
+        -------
+        List[str]
+            The selected files, most relevant first.
+        """
+        selected = []
+        remaining = token_budget
+        for file, _ in self.rank(query):
+            if remaining <= 0:
+                break
+            if len(file) > remaining:
+                # the file costs at least its name, no need to read it
+                continue
+            try:
+                content = (Path(project_path) / file).read_text(encoding="utf-8")
+            except (OSError, UnicodeDecodeError):
+                continue
+            # to_chat adds the file name and a line number to every line
+            cost = num_tokens(content) + content.count("\n") + len(file)
+            if cost <= remaining:
+                selected.append(file)
+                remaining -= cost
+        return selected
@@ -0,0 +1,235 @@
+"""
+Step Graph Module
+
+This module provides a small engine to compose agents from steps that declare the values
+they consume and produce, such as the prompt, the files, the entrypoint or an execution
+result. The graph runs every step as soon as its inputs are available, so independent
+branches (for instance generating an entrypoint and documentation from the same code)
+run concurrently. A step that can only run alone runs in the calling thread. Graphs built with a memo size memoize the outputs of their latest
+steps by a hash of the step inputs, so that running the graph again with unchanged inputs
+does not call the model again. Memoization is off by default, as agents are expected to
+sample a new answer every time they run.
+
+Shared resources, such as the AI, the memory, the preprompts holder or the execution
+environment, are passed to the steps that take a parameter of the same name, but are not
+part of the memoization key.
+
+Classes:
+    Step: A function and the names of its inputs and output.
+    StepGraph: Runs steps in dependency order, concurrently where possible.
+"""
+
+import inspect
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from gpt_engineer.core.checkpoints import StepCheckpoints
+
+
+@dataclass
+class Step:
+    """
+    A step of a graph.
+
+    Attributes
+    ----------
+    fn : Callable[..., Any]
+        The function run by the step. It is called with its inputs, and the resources
+        matching its parameter names, as keyword arguments.
+    inputs : Sequence[str]
+        The names of the values the step consumes.
+    output : str
+        The name of the value the step produces.
+    name : str
+        The name of the step, by default the name of fn.
+    """
+
+    fn: Callable[..., Any]
+    inputs: Sequence[str]
+    output: str
+    name: str = ""
+
+    def __post_init__(self):
+        self.name = self.name or self.fn.__name__
+        self._parameters = set(inspect.signature(self.fn).parameters)
+
+    def __call__(self, values: Mapping[str, Any], resources: Mapping[str, Any]) -> Any:
+        kwargs = {k: v for k, v in resources.items() if k in self._parameters}
+        kwargs.update({name: values[name] for name in self.inputs})
+        return self.fn(**kwargs)
+
+
+class StepGraph:
+    """
+    Runs steps in dependency order, running independent steps concurrently on a thread
+    pool, and optionally memoizes their outputs by input hash.
+
+    Attributes
+    ----------
+    steps : List[Step]
+        The steps of the graph.
+    max_workers : int
+        The maximum number of steps running at the same time.
+    memo_size : int
+        The number of step outputs memoized, the least recently used being evicted
+        first. 0, the default, disables memoization.
+    """
+
+    def __init__(
+        self, steps: Iterable[Step] = (), max_workers: int = 4, memo_size: int = 0
+    ):
+        self.steps: List[Step] = []
+        self.max_workers = max_workers
+        self.memo_size = memo_size
+        self._memo: "OrderedDict[str, Any]" = OrderedDict()
+        self._memo_lock = threading.Lock()
+        for step in steps:
+            self.add(step)
+
+    def add(self, step: Step) -> "StepGraph":
+        """
+        Add a step to the graph.
+
+        Raises
+        ------
+        ValueError
+            If another step already produces the output of the step.
+        """
+        if any(other.output == step.output for other in self.steps):
+            raise ValueError(f"Output {step.output!r} is produced by two steps")
+        self.steps.append(step)
+        return self
+
+    def _memoized(self, key: str) -> Tuple[bool, Any]:
+        if self.memo_size <= 0:
+            return False, None
+        with self._memo_lock:
+            if key not in self._memo:
+                return False, None
+            self._memo.move_to_end(key)
+            return True, self._memo[key]
+
+    def _memoize(self, key: str, value: Any) -> None:
+        if self.memo_size <= 0:
+            return
+        with self._memo_lock:
+            self._memo[key] = value
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+
+    def validate(self, available: Iterable[str]) -> None:
+        """
+        Check that every input is either available upfront or produced by a step, and
+        that the steps have no cyclic dependencies.
+
+        Raises
+        ------
+        ValueError
+            If an input can never be available.
+        """
+        known = set(available)
+        pending = list(self.steps)
+        while pending:
+            ready = [s for s in pending if all(i in known for i in s.inputs)]
+            if not ready:
+                missing = {i for s in pending for i in s.inputs if i not in known}
+                raise ValueError(
+                    f"Steps {[s.name for s in pending]} can never run, missing inputs: "
+                    f"{sorted(missing)}"
+                )
+            for step in ready:
+                known.add(step.output)
+                pending.remove(step)
+
+    def run(
+        self,
+        values: Mapping[str, Any],
+        resources: Optional[Mapping[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run the steps of the graph.
+
+        Parameters
+        ----------
+        values : Mapping[str, Any]
+            The values available upfront, e.g. the prompt.
+        resources : Mapping[str, Any], optional
+            The shared resources passed to the steps that take them, e.g. the AI.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The values given and the outputs of all steps.
+
+        Raises
+        ------
+        ValueError
+            If the graph cannot run with the given values.
+        Exception
+            The first exception raised by a step. Steps that did not start are cancelled.
+        """
+        self.validate(values)
+        values = dict(values)
+        resources = resources or {}
+        pending = list(self.steps)
+        running: Dict[Future, Tuple[Step, str]] = {}
+        ready: List[Tuple[Step, str]] = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for step in [s for s in pending if all(i in values for i in s.inputs)]:
+                    pending.remove(step)
+                    key = (
+                        StepCheckpoints.input_hash(
+                            step.name, [values[i] for i in step.inputs]
+                        )
+                        if self.memo_size > 0
+                        else ""
+                    )
+                    memoized, value = self._memoized(key)
+                    if memoized:
+                        values[step.output] = value
+                    else:
+                        ready.append((step, key))
+                if len(ready) == 1 and not running:
+                    # a step running alone runs in the calling thread, where it can
+                    # prompt the user and be interrupted
+                    step, key = ready.pop()
+                    values[step.output] = step(dict(values), resources)
+                    self._memoize(key, values[step.output])
+                for step, key in ready:
+                    running[executor.submit(step, dict(values), resources)] = (
+                        step,
+                        key,
+                    )
+                ready.clear()
+                if not running:
+                    # memoized or inline steps made new values available
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step, key = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        for other in running:
+                            other.cancel()
+                        raise error
+                    values[step.output] = future.result()
+                    self._memoize(key, values[step.output])
+        return values
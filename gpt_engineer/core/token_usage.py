@@ -2,9 +2,10 @@ import base64
 import io
 import logging
 import math
+import threading
 
 from dataclasses import dataclass
-from typing import List, Union
+from typing import List, Optional, Union
 
 import tiktoken
 
@@ -67,15 +68,39 @@ class TokenUsage:
 class Tokenizer:
     """
     Tokenizer for counting tokens in text.
+
+    The tiktoken encoding is only loaded when tokens are first counted, since loading
+    it downloads it unless it is cached. When it cannot be loaded, e.g. offline,
+    tokens are estimated from the length of the text.
     """
 
+    # the average number of characters per token of English text and code
+    FALLBACK_CHARS_PER_TOKEN = 4
+
     def __init__(self, model_name):
         self.model_name = model_name
-        self._tiktoken_tokenizer = (
-            tiktoken.encoding_for_model(model_name)
-            if "gpt-4" in model_name or "gpt-3.5" in model_name
-            else tiktoken.get_encoding("cl100k_base")
-        )
+        self._tiktoken_tokenizer = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def _encoding(self) -> Optional[tiktoken.Encoding]:
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    try:
+                        self._tiktoken_tokenizer = (
+                            tiktoken.encoding_for_model(self.model_name)
+                            if "gpt-4" in self.model_name
+                            or "gpt-3.5" in self.model_name
+                            else tiktoken.get_encoding("cl100k_base")
+                        )
+                    except Exception as e:
+                        logger.warning(
+                            f"Could not load the tokenizer of {self.model_name}, "
+                            f"estimating token counts instead: {e}"
+                        )
+                    self._loaded = True
+        return self._tiktoken_tokenizer
 
     def num_tokens(self, txt: str) -> int:
         """
@@ -91,7 +116,10 @@ class Tokenizer:
         int
             The number of tokens in the text.
         """
-        return len(self._tiktoken_tokenizer.encode(txt))
+        encoding = self._encoding()
+        if encoding is None:
+            return math.ceil(len(txt) / self.FALLBACK_CHARS_PER_TOKEN)
+        return len(encoding.encode(txt))
 
     def num_tokens_for_base64_image(
         self, image_base64: str, detail: str = "high"
@@ -189,6 +217,8 @@ class TokenUsageLog:
         self._cumulative_total_tokens = 0
         self._log = []
         self._tokenizer = Tokenizer(model_name)
+        # steps of a StepGraph may call the model concurrently
+        self._lock = threading.Lock()
 
     def update_log(self, messages: List[Message], answer: str, step_name: str) -> None:
         """
@@ -207,21 +237,22 @@ class TokenUsageLog:
         completion_tokens = self._tokenizer.num_tokens(answer)
         total_tokens = prompt_tokens + completion_tokens
 
-        self._cumulative_prompt_tokens += prompt_tokens
-        self._cumulative_completion_tokens += completion_tokens
-        self._cumulative_total_tokens += total_tokens
-
-        self._log.append(
-            TokenUsage(
-                step_name=step_name,
-                in_step_prompt_tokens=prompt_tokens,
-                in_step_completion_tokens=completion_tokens,
-                in_step_total_tokens=total_tokens,
-                total_prompt_tokens=self._cumulative_prompt_tokens,
-                total_completion_tokens=self._cumulative_completion_tokens,
-                total_tokens=self._cumulative_total_tokens,
+        with self._lock:
+            self._cumulative_prompt_tokens += prompt_tokens
+            self._cumulative_completion_tokens += completion_tokens
+            self._cumulative_total_tokens += total_tokens
+
+            self._log.append(
+                TokenUsage(
+                    step_name=step_name,
+                    in_step_prompt_tokens=prompt_tokens,
+                    in_step_completion_tokens=completion_tokens,
+                    in_step_total_tokens=total_tokens,
+                    total_prompt_tokens=self._cumulative_prompt_tokens,
+                    total_completion_tokens=self._cumulative_completion_tokens,
+                    total_tokens=self._cumulative_total_tokens,
+                )
             )
-        )
 
     def log(self) -> List[TokenUsage]:
         """
@@ -270,6 +301,26 @@ class TokenUsageLog:
         """
         return self._cumulative_total_tokens
 
+    def cost(self, prompt_tokens: int, completion_tokens: int) -> float | None:
+        """
+        Return the cost in USD of a number of prompt and completion tokens.
+
+        Returns
+        -------
+        float
+            Cost in USD, or None if the model is not an OpenAI model or has no known price.
+        """
+        if not self.is_openai_model():
+            return None
+        try:
+            return get_openai_token_cost_for_model(
+                self.model_name, prompt_tokens, is_completion=False
+            ) + get_openai_token_cost_for_model(
+                self.model_name, completion_tokens, is_completion=True
+            )
+        except ValueError:
+            return None
+
     def usage_cost(self) -> float | None:
         """
         Return the total cost in USD of the API usage.
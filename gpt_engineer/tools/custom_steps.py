@@ -1,22 +1,58 @@
+import hashlib
+import json
+import re
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from platform import platform
 from sys import version_info
-from typing import List, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 from langchain.schema import AIMessage, HumanMessage, SystemMessage
 
 from gpt_engineer.core.ai import AI
 from gpt_engineer.core.base_execution_env import BaseExecutionEnv
 from gpt_engineer.core.base_memory import BaseMemory
-from gpt_engineer.core.chat_to_files import chat_to_files_dict
-from gpt_engineer.core.default.paths import CODE_GEN_LOG_FILE, ENTRYPOINT_FILE
-from gpt_engineer.core.default.steps import curr_fn, improve_fn, setup_sys_prompt
-from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.chat_to_files import apply_diffs, chat_to_files_dict, parse_diffs
+from gpt_engineer.core.code_map import condensed_to_chat
+from gpt_engineer.core.context_window import retry_message
+from gpt_engineer.core.default.constants import (
+    MANIFEST_FILES,
+    MAX_EDIT_REFINEMENT_STEPS,
+)
+from gpt_engineer.core.default.paths import (
+    CODE_GEN_LOG_FILE,
+    DIFF_LOG_FILE,
+    ENTRYPOINT_FILE,
+    IMPROVE_LOG_FILE,
+)
+from gpt_engineer.core.default.steps import (
+    curr_fn,
+    improve_fn,
+    setup_sys_prompt,
+    setup_sys_prompt_existing_code,
+)
+from gpt_engineer.core.diff import Diff
+from gpt_engineer.core.files_dict import FilesDict, file_to_lines_dict
 from gpt_engineer.core.preprompts_holder import PrepromptsHolder
+from gpt_engineer.core.profiling import INTERACTIVE_CATEGORY, profiled, span
 from gpt_engineer.core.prompt import Prompt
 
 # Type hint for chat messages
 Message = Union[AIMessage, HumanMessage, SystemMessage]
 MAX_SELF_HEAL_ATTEMPTS = 10
+# Self-heal gives up when the same error comes back this many times in a row
+MAX_SAME_ERROR_ATTEMPTS = 3
+# Size of the summary of a failed run sent to the AI
+MAX_FAILURE_SUMMARY_LINES = 40
+MAX_FAILURE_SUMMARY_CHARS = 4000
+INSTALL_COMMAND = re.compile(
+    r"^\s*(?:(?:python3?\s+-m\s+)?(?:pip3?|pipenv|poetry|conda|npm|pnpm|yarn|bundle"
+    r"|gem|composer|cargo|go|apt-get|brew)\s+(?:-\S+\s+)*(?:install|ci|add|sync|get)\b"
+    r"|(?:python3?\s+-m\s+)?(?:venv|virtualenv)\b|(?:yarn|bundle)\s*$)"
+)
+# Maximum number of files edited at the same time in map-reduce improve mode
+MAX_PARALLEL_EDITS = 4
 
 
 def get_platform_info() -> str:
@@ -37,6 +73,7 @@ def get_platform_info() -> str:
     return a + b
 
 
+@profiled()
 def self_heal(
     ai: AI,
     execution_env: BaseExecutionEnv,
@@ -47,7 +84,12 @@ def self_heal(
     diff_timeout=3,
 ) -> FilesDict:
     """
-    Attempts to execute the code from the entrypoint and if it fails, sends the error output back to the AI with instructions to fix.
+    Attempts to execute the code from the entrypoint and if it fails, sends a summary of the error output back to the AI with instructions to fix.
+
+    The entrypoint is split into an install phase, the commands installing
+    dependencies, and a run phase. The install phase only runs again when its commands
+    or the dependency manifests change, and only the files changed by a fix are
+    uploaded again.
 
     Parameters
     ----------
@@ -75,7 +117,8 @@ def self_heal(
     Notes
     -----
     This code will make `MAX_SELF_HEAL_ATTEMPTS` to try and fix the code
-    before giving up.
+    before giving up, and gives up earlier when the same error comes back
+    `MAX_SAME_ERROR_ATTEMPTS` times in a row.
     This makes the assuption that the previous step was `gen_entrypoint`,
     this code could work with `simple_gen`, or `gen_clarified_code` as well.
     """
@@ -92,24 +135,62 @@ def self_heal(
     attempts = 0
     if preprompts_holder is None:
         raise AssertionError("Prepromptsholder required for self-heal")
+    uploaded = FilesDict()
+    installed = None
+    last_signature = None
+    same_error_attempts = 0
     while attempts < MAX_SELF_HEAL_ATTEMPTS:
         attempts += 1
-        timed_out = False
-
-        # Start the process
-        execution_env.upload(files_dict)
-        p = execution_env.popen(files_dict[ENTRYPOINT_FILE])
 
-        # Wait for the process to complete and get output
-        stdout_full, stderr_full = p.communicate()
-
-        if (p.returncode != 0 and p.returncode != 2) and not timed_out:
+        # Upload the files changed since the previous attempt
+        changed = FilesDict(
+            {
+                name: content
+                for name, content in files_dict.items()
+                if uploaded.get(name) != content
+            }
+        )
+        if changed:
+            execution_env.upload(changed)
+        uploaded = FilesDict(files_dict)
+
+        install_script, run_script = split_entrypoint(files_dict[ENTRYPOINT_FILE])
+        install_key = install_phase_key(install_script, files_dict)
+        phase = "installing the dependencies"
+        returncode, stdout_full, stderr_full = 0, b"", b""
+        if install_script and install_key != installed:
+            p = execution_env.popen(install_script)
+            stdout_full, stderr_full = p.communicate()
+            returncode = p.returncode
+            if returncode == 0:
+                installed = install_key
+        if returncode == 0 and run_script.strip():
+            phase = "running it"
+            p = execution_env.popen(run_script)
+            stdout_full, stderr_full = p.communicate()
+            returncode = p.returncode
+
+        if returncode != 0 and returncode != 2:
+            stdout = stdout_full.decode("utf-8", errors="replace")
+            stderr = stderr_full.decode("utf-8", errors="replace")
             print("run.sh failed.  The log is:")
-            print(stdout_full.decode("utf-8"))
-            print(stderr_full.decode("utf-8"))
+            print(stdout)
+            print(stderr)
+
+            signature = error_signature(stdout, stderr)
+            same_error_attempts = (
+                same_error_attempts + 1 if signature == last_signature else 1
+            )
+            last_signature = signature
+            if same_error_attempts >= MAX_SAME_ERROR_ATTEMPTS:
+                print(
+                    f"The same error occurred {same_error_attempts} times in a row, "
+                    "giving up self-healing."
+                )
+                break
 
             new_prompt = Prompt(
-                f"A program with this specification was requested:\n{prompt}\n, but running it produced the following output:\n{stdout_full}\n and the following errors:\n{stderr_full}. Please change it so that it fulfills the requirements."
+                f"A program with this specification was requested:\n{prompt}\n, but {phase} failed with exit code {returncode}. Summary of the output:\n{summarize_failure(stdout, stderr)}\nPlease change it so that it fulfills the requirements."
             )
             files_dict = improve_fn(
                 ai, new_prompt, files_dict, memory, preprompts_holder, diff_timeout
@@ -119,6 +200,135 @@ def self_heal(
     return files_dict
 
 
+def _is_install_command(command: str) -> bool:
+    return bool(INSTALL_COMMAND.match(command))
+
+
+def split_entrypoint(script: str) -> Tuple[str, str]:
+    """
+    Split an entrypoint script into its install phase and its run phase.
+
+    Lines made only of install commands (package managers installing dependencies,
+    virtual environment creation) belong to the install phase. The install phase is
+    the script up to its last install line, the run phase is the script without the
+    install lines, so that the lines setting up the shell (changing directory,
+    activating a virtual environment) run in both.
+
+    Parameters
+    ----------
+    script : str
+        The content of the entrypoint.
+
+    Returns
+    -------
+    Tuple[str, str]
+        The install phase, empty if there are no install lines, and the run phase.
+    """
+    lines = script.split("\n")
+    is_install = [
+        bool(line.strip())
+        and not line.strip().startswith("#")
+        and all(
+            _is_install_command(command)
+            for command in re.split(r"&&|;", line)
+            if command.strip()
+        )
+        for line in lines
+    ]
+    if not any(is_install):
+        return "", script
+    last_install = max(i for i, install in enumerate(is_install) if install)
+    install_script = "\n".join(lines[: last_install + 1])
+    run_script = "\n".join(
+        line for line, install in zip(lines, is_install) if not install
+    )
+    return install_script, run_script
+
+
+def install_phase_key(install_script: str, files_dict: FilesDict) -> str:
+    """
+    A hash of the install phase and of the dependency manifests it may read: the
+    well known manifest files and the files named in the install commands.
+    """
+    digest = hashlib.sha256(install_script.encode("utf-8"))
+    for name in sorted(files_dict):
+        if Path(name).name in MANIFEST_FILES or name in install_script:
+            digest.update(f"\0{name}\0{files_dict[name]}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _collapse_repeats(lines: List[str]) -> List[str]:
+    collapsed: List[str] = []
+    count = 0
+    for i, line in enumerate(lines):
+        count += 1
+        if i + 1 < len(lines) and lines[i + 1] == line:
+            continue
+        collapsed.append(line if count == 1 else f"{line}  [repeated {count} times]")
+        count = 0
+    return collapsed
+
+
+def summarize_failure(stdout: str, stderr: str) -> str:
+    """
+    Summarize the output of a failed run for the AI: the last traceback of stderr,
+    or else the end of both outputs, without repeated lines, truncated to
+    `MAX_FAILURE_SUMMARY_CHARS` characters.
+
+    Parameters
+    ----------
+    stdout : str
+        The standard output of the run.
+    stderr : str
+        The standard error of the run.
+
+    Returns
+    -------
+    str
+        The summary.
+    """
+    traceback_start = stderr.rfind("Traceback (most recent call last):")
+    if traceback_start != -1:
+        parts = [("stderr", stderr[traceback_start:])]
+    else:
+        parts = [("stdout", stdout), ("stderr", stderr)]
+
+    summary = ""
+    for name, output in parts:
+        lines = _collapse_repeats(
+            [line.rstrip() for line in output.split("\n") if line.strip()]
+        )
+        if not lines:
+            continue
+        if len(lines) > MAX_FAILURE_SUMMARY_LINES:
+            omitted = len(lines) - MAX_FAILURE_SUMMARY_LINES
+            lines = [f"... ({omitted} lines omitted)"] + lines[
+                -MAX_FAILURE_SUMMARY_LINES:
+            ]
+        summary += f"{name}:\n" + "\n".join(lines) + "\n"
+    if len(summary) > MAX_FAILURE_SUMMARY_CHARS:
+        summary = "... (truncated)\n" + summary[-MAX_FAILURE_SUMMARY_CHARS:]
+    return summary or "(no output)"
+
+
+def error_signature(stdout: str, stderr: str) -> str:
+    """
+    A signature identifying an error across attempts: the last line naming an error
+    or exception, or else the last line of output, with numbers, addresses and quoted
+    values masked, since they change from one attempt to the next.
+    """
+    lines = [
+        line.strip() for line in (stdout + "\n" + stderr).split("\n") if line.strip()
+    ]
+    errors = [
+        line for line in lines if re.search(r"error|exception", line, re.IGNORECASE)
+    ]
+    line = (errors or lines or [""])[-1]
+    line = re.sub(r"0x[0-9a-fA-F]+|\d+", "N", line)
+    return re.sub(r"'[^']*'|\"[^\"]*\"", "'...'", line)
+
+
+@profiled()
 def clarified_gen(
     ai: AI, prompt: Prompt, memory: BaseMemory, preprompts_holder: PrepromptsHolder
 ) -> FilesDict:
@@ -157,7 +367,8 @@ def clarified_gen(
             break
 
         print('(answer in text, or "c" to move on)\n')
-        user_input = input("")
+        with span("clarify_answer", INTERACTIVE_CATEGORY):
+            user_input = input("")
         print()
 
         if not user_input or user_input == "c":
@@ -195,6 +406,7 @@ def clarified_gen(
     return files_dict
 
 
+@profiled()
 def lite_gen(
     ai: AI, prompt: Prompt, memory: BaseMemory, preprompts_holder: PrepromptsHolder
 ) -> FilesDict:
@@ -231,3 +443,281 @@ def lite_gen(
     memory.log(CODE_GEN_LOG_FILE, "\n\n".join(x.pretty_repr() for x in messages))
     files_dict = chat_to_files_dict(chat)
     return files_dict
+
+
+@profiled()
+def improve_fn_map_reduce(
+    ai: AI,
+    prompt: Prompt,
+    files_dict: FilesDict,
+    memory: BaseMemory,
+    preprompts_holder: PrepromptsHolder,
+    diff_timeout=3,
+    code_map=False,
+    targeted_retry=False,
+) -> FilesDict:
+    """
+    Improves the code like `improve_fn`, but edits the files concurrently.
+
+    The AI is first asked for a short change plan: the files to edit or create and what
+    to change in each. Every planned file is then edited in its own conversation, which
+    holds only that file and the plan, with at most `MAX_PARALLEL_EDITS` conversations at
+    a time. A file whose conversation fails is retried once and skipped if it fails
+    again, keeping the edits of the other files. The resulting diffs are checked for
+    conflicting files and overlapping hunks and applied together with `apply_diffs`.
+    When the plan cannot be parsed, falls back to `improve_fn`.
+
+    Parameters
+    ----------
+    ai : AI
+        The AI model used for improving code.
+    prompt : Prompt
+        The user prompt to improve the code.
+    files_dict : FilesDict
+        The dictionary of file names to their respective source code content.
+    memory : BaseMemory
+        The memory interface where the code and related data are stored.
+    preprompts_holder : PrepromptsHolder
+        The holder for preprompt messages that guide the AI model.
+    diff_timeout : int, optional
+        The timeout, in seconds, of the regexp searches when correcting diffs.
+    code_map : bool, optional
+        Only used by the `improve_fn` fallback, the plan is always made from files
+        condensed to the symbols relevant to the prompt.
+    targeted_retry : bool, optional
+        Only used by the `improve_fn` fallback, the per-file conversations are already
+        minimal.
+
+    Returns
+    -------
+    FilesDict
+        The dictionary of file names to their respective updated source code content.
+    """
+    plan = _change_plan(ai, prompt, files_dict)
+    if plan is None:
+        print("Could not parse the change plan, improving all files at once.")
+        return improve_fn(
+            ai,
+            prompt,
+            files_dict,
+            memory,
+            preprompts_holder,
+            diff_timeout=diff_timeout,
+            code_map=code_map,
+            targeted_retry=targeted_retry,
+        )
+    if not plan:
+        print("The change plan does not change any file.")
+        return files_dict
+
+    plan_text = "\n".join(f"- {name}: {change}" for name, change in plan.items())
+    system_prompt = setup_sys_prompt_existing_code(preprompts_holder.get_preprompts())
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_EDITS) as executor:
+        futures = {
+            file_name: executor.submit(
+                _edit_file,
+                ai,
+                prompt,
+                file_name,
+                plan_text,
+                system_prompt,
+                files_dict,
+                memory,
+                diff_timeout,
+            )
+            for file_name in plan
+        }
+        diffs: Dict[str, Optional[Diff]] = {}
+        failures: Dict[str, Exception] = {}
+        for file_name, future in futures.items():
+            try:
+                diffs[file_name] = future.result()
+            except Exception as e:
+                failures[file_name] = e
+
+    # one failed conversation should not throw away the edits of the other files
+    for file_name, error in failures.items():
+        print(f"Editing {file_name} failed ({error!r}), retrying once.")
+        try:
+            diffs[file_name] = _edit_file(
+                ai,
+                prompt,
+                file_name,
+                plan_text,
+                system_prompt,
+                files_dict,
+                memory,
+                diff_timeout,
+            )
+        except Exception as retry_error:
+            print(f"Editing {file_name} failed again, skipping it: {retry_error!r}")
+            memory.log(DIFF_LOG_FILE, f"Editing {file_name} failed: {retry_error!r}")
+
+    merged: Dict[str, Diff] = {}
+    targets: Dict[str, str] = {}
+    for file_name, diff in diffs.items():
+        if diff is None:
+            continue
+        # a file renamed onto another edited file would silently drop one of the edits
+        if diff.filename_post in targets:
+            print(
+                f"Conflicting edits: {file_name} and {targets[diff.filename_post]} "
+                f"both write {diff.filename_post}, keeping the edit of "
+                f"{targets[diff.filename_post]}."
+            )
+            continue
+        for problem in _drop_overlapping_hunks(diff):
+            print(problem)
+            memory.log(DIFF_LOG_FILE, problem)
+        targets[diff.filename_post] = file_name
+        merged[file_name] = diff
+    return apply_diffs(merged, files_dict)
+
+
+def _drop_overlapping_hunks(diff: Diff) -> List[str]:
+    """
+    Drop the hunks of a diff that edit lines an earlier hunk of the same diff already
+    edits, since `apply_diffs` would apply both to the same lines.
+
+    Returns
+    -------
+    List[str]
+        A description of every dropped hunk.
+    """
+    if diff.is_new_file():
+        return []
+    problems = []
+    kept = []
+    end = None
+    for hunk in sorted(diff.hunks, key=lambda h: h.start_line_pre_edit):
+        if end is not None and hunk.start_line_pre_edit < end:
+            problems.append(
+                f"Overlapping hunks in {diff.filename_pre}: dropped the hunk at line "
+                f"{hunk.start_line_pre_edit}, which overlaps lines edited by the hunk "
+                f"ending at line {end - 1}."
+            )
+            continue
+        kept.append(hunk)
+        end = hunk.start_line_pre_edit + hunk.hunk_len_pre_edit
+    diff.hunks = kept
+    return problems
+
+
+def _change_plan(
+    ai: AI, prompt: Prompt, files_dict: FilesDict
+) -> Optional[Dict[str, str]]:
+    """
+    Ask the AI which files to edit or create, and what to change in each.
+
+    Returns
+    -------
+    Optional[Dict[str, str]]
+        The change to make per file name, or None if the answer is not a JSON object
+        mapping file names to strings.
+    """
+    messages: List[Message] = [
+        SystemMessage(
+            content="You plan changes to a code base. Given the files of the code base "
+            "and a change request, answer with a single JSON object mapping the path of "
+            "every file that must be edited or created to a short description of the "
+            "changes to make in that file, including the names and signatures of the "
+            "functions and classes other files will rely on. Leave out the files that do "
+            "not need any change. Do not write any code."
+        ),
+        HumanMessage(content=condensed_to_chat(files_dict, prompt.text)),
+        HumanMessage(content=f"Change request:\n{prompt.text}"),
+    ]
+    messages = ai.next(messages, step_name=curr_fn())
+    match = re.search(r"\{.*\}", messages[-1].content, re.DOTALL)
+    if match is None:
+        return None
+    try:
+        plan = json.loads(match.group())
+    except ValueError:
+        return None
+    if not isinstance(plan, dict) or not all(
+        isinstance(name, str) and isinstance(change, str)
+        for name, change in plan.items()
+    ):
+        return None
+    return plan
+
+
+def _edit_file(
+    ai: AI,
+    prompt: Prompt,
+    file_name: str,
+    plan_text: str,
+    system_prompt: str,
+    files_dict: FilesDict,
+    memory: BaseMemory,
+    diff_timeout=3,
+) -> Optional[Diff]:
+    """
+    Ask the AI for the diff of one file of the change plan, asking it to rewrite the
+    diff while it fails validation, up to `MAX_EDIT_REFINEMENT_STEPS` times.
+
+    Returns
+    -------
+    Optional[Diff]
+        The diff of the file, holding only its valid hunks, or None if the AI did not
+        produce any diff for it.
+    """
+    is_new_file = file_name not in files_dict
+    file_dict = (
+        FilesDict() if is_new_file else FilesDict({file_name: files_dict[file_name]})
+    )
+    messages: List[Message] = [SystemMessage(content=system_prompt)]
+    if not is_new_file:
+        messages.append(HumanMessage(content=file_dict.to_chat()))
+    messages.append(
+        HumanMessage(
+            content=f"{prompt.text}\n\nThe changes are split across files as follows:\n"
+            f"{plan_text}\n\nOnly make the changes planned for {file_name}"
+            + (", which is a new file." if is_new_file else ".")
+        )
+    )
+
+    diff = None
+    errors: List[str] = []
+    for attempt in range(MAX_EDIT_REFINEMENT_STEPS + 1):
+        if attempt:
+            messages.append(
+                retry_message(
+                    f"The diff of {file_name} was not on the requested format, or the "
+                    "code part was not found in the code. Details:\n"
+                    + "\n".join(errors)
+                    + f"\n Rewrite the complete diff of {file_name}, making sure that it "
+                    "is on the correct format and can be found in the code. Make sure to "
+                    "not repeat past mistakes. \n"
+                )
+            )
+        messages = ai.next(messages, step_name=curr_fn())
+        diffs = parse_diffs(messages[-1].content.strip(), diff_timeout=diff_timeout)
+        # edits of files outside the plan would race with the other conversations
+        diff = next(
+            (
+                d
+                for d in diffs.values()
+                if d.filename_pre == file_name
+                or (d.filename_post == file_name and d.is_new_file())
+            ),
+            None,
+        )
+        if diff is None:
+            errors = [f"No diff for {file_name} was found in the answer."]
+        elif diff.is_new_file():
+            errors = []
+        elif is_new_file:
+            errors = [f"{file_name} does not exist yet, the diff must create it."]
+            diff = None
+        else:
+            errors = diff.validate_and_correct(
+                file_to_lines_dict(files_dict[file_name])
+            )
+        if not errors:
+            break
+
+    memory.log(IMPROVE_LOG_FILE, "\n\n".join(x.pretty_repr() for x in messages))
+    memory.log(DIFF_LOG_FILE, "\n\n".join(errors))
+    return diff
@@ -12,6 +12,8 @@ from typing import Dict, List, Any
 import json
 import asyncio
 import fnmatch
+import itertools
+import time
 
 from fastapi import FastAPI, Body, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
@@ -22,6 +24,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # 导入 gpt-engineer 核心模块
+from gpt_engineer.core import profiling
 from gpt_engineer.core.ai import AI
 from gpt_engineer.core.default.steps import gen_code
 from gpt_engineer.core.prompt import Prompt
@@ -74,6 +77,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 性能分析：设置 GPTE_PROFILE 时，每个请求写一份 trace 到 GPTE_PROFILE_DIR（默认 profiles/）
+class ProfileRequestsMiddleware:
+    """
+    为每个请求记录一份 trace。
+
+    profiler 是进程级的，分析期间请求串行处理，保证每份 trace 只包含一个请求。
+    未开启分析时不加锁。
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = asyncio.Lock()
+        self._requests = itertools.count(1)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiling.requested_in_env():
+            await self.app(scope, receive, send)
+            return
+
+        async with self._lock:
+            name = scope["path"].strip("/").replace("/", "_") or "root"
+            trace_dir = Path(os.getenv("GPTE_PROFILE_DIR", "profiles")) / (
+                f"{time.strftime('%Y%m%d-%H%M%S')}-{next(self._requests):04d}-{name}"
+            )
+            profiling.enable_from_env()
+            try:
+                # 应用返回时响应已发送完毕（包括流式响应），或客户端已断开
+                await self.app(scope, receive, send)
+            finally:
+                profiling.finish(trace_dir)
+
+
+app.add_middleware(ProfileRequestsMiddleware)
+
+
 # 初始化 gpt-engineer 组件
 # 检查 API key
 if not os.getenv("OPENAI_API_KEY") and not os.getenv("ANTHROPIC_API_KEY"):
@@ -0,0 +1,92 @@
+"""
+Benchmark for FileSelector.get_current_files on a synthetic project tree.
+
+The generated tree mimics a JS monorepo: most of its files live in directories that
+file selection ignores (node_modules, .git, venv, gitignored build output), and only a
+small share are actual sources. The pruning walker is compared with the previous
+approach of globbing the whole tree and filtering afterwards.
+"""
+
+import os
+import tempfile
+import time
+
+from pathlib import Path
+
+from typer import run
+
+from gpt_engineer.applications.cli.file_selector import FileSelector
+
+
+def make_tree(root: Path, n_files: int) -> None:
+    """
+    Create a synthetic tree of roughly n_files files under root.
+    """
+    layout = {
+        "node_modules": 0.70,
+        ".git/objects": 0.10,
+        "venv/lib": 0.05,
+        "dist": 0.05,
+        "packages": 0.10,
+    }
+    files_per_dir = 50
+    for top, share in layout.items():
+        n_dirs = max(1, int(n_files * share) // files_per_dir)
+        for d in range(n_dirs):
+            directory = root / top / f"pkg_{d % 100}" / f"mod_{d}"
+            directory.mkdir(parents=True, exist_ok=True)
+            for f in range(files_per_dir):
+                (directory / f"file_{f}.js").touch()
+    (root / ".gitignore").write_text("dist/\n*.map\n")
+
+
+def legacy_get_current_files(project_path: Path) -> list:
+    """
+    The glob-then-filter implementation get_current_files used before pruning.
+    """
+    all_files = []
+    for path in project_path.glob("**/*"):
+        if path.is_file():
+            relpath = path.relative_to(project_path)
+            parts = relpath.parts
+            if any(part.startswith(".") for part in parts):
+                continue
+            if any(part in FileSelector.IGNORE_FOLDERS for part in parts):
+                continue
+            all_files.append(str(relpath))
+    return all_files
+
+
+def main(n_files: int = 200_000, workers: int = os.cpu_count() or 1):
+    """
+    Build the synthetic tree and time both walkers on it.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        t0 = time.perf_counter()
+        make_tree(root, n_files)
+        print(f"Created {n_files} files in {time.perf_counter() - t0:.1f}s")
+
+        selector = FileSelector(root)
+
+        t0 = time.perf_counter()
+        legacy = legacy_get_current_files(root)
+        print(
+            f"glob + filter:      {time.perf_counter() - t0:.2f}s, {len(legacy)} files"
+        )
+
+        t0 = time.perf_counter()
+        pruned = selector.get_current_files(root)
+        print(
+            f"pruning walker:     {time.perf_counter() - t0:.2f}s, {len(pruned)} files"
+        )
+
+        t0 = time.perf_counter()
+        parallel = selector.get_current_files(root, max_workers=workers)
+        print(
+            f"pruning walker x{workers}:  {time.perf_counter() - t0:.2f}s, {len(parallel)} files"
+        )
+
+
+if __name__ == "__main__":
+    run(main)
@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+
+from unittest.mock import MagicMock
+
+from langchain.schema import AIMessage
+
+from gpt_engineer.applications.cli.batch import load_manifest, run_batch
+from gpt_engineer.core.rate_limiter import RateLimiter
+from gpt_engineer.core.token_usage import TokenUsage
+
+MANIFEST = """
+[defaults]
+model = "gpt-4o"
+
+[[projects]]
+path = "hello"
+
+[[projects]]
+path = "no-prompt"
+temperature = 0.5
+"""
+
+
+class MockAI:
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def __init__(self, rate_limiter=None, **kwargs):
+        self.rate_limiter = rate_limiter
+        self.usage = []
+        self.token_usage_log = MagicMock()
+        self.token_usage_log.log.return_value = self.usage
+        self.token_usage_log.cost.side_effect = (
+            lambda prompt, completion: (prompt + completion) / 1000
+        )
+        self.token_usage_log.format_log.return_value = "step_name,total_tokens\n"
+
+    def start(self, system, user, *, step_name, **kwargs):
+        return self.next([], step_name=step_name)
+
+    def next(self, messages, prompt=None, *, step_name, **kwargs):
+        with self.rate_limiter:
+            with MockAI.lock:
+                MockAI.in_flight += 1
+                MockAI.max_in_flight = max(MockAI.max_in_flight, MockAI.in_flight)
+            time.sleep(0.05)
+            with MockAI.lock:
+                MockAI.in_flight -= 1
+        if step_name == "gen_entrypoint":
+            answer = "```sh\npython main.py\n```"
+        else:
+            answer = "main.py\n```python\nprint('Hello, World!')\n```"
+        self.usage.append(TokenUsage(step_name, 10, 5, 15, 0, 0, 0))
+        return messages + [AIMessage(content=answer)]
+
+
+def test_run_batch_reports_failures_without_stopping(tmp_path):
+    (tmp_path / "manifest.toml").write_text(MANIFEST)
+    (tmp_path / "hello").mkdir()
+    (tmp_path / "hello" / "prompt").write_text("Print hello world")
+    (tmp_path / "no-prompt").mkdir()
+    projects = load_manifest(tmp_path / "manifest.toml")
+    assert projects[1].temperature == 0.5 and projects[1].model == "gpt-4o"
+
+    summary = run_batch(
+        projects,
+        tmp_path / "results",
+        concurrency=2,
+        rate_limiter=RateLimiter(1),
+        ai_factory=MockAI,
+    )
+
+    assert (summary["ok"], summary["errors"]) == (1, 1)
+    ok, error = summary["results"]
+    assert ok["files"] == ["main.py", "run.sh"]
+    assert (tmp_path / "hello" / "main.py").read_text() == "print('Hello, World!')"
+    assert ok["prompt_tokens"] == 20 and ok["cost"] == 0.03
+    assert "No prompt" in error["error"]
+    assert MockAI.max_in_flight == 1
+    results = tmp_path / "results"
+    assert (
+        json.loads((results / "0000-hello" / "result.json").read_text())["status"]
+        == "ok"
+    )
+    assert (results / "0000-hello" / "token_usage.csv").exists()
+    assert json.loads((results / "summary.json").read_text())["projects"] == 2
@@ -6,6 +6,7 @@ import pytest
 from langchain.schema import AIMessage
 
 from gpt_engineer.applications.cli.cli_agent import CliAgent
+from gpt_engineer.core.checkpoints import StepCheckpoints
 from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
 from gpt_engineer.core.default.disk_memory import DiskMemory
 
@@ -13,7 +14,7 @@ from gpt_engineer.core.default.disk_memory import DiskMemory
 from gpt_engineer.core.default.paths import ENTRYPOINT_FILE, memory_path
 from gpt_engineer.core.files_dict import FilesDict
 from gpt_engineer.core.prompt import Prompt
-from gpt_engineer.tools.custom_steps import clarified_gen, lite_gen
+from gpt_engineer.tools.custom_steps import clarified_gen, lite_gen, self_heal
 from tests.mock_ai import MockAI
 
 
@@ -112,6 +113,25 @@ def test_init_clarified_gen_config(monkeypatch):
     assert code[outfile].strip() == "Hello World!"
 
 
+def test_init_composes_the_custom_steps_as_a_graph():
+    agent = CliAgent.with_default_config(
+        DiskMemory(tempfile.mkdtemp()),
+        DiskExecutionEnv(),
+        ai=MockAI([]),
+        code_gen_fn=clarified_gen,
+        process_code_fn=self_heal,
+    )
+
+    graph = agent._init_graph()
+
+    assert [(s.name, list(s.inputs), s.output) for s in graph.steps] == [
+        ("clarified_gen", ["prompt"], "files_dict"),
+        ("gen_entrypoint", ["prompt", "files_dict"], "entrypoint"),
+        ("combine_files", ["files_dict", "entrypoint"], "combined_dict"),
+        ("self_heal", ["prompt", "combined_dict"], "processed_dict"),
+    ]
+
+
 def test_improve_standard_config(monkeypatch):
     monkeypatch.setattr("builtins.input", lambda _: "y")
     temp_dir = tempfile.mkdtemp()
@@ -150,5 +170,43 @@ def test_improve_standard_config(monkeypatch):
     assert code[outfile] == "!dlroW olleH"
 
 
+def test_init_resumes_from_checkpoints(monkeypatch):
+    monkeypatch.setattr("builtins.input", lambda _: "y")
+    temp_dir = tempfile.mkdtemp()
+    memory = DiskMemory(memory_path(temp_dir))
+    execution_env = DiskExecutionEnv()
+    prompt = Prompt("Make a program that prints 'Hello World!' to output.txt")
+    responses = [
+        AIMessage(
+            "hello_world.py\n```\nwith open('output.txt', 'w') as file:\n    file.write('Hello World!')\n```"
+        ),
+        AIMessage("```run.sh\npython3 hello_world.py\n```"),
+    ]
+    code = CliAgent.with_default_config(
+        memory,
+        execution_env,
+        ai=MockAI(responses),
+        checkpoints=StepCheckpoints(memory),
+    ).init(prompt)
+
+    # the AI has no answers left, every step must come from the checkpoints
+    resumed = CliAgent.with_default_config(
+        memory,
+        execution_env,
+        ai=MockAI([]),
+        checkpoints=StepCheckpoints(memory, resume=True),
+    ).init(prompt)
+    assert resumed == code
+
+    # a different prompt invalidates the checkpoints
+    with pytest.raises(StopIteration):
+        CliAgent.with_default_config(
+            memory,
+            execution_env,
+            ai=MockAI([]),
+            checkpoints=StepCheckpoints(memory, resume=True),
+        ).init(Prompt("Make a program that prints 'Goodbye!'"))
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,107 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from gpt_engineer.applications.cli.daemon import (
+    SOCKET_ENV_VAR,
+    _forwarded_env,
+    default_socket_path,
+    run_client,
+)
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(os, "fork"), reason="the daemon forks a child per request"
+)
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    socket_path = str(tmp_path / "gpte.sock")
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "from gpt_engineer.applications.cli.daemon import serve; "
+            f"serve({socket_path!r})",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while not os.path.exists(socket_path):
+        if time.time() > deadline or process.poll() is not None:
+            process.kill()
+            pytest.fail("The daemon did not start")
+        time.sleep(0.1)
+    yield socket_path
+    process.terminate()
+    process.wait(timeout=10)
+    assert not os.path.exists(socket_path)
+
+
+def test_client_runs_commands_in_the_daemon(daemon, tmp_path):
+    client = [
+        sys.executable,
+        "-c",
+        "import sys; from gpt_engineer.applications.cli.daemon import client_main; "
+        "client_main()",
+    ]
+    env = {**os.environ, SOCKET_ENV_VAR: daemon}
+
+    result = subprocess.run(
+        client + ["--help"], env=env, cwd=tmp_path, capture_output=True, text=True
+    )
+    assert result.returncode == 0
+    assert "Usage: gpte" in result.stdout
+
+    result = subprocess.run(
+        client + ["--improve", "--lite"],
+        env=env,
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 1
+    assert "not compatible with improve mode" in result.stdout
+
+
+def test_run_client_without_daemon(tmp_path):
+    assert run_client(["--help"], str(tmp_path / "missing.sock")) is None
+
+
+def test_run_client_only_connects_to_sockets_of_the_user(tmp_path, capsys):
+    planted = tmp_path / "planted.sock"
+    planted.write_text("")
+    link = tmp_path / "link.sock"
+    link.symlink_to(planted)
+
+    assert run_client(["--help"], str(planted)) is None
+    assert run_client(["--help"], str(link)) is None
+    assert "not a socket of the current user" in capsys.readouterr().err
+
+
+def test_default_socket_path_is_in_a_directory_of_the_user(monkeypatch, tmp_path):
+    monkeypatch.delenv(SOCKET_ENV_VAR, raising=False)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    assert default_socket_path() == str(tmp_path / "gpte.sock")
+
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    assert os.path.basename(os.path.dirname(default_socket_path())) == (
+        f"gpte-{os.getuid()}"
+    )
+
+
+def test_client_only_forwards_the_environment_gpte_needs():
+    env = _forwarded_env(
+        {
+            "PATH": "/bin",
+            "OPENAI_API_KEY": "sk-test",
+            "GPTE_PROFILE": "1",
+            "AWS_SECRET_ACCESS_KEY": "secret",
+            "GITHUB_TOKEN": "token",
+        }
+    )
+    assert env == {"PATH": "/bin", "OPENAI_API_KEY": "sk-test", "GPTE_PROFILE": "1"}
@@ -0,0 +1,36 @@
+import pytest
+
+from gpt_engineer.benchmark.types import Assertable
+from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
+from gpt_engineer.core.files_dict import FilesDict
+
+try:
+    from gpt_engineer.benchmark.benchmarks.apps.load import AppsAssertion
+except ImportError as e:
+    pytest.skip(f"the APPS benchmark cannot be imported: {e}", allow_module_level=True)
+
+
+def test_apps_assertions_share_the_sandbox_within_limits():
+    files = FilesDict(
+        {
+            "main.py": "import sys\n"
+            "if sys.argv[1] == 'big':\n"
+            "    data = bytearray(512 * 1024 * 1024)\n"
+            "print(sys.argv[1])\n"
+        }
+    )
+    env = DiskExecutionEnv()
+    env.upload(files)
+    assertable = Assertable(files=files, env=env, process=None, stdout="", stderr="")
+
+    def assertion(argument, expected):
+        return AppsAssertion(
+            expected=expected,
+            command=f'python main.py "{argument}"',
+            memory_limit_mb=256,
+        )
+
+    assert assertion("1 2", "12").evaluate(assertable)
+    assert not assertion("1 2", "3").evaluate(assertable)
+    # killed by the memory limit before printing
+    assert not assertion("big", "big").evaluate(assertable)
@@ -0,0 +1,124 @@
+import json
+
+import pytest
+
+from typer.testing import CliRunner
+
+from gpt_engineer.benchmark.compare import (
+    compare_results,
+    format_comparison,
+    load_results,
+    mann_whitney_u_test,
+    wilcoxon_signed_rank_test,
+)
+from gpt_engineer.benchmark.result_store import ResultStore
+from gpt_engineer.benchmark.run import export_yaml_results
+from gpt_engineer.benchmark.types import TaskResult
+
+
+def export(path, durations, solved=True, tokens=100):
+    results = [
+        TaskResult(
+            f"task {i}",
+            {"ok": solved or i > 0},
+            duration=duration,
+            prompt_tokens=tokens,
+        )
+        for i, duration in enumerate(durations)
+    ]
+    export_yaml_results(
+        path, {"bench": {"detailed": [r.to_dict() for r in results]}}, {}
+    )
+    return path
+
+
+def test_signed_rank_and_rank_sum_tests():
+    baseline = [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+    # exact: every one of the 2**6 sign combinations is as likely
+    assert wilcoxon_signed_rank_test(baseline, [b + 1 + b / 10 for b in baseline]) == (
+        pytest.approx(1 / 64)
+    )
+    assert wilcoxon_signed_rank_test(baseline, [b - 1 for b in baseline]) > 0.99
+    assert wilcoxon_signed_rank_test(baseline, baseline) == 1.0
+    # with ties, approximated
+    assert wilcoxon_signed_rank_test(baseline, [b + 1 for b in baseline]) < 0.05
+
+    assert mann_whitney_u_test(baseline, [b + 10 for b in baseline]) < 0.01
+    assert mann_whitney_u_test([b + 10 for b in baseline], baseline) > 0.99
+    assert mann_whitney_u_test([], baseline) == 1.0
+
+
+def test_compare_exports(tmp_path):
+    durations = [10.0, 20.0, 30.0, 40.0, 50.0, 60.0]
+    baseline = load_results(export(tmp_path / "a.yaml", durations))
+    slower = load_results(
+        export(tmp_path / "b.yaml", [d * 1.5 for d in durations], solved=False)
+    )
+
+    [comparison] = compare_results(baseline, slower)
+    assert comparison.regression
+    assert comparison.pass_rate_baseline == 1.0
+    assert comparison.pass_rate_candidate == pytest.approx(5 / 6)
+    assert comparison.duration_candidate == 1.5 * comparison.duration_baseline
+    assert all(task.p_value is None for task in comparison.tasks)
+    report = format_comparison([comparison])
+    assert "REGRESSION" in report
+    assert "100.0% -> 83.3%" in report
+
+    # significant, but below the threshold
+    [comparison] = compare_results(
+        baseline,
+        load_results(export(tmp_path / "c.yaml", [d + 1 for d in durations])),
+    )
+    assert comparison.p_value < 0.05
+    assert not comparison.regression
+
+
+def test_compare_result_stores_per_task(tmp_path):
+    baseline = ResultStore(tmp_path / "a.jsonl", "a")
+    candidate = ResultStore(tmp_path / "b.jsonl", "b")
+    for i in range(6):
+        baseline.append("bench", TaskResult("fast", {}, duration=1 + i / 100))
+        baseline.append("bench", TaskResult("steady", {}, duration=1 + i / 100))
+        candidate.append("bench", TaskResult("fast", {}, duration=2 + i / 100))
+        candidate.append("bench", TaskResult("steady", {}, duration=1 + i / 100))
+    candidate.append("bench", TaskResult("new", {}, duration=1))
+    candidate.append("other", TaskResult("new", {}, duration=1))
+
+    [comparison] = compare_results(
+        load_results(baseline.path), load_results(candidate.path, "b")
+    )
+    assert [task.task_name for task in comparison.task_regressions] == ["fast"]
+    assert comparison.only_candidate == ["new"]
+    assert load_results(candidate.path, "a") == {}
+
+
+def test_compare_command_exit_code(tmp_path):
+    try:
+        from gpt_engineer.benchmark.__main__ import app
+    except ImportError as e:
+        # the benchmarks need the datasets package and its dependencies
+        pytest.skip(f"bench cannot be imported: {e}")
+
+    durations = [10.0, 20.0, 30.0, 40.0, 50.0, 60.0]
+    baseline = export(tmp_path / "a.yaml", durations)
+    candidate = tmp_path / "b.json"
+    candidate.write_text(
+        json.dumps(
+            {
+                "bench": {
+                    "detailed": [
+                        TaskResult(f"task {i}", {}, duration=d * 2).to_dict()
+                        for i, d in enumerate(durations)
+                    ]
+                }
+            }
+        )
+    )
+    runner = CliRunner()
+
+    result = runner.invoke(app, ["compare", str(baseline), str(baseline)])
+    assert result.exit_code == 0, result.output
+    result = runner.invoke(app, ["compare", str(baseline), str(candidate)])
+    assert result.exit_code == 1
+    assert "Latency regressions in: bench" in result.output
@@ -0,0 +1,52 @@
+import io
+import stat
+import tarfile
+
+import pytest
+
+from gpt_engineer.benchmark.dataset_cache import cached_dataset_path, import_dataset
+
+
+def make_saved_dataset(path):
+    (path / "test").mkdir(parents=True)
+    (path / "dataset_dict.json").write_text('{"splits": ["test"]}')
+    (path / "test" / "data-00000-of-00001.arrow").write_bytes(b"arrow data")
+    return path
+
+
+def test_import_dataset_is_content_versioned(tmp_path):
+    saved = make_saved_dataset(tmp_path / "apps")
+    archive = tmp_path / "apps.tar.gz"
+    with tarfile.open(archive, "w:gz") as tf:
+        tf.add(saved, arcname="apps")
+    cache_dir = tmp_path / "cache"
+
+    assert cached_dataset_path("apps", cache_dir) is None
+    from_archive = import_dataset("apps", archive, cache_dir)
+    from_directory = import_dataset("apps", saved, cache_dir)
+
+    assert from_archive == from_directory == cached_dataset_path("apps", cache_dir)
+    assert (from_archive / "test" / "data-00000-of-00001.arrow").read_bytes() == (
+        b"arrow data"
+    )
+    assert not (from_archive / "dataset_dict.json").stat().st_mode & stat.S_IWUSR
+    assert {p.name for p in (cache_dir / "apps").iterdir()} == {
+        "CURRENT",
+        from_archive.name,
+    }
+
+    (saved / "test" / "data-00000-of-00001.arrow").write_bytes(b"new data")
+    assert import_dataset("apps", saved, cache_dir) != from_archive
+
+
+def test_import_dataset_rejects_archives_without_dataset(tmp_path):
+    archive = tmp_path / "empty.tar"
+    with tarfile.open(archive, "w") as tf:
+        info = tarfile.TarInfo("README")
+        info.size = 5
+        tf.addfile(info, io.BytesIO(b"hello"))
+
+    with pytest.raises(ValueError, match="No dataset found"):
+        import_dataset("apps", archive, tmp_path / "cache")
+    with pytest.raises(ValueError, match="Invalid dataset name"):
+        import_dataset("../apps", archive, tmp_path / "cache")
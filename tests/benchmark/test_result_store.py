@@ -0,0 +1,69 @@
+from gpt_engineer.benchmark.result_store import ResultStore, run_fingerprint
+from gpt_engineer.benchmark.run import run
+from gpt_engineer.benchmark.types import Benchmark, Task, TaskResult
+from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.prompt import Prompt
+
+
+class CountingAgent:
+    def __init__(self):
+        self.prompts = []
+
+    def improve(self, files_dict, prompt):
+        self.prompts.append(prompt.text)
+        return FilesDict({"main.py": prompt.text})
+
+
+def make_benchmark():
+    tasks = [
+        Task(
+            name=f"task {i}",
+            initial_code=FilesDict(),
+            command=None,
+            prompt=Prompt(str(i)),
+            assertions={"written": lambda a: "main.py" in a.files},
+        )
+        for i in range(3)
+    ]
+    return Benchmark("counting", tasks)
+
+
+def test_resume_skips_tasks_completed_with_the_same_fingerprint(tmp_path):
+    agent_path = tmp_path / "agent.py"
+    agent_path.write_text("def default_config_agent(): ...")
+    fingerprint = run_fingerprint(agent_path, {"test_len": 3}, "gpt-4o")
+    store = ResultStore(tmp_path / "results.jsonl", fingerprint)
+
+    first = run(CountingAgent(), make_benchmark(), result_store=store)
+    # a run that crashed while writing the record of the next task
+    with open(store.path, "a") as f:
+        f.write('{"fingerprint": "')
+
+    agent = CountingAgent()
+    second = run(agent, make_benchmark(), result_store=store, resume=True)
+
+    assert agent.prompts == []
+    assert second == first
+    assert first[0].files_hash and first[0].files_hash != first[1].files_hash
+
+    other_model = ResultStore(
+        store.path, run_fingerprint(agent_path, {"test_len": 3}, "gpt-4o-mini")
+    )
+    agent = CountingAgent()
+    run(agent, make_benchmark(), result_store=other_model, resume=True)
+    assert agent.prompts == ["0", "1", "2"]
+
+
+def test_append_after_a_partial_record_keeps_the_new_record(tmp_path):
+    path = tmp_path / "results.jsonl"
+    store = ResultStore(path, "abc")
+    store.append("bench", TaskResult("first", {}, duration=1))
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"fingerprint": "abc", "task_na')
+
+    resumed = ResultStore(path, "abc")
+    resumed.append("bench", TaskResult("second", {}, duration=1))
+    resumed.append("bench", TaskResult("third", {}, duration=1))
+
+    assert set(resumed.completed("bench")) == {"first", "second", "third"}
+    assert len(path.read_text().splitlines()) == 4
@@ -0,0 +1,176 @@
+import csv
+import json
+import threading
+import time
+
+from gpt_engineer.benchmark.run import (
+    evaluate_assertions,
+    export_csv_results,
+    export_json_results,
+    percentile,
+    run,
+    run_task,
+    timing_percentiles,
+)
+from gpt_engineer.benchmark.types import Assertable, Benchmark, Task, TaskResult
+from gpt_engineer.core.chat_to_files import parse_diffs
+from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.profiling import LLM_CATEGORY, span
+from gpt_engineer.core.prompt import Prompt
+
+
+class SlowAgent:
+    def __init__(self):
+        self.threads = set()
+
+    def improve(self, files_dict, prompt):
+        self.threads.add(threading.get_ident())
+        time.sleep(0.3)
+        return FilesDict({"main.py": f"print({prompt.text!r})"})
+
+
+def test_run_with_workers_keeps_task_order(tmp_path):
+    tasks = [
+        Task(
+            name=f"task {i}",
+            initial_code=FilesDict(),
+            command="python main.py",
+            prompt=Prompt(str(i)),
+            assertions={"prints": lambda a, i=i: a.stdout.strip() == str(i)},
+        )
+        for i in range(6)
+    ]
+    agents = []
+
+    def agent_factory():
+        agents.append(SlowAgent())
+        return agents[-1]
+
+    start = time.time()
+    results = run(
+        SlowAgent(),
+        Benchmark("slow", tasks, timeout=30),
+        workers=3,
+        agent_factory=agent_factory,
+    )
+
+    assert time.time() - start < 6 * 0.3
+    assert [result.task_name for result in results] == [task.name for task in tasks]
+    assert all(result.success_rate == 1 for result in results)
+    # an agent per worker thread
+    assert len(agents) <= 3
+    assert all(len(agent.threads) == 1 for agent in agents)
+
+
+def test_evaluate_assertions_fast_fail_skips_remaining():
+    evaluated = []
+
+    def assertion(passes, delay):
+        def evaluate(assertable):
+            time.sleep(delay)
+            evaluated.append(passes)
+            return passes
+
+        return evaluate
+
+    assertions = {
+        "fails": assertion(False, 0),
+        **{f"slow {i}": assertion(True, 0.5) for i in range(4)},
+    }
+
+    results = evaluate_assertions(assertions, None, workers=1, fast_fail=True)
+    assert results == {name: False for name in assertions}
+    assert evaluated == [False]
+
+    evaluated.clear()
+    start = time.time()
+    results = evaluate_assertions(assertions, None, workers=5)
+    assert time.time() - start < 1.5
+    assert list(results) == list(assertions)
+    assert sum(results.values()) == 4
+
+
+def test_evaluate_assertions_fast_fail_signals_running_assertions():
+    def fails(assertable):
+        time.sleep(0.1)
+        return False
+
+    def slow(assertable):
+        # stands for an example whose process runs until the assertions are cancelled
+        assertable.cancelled.wait(timeout=5)
+        return True
+
+    assertions = {"fails": fails, "slow": slow}
+    assertable = Assertable(FilesDict(), None, None, None, None)
+
+    start = time.time()
+    results = evaluate_assertions(assertions, assertable, workers=2, fast_fail=True)
+    assert time.time() - start < 2
+    assert results == {"fails": False, "slow": False}
+    assert assertable.cancelled is None
+
+
+class TimedAgent:
+    def improve(self, files_dict, prompt):
+        with span("llm_request", LLM_CATEGORY):
+            time.sleep(0.2)
+        parse_diffs("no diff here")
+        return FilesDict({"main.py": "import time; time.sleep(0.2)"})
+
+
+def test_run_task_breaks_down_time():
+    task = Task(
+        name="timed",
+        initial_code=FilesDict(),
+        command="python main.py",
+        prompt=Prompt(""),
+        assertions={"slow": lambda a: time.sleep(0.1) is None},
+    )
+    result = run_task(TimedAgent(), task, Benchmark("timed", [task], timeout=30))
+
+    assert result.success_rate == 1
+    assert 0.2 <= result.llm_time < result.duration
+    assert 0 < result.diff_time < 0.2
+    assert result.upload_time > 0
+    assert result.execution_time >= 0.2
+    assert result.assertion_time >= 0.1
+
+
+def test_timing_percentiles_and_exports(tmp_path):
+    assert percentile([], 50) == 0.0
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile(range(1, 11), 90) == 9.1
+
+    results = [
+        TaskResult(f"task {i}", {"ok": True}, duration=i, prompt_tokens=10 * i)
+        for i in range(1, 101)
+    ]
+    percentiles = timing_percentiles(results)
+    assert percentiles["duration"] == {"p50": 50.5, "p90": 90.1, "p99": 99.01}
+    assert percentiles["prompt_tokens"]["p50"] == 505
+    assert percentiles["llm_time"] == {"p50": 0.0, "p90": 0.0, "p99": 0.0}
+
+    complete_results = {
+        "bench": {
+            "detailed": [result.to_dict() for result in results],
+            "percentiles": percentiles,
+        }
+    }
+    export_json_results(tmp_path / "results.json", complete_results, {"n": 1})
+    exported = json.loads((tmp_path / "results.json").read_text())
+    assert exported["bench"]["fully_solved"] == 1.0
+    assert exported["bench"]["percentiles"] == percentiles
+    assert exported["config"] == {"n": 1}
+    assert "fully_solved" not in complete_results["bench"]
+
+    export_csv_results(tmp_path / "results.csv", complete_results)
+    with open(tmp_path / "results.csv") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == len(percentiles)
+    assert rows[0] == {
+        "benchmark": "bench",
+        "metric": "duration",
+        "p50": "50.5",
+        "p90": "90.1",
+        "p99": "99.01",
+    }
@@ -0,0 +1,129 @@
+import os
+import re
+import time
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from langchain.schema import AIMessage
+
+from gpt_engineer.core.default.candidates import gen_candidates, run_entrypoint
+from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
+from gpt_engineer.core.default.disk_memory import DiskMemory
+from gpt_engineer.core.default.paths import ENTRYPOINT_FILE, PREPROMPTS_PATH
+from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.preprompts_holder import PrepromptsHolder
+from gpt_engineer.core.prompt import Prompt
+from gpt_engineer.core.token_usage import TokenUsage
+
+ENTRYPOINTS = {"1": "exit 1", "2": "sleep 2; exit 0", "3": "sleep 30"}
+
+
+class MockAI:
+    def __init__(self):
+        self.usage = []
+        self.token_usage_log = MagicMock()
+        self.token_usage_log.log.return_value = self.usage
+        self.token_usage_log.cost.side_effect = (
+            lambda prompt, completion: (prompt + completion) / 1000
+        )
+
+    def next(self, messages, prompt=None, *, step_name, on_text=None):
+        candidate = re.search(r"candidate (\d+)", step_name).group(1)
+        if step_name.startswith("gen_entrypoint"):
+            answer = f"```sh\n{ENTRYPOINTS[candidate]}\n```"
+        else:
+            answer = f"main.py\n```python\nprint({candidate})\n```"
+        self.usage.append(TokenUsage(step_name, 10, 5, 15, 0, 0, 0))
+        return messages + [AIMessage(content=answer)]
+
+
+class StreamingAI(MockAI):
+    """Candidate 2 passes at once, candidate 1 streams its code slowly."""
+
+    def __init__(self):
+        super().__init__()
+        self.token_usage_log.update_log.side_effect = (
+            lambda messages, answer, step_name: self.usage.append(
+                TokenUsage(step_name, 10, len(answer), 10 + len(answer), 0, 0, 0)
+            )
+        )
+
+    def next(self, messages, prompt=None, *, step_name, on_text=None):
+        if step_name == "gen_code [candidate 1]":
+            for end in range(1, 100):
+                time.sleep(0.05)
+                on_text("x" * end)
+        return super().next(messages, prompt, step_name=step_name, on_text=on_text)
+
+
+def test_gen_candidates_keeps_first_passing_candidate(tmp_path):
+    start = time.time()
+
+    files_dict, reports = gen_candidates(
+        MockAI(),
+        Prompt("Print a number"),
+        DiskMemory(tmp_path),
+        PrepromptsHolder(PREPROMPTS_PATH),
+        n_candidates=3,
+    )
+
+    assert files_dict == {"main.py": "print(2)", ENTRYPOINT_FILE: "sleep 2; exit 0\n"}
+    assert [report.status for report in reports[:2]] == ["failed", "passed"]
+    # the slow candidate is killed instead of waited for
+    assert reports[2].status == "cancelled"
+    assert time.time() - start < 20
+    assert reports[0].prompt_tokens == 20
+    assert reports[0].completion_tokens == 10
+    assert reports[0].cost == 0.03
+
+
+def test_gen_candidates_counts_the_tokens_of_cancelled_answers(tmp_path):
+    start = time.time()
+
+    files_dict, reports = gen_candidates(
+        StreamingAI(),
+        Prompt("Print a number"),
+        DiskMemory(tmp_path),
+        PrepromptsHolder(PREPROMPTS_PATH),
+        n_candidates=2,
+        check=lambda files_dict, env: "print(2)" in files_dict["main.py"],
+    )
+
+    assert files_dict["main.py"] == "print(2)"
+    assert reports[0].status == "cancelled"
+    # the answer stopped streaming, and what was streamed is counted
+    assert time.time() - start < 4
+    assert reports[0].prompt_tokens == 10
+    assert 0 < reports[0].completion_tokens < 99
+
+
+def is_running(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # zombies are dead, and wait for a parent that may not reap them
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="needs /proc")
+def test_run_entrypoint_kills_the_programs_the_entrypoint_started(tmp_path):
+    sleeper = (
+        "python3 -c 'import os, time; "
+        'open("child.pid", "w").write(str(os.getpid())); time.sleep(30)\''
+    )
+
+    start = time.time()
+    passed = run_entrypoint(
+        FilesDict({ENTRYPOINT_FILE: sleeper}), DiskExecutionEnv(tmp_path), timeout=1
+    )
+
+    assert not passed
+    assert time.time() - start < 10
+    child = int((tmp_path / "child.pid").read_text())
+    deadline = time.time() + 5
+    while is_running(child) and time.time() < deadline:
+        time.sleep(0.1)
+    assert not is_running(child)
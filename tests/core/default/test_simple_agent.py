@@ -1,10 +1,12 @@
 import tempfile
+import threading
 
 import pytest
 
 from langchain.schema import AIMessage
 
 from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
+from gpt_engineer.core.default.disk_memory import DiskMemory
 from gpt_engineer.core.default.paths import ENTRYPOINT_FILE
 from gpt_engineer.core.default.simple_agent import SimpleAgent
 from gpt_engineer.core.files_dict import FilesDict
@@ -72,5 +74,38 @@ def test_improve():
     assert code[outfile] == "!dlroW olleH"
 
 
+class StepAI:
+    """Answers by step name, waiting for the entrypoint and README to overlap."""
+
+    def __init__(self):
+        self.calls = []
+        self.barrier = threading.Barrier(2, timeout=5)
+
+    def start(self, system, user, *, step_name):
+        self.calls.append(step_name)
+        if step_name == "gen_code":
+            return [AIMessage(f"main.py\n```\nprint({len(self.calls)})\n```")]
+        self.barrier.wait()
+        if step_name == "gen_entrypoint":
+            return [AIMessage("```sh\npython3 main.py\n```")]
+        return [AIMessage("```markdown\n# Demo\n\n```sh\nbash run.sh\n```\n```")]
+
+
+def test_init_generates_readme_alongside_entrypoint():
+    ai = StepAI()
+    agent = SimpleAgent(
+        DiskMemory(tempfile.mkdtemp()), DiskExecutionEnv(), ai, readme=True
+    )
+
+    code = agent.init(Prompt("Print a number"))
+
+    assert code["run.sh"] == "python3 main.py\n"
+    assert code["README.md"] == "# Demo\n\n```sh\nbash run.sh\n```\n"
+    assert code["main.py"] == "print(1)"
+
+    # every run samples new code
+    assert agent.init(Prompt("Print a number"))["main.py"] == "print(4)"
+
+
 if __name__ == "__main__":
     pytest.main()
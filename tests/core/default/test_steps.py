@@ -5,7 +5,7 @@ from unittest.mock import MagicMock
 
 import pytest
 
-from langchain.schema import SystemMessage
+from langchain.schema import AIMessage, SystemMessage
 
 from gpt_engineer.core.ai import AI
 from gpt_engineer.core.default.disk_memory import DiskMemory
@@ -13,6 +13,7 @@ from gpt_engineer.core.default.paths import ENTRYPOINT_FILE, PREPROMPTS_PATH
 from gpt_engineer.core.default.steps import (
     curr_fn,
     gen_code,
+    gen_code_with_entrypoint,
     gen_entrypoint,
     improve_fn,
     setup_sys_prompt,
@@ -21,6 +22,7 @@ from gpt_engineer.core.default.steps import (
 from gpt_engineer.core.files_dict import FilesDict
 from gpt_engineer.core.linting import Linting
 from gpt_engineer.core.preprompts_holder import PrepromptsHolder
+from gpt_engineer.core.profiling import collect_timings
 from gpt_engineer.core.prompt import Prompt
 
 factorial_program = """
@@ -265,6 +267,94 @@ pytest test_factorial.py
         # assert memory[ENTRYPOINT_LOG_FILE] == "Irrelevant explanation"
 
 
+class TestGenCodeWithEntrypoint:
+    class MockAI:
+        def __init__(self, code, entrypoint):
+            self.code = code
+            self.entrypoint = entrypoint
+            self.entrypoint_requests = []
+
+        def start(self, system, user, step_name, on_text=None):
+            if step_name == "gen_entrypoint":
+                self.entrypoint_requests.append(user)
+                return [SystemMessage(content=self.entrypoint)]
+            for end in range(0, len(self.code), 20):
+                on_text(self.code[:end])
+            return [SystemMessage(content=self.code)]
+
+    def test_entrypoint_is_requested_once_the_manifest_is_written(self):
+        code = (
+            "main.py\n```python\nimport flask\n```\n\n"
+            "requirements.txt\n```\nflask\n```\n\n"
+            "app/views.py\n```python\n" + "# views\n" * 20 + "```\n"
+        )
+        entrypoint = "```sh\npip install -r requirements.txt\npython main.py\n```"
+        ai = TestGenCodeWithEntrypoint.MockAI(code, entrypoint)
+
+        files_dict = gen_code_with_entrypoint(
+            ai,
+            Prompt("Write a flask app"),
+            DiskMemory(tempfile.mkdtemp()),
+            PrepromptsHolder(PREPROMPTS_PATH),
+        )
+
+        assert len(ai.entrypoint_requests) == 1
+        assert "app/views.py" not in ai.entrypoint_requests[0]
+        assert files_dict[ENTRYPOINT_FILE].startswith("pip install")
+        assert set(files_dict) == {
+            "main.py",
+            "requirements.txt",
+            "app/views.py",
+            ENTRYPOINT_FILE,
+        }
+
+    def test_entrypoint_is_regenerated_when_the_files_contradict_it(self):
+        code = (
+            "requirements.txt\n```\nflask\n```\n\n"
+            "server.py\n```python\n" + "# server\n" * 20 + "```\n"
+        )
+        entrypoint = "```sh\npip install -r requirements.txt\npython main.py\n```"
+        ai = TestGenCodeWithEntrypoint.MockAI(code, entrypoint)
+
+        gen_code_with_entrypoint(
+            ai,
+            Prompt("Write a flask app"),
+            DiskMemory(tempfile.mkdtemp()),
+            PrepromptsHolder(PREPROMPTS_PATH),
+        )
+
+        assert len(ai.entrypoint_requests) == 2
+        assert "server.py" in ai.entrypoint_requests[1]
+
+    def test_entrypoint_is_regenerated_when_the_speculative_request_fails(self):
+        code = (
+            "main.py\n```python\nimport flask\n```\n\n"
+            "requirements.txt\n```\nflask\n```\n\n"
+            "app/views.py\n```python\n" + "# views\n" * 20 + "```\n"
+        )
+        entrypoint = "```sh\npip install -r requirements.txt\npython main.py\n```"
+        ai = TestGenCodeWithEntrypoint.MockAI(code, entrypoint)
+        start = ai.start
+
+        def failing_once(system, user, step_name, on_text=None):
+            if step_name == "gen_entrypoint" and not ai.entrypoint_requests:
+                ai.entrypoint_requests.append(user)
+                raise RuntimeError("rate limited")
+            return start(system, user, step_name, on_text)
+
+        ai.start = failing_once
+        files_dict = gen_code_with_entrypoint(
+            ai,
+            Prompt("Write a flask app"),
+            DiskMemory(tempfile.mkdtemp()),
+            PrepromptsHolder(PREPROMPTS_PATH),
+        )
+
+        assert len(ai.entrypoint_requests) == 2
+        assert "app/views.py" in ai.entrypoint_requests[1]
+        assert files_dict[ENTRYPOINT_FILE].startswith("pip install")
+
+
 class TestImprove:
     def test_improve_existing_code(self, tmp_path):
         # Mock the AI class
@@ -312,6 +402,84 @@ Some introductory text.
         )
         assert improved_code == expected_code
 
+    def test_improve_records_the_salvage_of_hunks(self, tmp_path):
+        ai_mock = MagicMock(spec=AI)
+        ai_mock.next.return_value = [
+            SystemMessage(
+                content="```diff\n--- main.py\n+++ main.py\n@@ -1,1 +1,1 @@\n"
+                "-print('Hello, World!')\n+print('Goodbye, World!')\n```"
+            )
+        ]
+
+        with collect_timings() as timings:
+            improve_fn(
+                ai_mock,
+                Prompt("Say goodbye"),
+                FilesDict({"main.py": "print('Hello, World!')"}),
+                DiskMemory(tmp_path),
+                PrepromptsHolder(PREPROMPTS_PATH),
+            )
+
+        assert ("step", "salvage_correct_hunks") in timings
+
+    def test_improve_targeted_retry_resends_only_failed_hunks(self, tmp_path):
+        content = "\n".join(f"value_{i} = {i}" for i in range(1, 301))
+        first_answer = """
+```diff
+--- values.py
++++ values.py
+@@ -10,3 +10,3 @@
+ value_10 = 10
+-value_11 = 11
++value_11 = 1100
+ value_12 = 12
+@@ -200,3 +200,3 @@
+ not_in_the_file = 1
+-value_201 = 201
++value_201 = 20100
+ value_202 = 202
+```
+"""
+        retry_answer = """
+```diff
+--- values.py
++++ values.py
+@@ -200,3 +200,3 @@
+ value_200 = 200
+-value_201 = 201
++value_201 = 20100
+ value_202 = 202
+```
+"""
+        answers = iter([first_answer, retry_answer])
+        sent = []
+
+        def next_message(messages, prompt=None, *, step_name):
+            sent.append(list(messages))
+            return messages + [AIMessage(content=next(answers))]
+
+        ai_mock = MagicMock(spec=AI)
+        ai_mock.next.side_effect = next_message
+
+        improved = improve_fn(
+            ai_mock,
+            Prompt("Multiply values 11 and 201 by 100"),
+            FilesDict({"values.py": content}),
+            DiskMemory(tmp_path),
+            PrepromptsHolder(PREPROMPTS_PATH),
+            targeted_retry=True,
+        )
+
+        assert improved["values.py"] == content.replace(
+            "value_11 = 11", "value_11 = 1100"
+        ).replace("value_201 = 201", "value_201 = 20100")
+        retry_messages = sent[1]
+        assert len(retry_messages) == 3
+        assert isinstance(retry_messages[0], SystemMessage)
+        assert "201 value_201 = 201" in retry_messages[1].content
+        assert "50 value_50 = 50" not in retry_messages[1].content
+        assert "not_in_the_file" in retry_messages[2].content
+
     def test_lint_python(self):
         linting = Linting()
         content = "print('Hello, world! ')"
@@ -0,0 +1,58 @@
+import socket
+import time
+
+import pytest
+
+from langchain.schema import AIMessage
+
+from gpt_engineer.core.cassette_ai import CassetteAI, CassetteMissError
+
+
+class FakeChatModel:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        time.sleep(0.2)
+        return AIMessage(content=f"answer {self.calls}")
+
+
+def test_replays_recorded_responses_offline(tmp_path, monkeypatch):
+    def no_network(*args, **kwargs):
+        raise OSError("the network is not reachable in this test")
+
+    # neither the model nor the download of the tokenizer may reach the network
+    monkeypatch.setattr(socket.socket, "connect", no_network)
+    monkeypatch.setattr(socket, "create_connection", no_network)
+    cassette = tmp_path / "cassette.jsonl"
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    recorder = CassetteAI(cassette, mode="record", model_name="gpt-4o")
+    recorder.llm = FakeChatModel()
+    recorded = [
+        recorder.start("system", "hello", step_name="greet")[-1].content,
+        recorder.start("system", "hello", step_name="greet")[-1].content,
+        recorder.start("system", "bye", step_name="leave")[-1].content,
+    ]
+    assert recorded == ["answer 1", "answer 2", "answer 3"]
+
+    monkeypatch.delenv("OPENAI_API_KEY")
+    player = CassetteAI(cassette, mode="replay", model_name="gpt-4o")
+    assert player.llm is None
+    start = time.time()
+    replayed = [
+        player.start("system", "hello", step_name="greet")[-1].content,
+        player.start("system", "hello", step_name="greet")[-1].content,
+        player.start("system", "hello", step_name="greet")[-1].content,
+        player.start("system", "bye", step_name="leave")[-1].content,
+    ]
+    assert time.time() - start < 0.2
+    # the last response of a request is repeated once exhausted
+    assert replayed == ["answer 1", "answer 2", "answer 2", "answer 3"]
+    with pytest.raises(CassetteMissError):
+        player.start("system", "unknown", step_name="greet")
+
+    player = CassetteAI(cassette, latency="recorded", model_name="gpt-4o")
+    start = time.time()
+    player.start("system", "bye", step_name="leave")
+    assert time.time() - start >= 0.2
@@ -0,0 +1,113 @@
+from unittest.mock import MagicMock
+
+from langchain.schema import SystemMessage
+
+from gpt_engineer.core.ai import AI
+from gpt_engineer.core.code_map import build_code_map, condensed_to_chat
+from gpt_engineer.core.default.disk_memory import DiskMemory
+from gpt_engineer.core.default.paths import PREPROMPTS_PATH
+from gpt_engineer.core.default.steps import improve_fn
+from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.preprompts_holder import PrepromptsHolder
+from gpt_engineer.core.prompt import Prompt
+
+
+def python_module(n_functions: int = 20) -> str:
+    functions = [
+        f"def helper_{i}(x):\n"
+        + "".join(f"    x = x * {j} + {i}\n" for j in range(8))
+        + "    return x\n"
+        for i in range(n_functions)
+    ]
+    cls = (
+        "class Greeter:\n"
+        "    def __init__(self):\n        self.name = 'World'\n        self.count = 0\n\n"
+        "    def greet(self):\n        self.count += 1\n        msg = 'Hello'\n"
+        "        return msg\n"
+    )
+    return "import os\n\n\n" + "\n\n".join(functions + [cls])
+
+
+def test_python_code_map():
+    symbols = build_code_map("module.py", python_module(2))
+    assert [s.name for s in symbols] == ["helper_0", "helper_1", "Greeter"]
+    assert (symbols[0].start, symbols[0].body_start, symbols[0].end) == (4, 5, 13)
+    assert [c.name for c in symbols[2].children] == ["__init__", "greet"]
+    assert build_code_map("module.py", "def broken(:\n") is None
+    assert build_code_map("notes.txt", "def f(): pass") is None
+
+
+def test_js_code_map():
+    content = (
+        "import React from 'react';\n\n"
+        "export default function App({ items }) {\n"
+        "  const label = '}';\n"
+        "  return <List items={items} />;\n"
+        "}\n\n"
+        "class Store {\n"
+        "  constructor() {\n    this.items = [];\n  }\n"
+        "  add(item) {\n    this.items.push(item);\n  }\n"
+        "}\n\n"
+        "export const fetchItems = async (url) => {\n"
+        "  return fetch(url);\n"
+        "};\n"
+        "const LIMIT = 10;\n"
+    )
+    symbols = build_code_map("app.jsx", content)
+    assert [(s.name, s.start, s.end) for s in symbols] == [
+        ("App", 3, 6),
+        ("Store", 8, 15),
+        ("fetchItems", 17, 19),
+    ]
+    assert [(c.name, c.start, c.end) for c in symbols[1].children] == [
+        ("constructor", 9, 11),
+        ("add", 12, 14),
+    ]
+
+
+def test_condensed_to_chat_keeps_relevant_bodies():
+    content = python_module()
+    files_dict = FilesDict({"module.py": content})
+
+    condensed = condensed_to_chat(files_dict, "Make greet say Goodbye")
+
+    assert "... (lines" in condensed
+    assert len(condensed) * 3 < len(files_dict.to_chat())
+    lines = content.split("\n")
+    greet_line = lines.index("        msg = 'Hello'") + 1
+    assert f"{greet_line}         msg = 'Hello'" in condensed
+    assert "1 import os" in condensed
+    # files named in the prompt are sent in full
+    assert condensed_to_chat(files_dict, "Fix module.py") == files_dict.to_chat()
+
+
+def test_improve_fn_with_code_map(tmp_path):
+    content = python_module()
+    lines = content.split("\n")
+    greet_line = lines.index("        msg = 'Hello'") + 1
+    ai_patch = f"""
+```diff
+--- module.py
++++ module.py
+@@ -{greet_line - 1},3 +{greet_line - 1},3 @@
+         self.count += 1
+-        msg = 'Hello'
++        msg = 'Goodbye'
+         return msg
+```
+"""
+    ai_mock = MagicMock(spec=AI)
+    ai_mock.next.return_value = [SystemMessage(content=ai_patch)]
+
+    improved = improve_fn(
+        ai_mock,
+        Prompt("Make greet say Goodbye"),
+        FilesDict({"module.py": content}),
+        DiskMemory(tmp_path),
+        PrepromptsHolder(PREPROMPTS_PATH),
+        code_map=True,
+    )
+
+    sent_files = ai_mock.next.call_args[0][0][1].content
+    assert "omitted" in sent_files
+    assert improved["module.py"] == content.replace("'Hello'", "'Goodbye'")
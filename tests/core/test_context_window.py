@@ -0,0 +1,165 @@
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+from langchain_community.chat_models.fake import FakeListChatModel
+
+from gpt_engineer.core.ai import AI
+from gpt_engineer.core.context_window import (
+    ContextWindowManager,
+    context_window_size,
+    retry_message,
+)
+from gpt_engineer.core.files_dict import FilesDict
+
+
+def count_words(messages):
+    return sum(len(str(m.content).split()) + 4 for m in messages)
+
+
+def test_context_window_size():
+    assert context_window_size("gpt-4") == 8192
+    assert context_window_size("gpt-4-32k-0613") == 32768
+    assert context_window_size("gpt-4-turbo-2024-04-09") == 128000
+    assert context_window_size("claude-3-opus-20240229") == 200000
+    assert context_window_size("gpt-4o-mini") == 128000
+    # newer models sharing the prefix of an older one are not known
+    assert context_window_size("gpt-4.1") is None
+    assert context_window_size("gpt-5.1") is None
+    assert context_window_size("my-local-model") is None
+
+
+def test_unknown_model_is_only_cleared_of_stale_retries():
+    manager = ContextWindowManager("gpt-5.1", count_tokens=count_words)
+    messages = [
+        SystemMessage(content="system"),
+        HumanMessage(content="word " * 100_000),
+        AIMessage(content="first attempt"),
+        retry_message("first failure"),
+        AIMessage(content="second attempt"),
+        retry_message("second failure"),
+    ]
+
+    fitted, trims = manager.fit(messages)
+
+    assert manager.budget is None
+    assert fitted == [messages[0], messages[1], messages[4], messages[5]]
+    assert trims == ["dropped 2 messages of earlier retries"]
+    assert ContextWindowManager("gpt-5.1", context_window=400_000).budget > 0
+
+
+def test_drop_retries_keeps_latest_retry():
+    manager = ContextWindowManager("gpt-4", count_tokens=count_words)
+    messages = [
+        SystemMessage(content="system"),
+        HumanMessage(content="files"),
+        AIMessage(content="first attempt"),
+        retry_message("first failure"),
+        AIMessage(content="second attempt"),
+        retry_message("second failure"),
+    ]
+
+    fitted, trims = manager.fit(messages)
+
+    assert [m.content for m in fitted] == [
+        "system",
+        "files",
+        "second attempt",
+        "second failure",
+    ]
+    assert trims == ["dropped 2 messages of earlier retries"]
+    assert len(messages) == 6
+
+
+def test_summarize_old_turns():
+    manager = ContextWindowManager(
+        "gpt-4",
+        context_window=700,
+        reserved_output_tokens=100,
+        count_tokens=count_words,
+    )
+    messages = [SystemMessage(content="system"), HumanMessage(content="task")]
+    for i in range(6):
+        messages.append(AIMessage(content=f"question {i} " + "word " * 100))
+        messages.append(HumanMessage(content=f"answer {i}"))
+
+    fitted, trims = manager.fit(messages)
+
+    assert len(fitted) == 5
+    assert fitted[2].content.startswith("Summary of the earlier conversation:")
+    assert "question 3" in fitted[2].content
+    assert fitted[-1].content == "answer 5"
+    assert trims == ["summarized 10 earlier messages"]
+
+
+def test_shrink_files_keeps_line_numbers():
+    manager = ContextWindowManager(
+        "gpt-4",
+        policies=["shrink_files"],
+        context_window=1000,
+        reserved_output_tokens=0,
+        count_tokens=count_words,
+    )
+    content = "\n".join(f"value_{i} = {i}" for i in range(400))
+    files = FilesDict({"big.py": content, "small.py": "x = 1"})
+    messages = [SystemMessage(content="system"), HumanMessage(content=files.to_chat())]
+
+    fitted, trims = manager.fit(messages)
+
+    shrunk = fitted[1].content
+    assert count_words(fitted) <= 1000
+    assert "1 value_0 = 0" in shrunk
+    assert "400 value_399 = 399" in shrunk
+    assert "... (lines " in shrunk
+    assert "File: small.py\n1 x = 1" in shrunk
+    assert trims[0].startswith("shrank big.py to ")
+
+
+def test_truncates_as_last_resort():
+    manager = ContextWindowManager(
+        "gpt-4", policies=[], context_window=200, count_tokens=count_words
+    )
+    messages = [
+        SystemMessage(content="system"),
+        HumanMessage(content="\n".join(f"line {i}" for i in range(500))),
+    ]
+
+    fitted, trims = manager.fit(messages)
+
+    assert count_words(fitted) <= manager.budget
+    assert fitted[1].content.startswith("line 0")
+    assert "lines omitted" in fitted[1].content
+    assert trims
+
+
+def test_ai_next_drops_stale_retries(monkeypatch):
+    monkeypatch.setattr(
+        AI,
+        "_create_chat_model",
+        lambda self: FakeListChatModel(responses=["a1", "a2", "a3"]),
+    )
+    ai = AI("gpt-4")
+    ai.context_window = ContextWindowManager("gpt-4", count_tokens=count_words)
+    sent = []
+    backoff_inference = ai.backoff_inference
+    monkeypatch.setattr(
+        ai,
+        "backoff_inference",
+        lambda messages, on_text=None: sent.append([m.content for m in messages])
+        or backoff_inference(messages, on_text=on_text),
+    )
+
+    messages = ai.start("system", "user", step_name="step")
+    messages.append(retry_message("retry 1"))
+    messages = ai.next(messages, step_name="step")
+    messages.append(retry_message("retry 2"))
+    messages = ai.next(messages, step_name="step")
+
+    assert sent[-1] == ["system", "user", "a2", "retry 2"]
+    # the conversation keeps the turns that were not sent
+    assert [m.content for m in messages] == [
+        "system",
+        "user",
+        "a1",
+        "retry 1",
+        "a2",
+        "retry 2",
+        "a3",
+    ]
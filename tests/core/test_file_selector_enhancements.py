@@ -57,3 +57,84 @@ def test_file_selector_enhancement_sort(tmp_path):
         "a/aatest.py",
         "x/xxtest.py",
     ], "FileSelector.get_current_files is unsorted!"
+
+
+def test_file_selector_prunes_ignored_directories(tmp_path):
+    project_path = tmp_path / "project"
+    for directory in ["src/pkg", "node_modules/dep", ".hidden", "build", "docs"]:
+        (project_path / directory).mkdir(parents=True)
+    for file in [
+        "src/main.py",
+        "src/pkg/module.py",
+        "src/pkg/module.pyc",
+        "src/pkg/generated.py",
+        "node_modules/dep/index.js",
+        ".hidden/secret.txt",
+        "build/out.js",
+        "docs/keep.log",
+        "docs/debug.log",
+        "prompt",
+    ]:
+        (project_path / file).write_text("x")
+    (project_path / ".gitignore").write_text("*.pyc\nbuild/\n*.log\n")
+    (project_path / "docs/.gitignore").write_text("!keep.log\n")
+    (project_path / "src/pkg/.gitignore").write_text("generated.py\n")
+
+    file_selector = FileSelector(project_path=project_path)
+    expected = ["docs/keep.log", "src/main.py", "src/pkg/module.py"]
+
+    assert [
+        Path(f).as_posix() for f in file_selector.get_current_files(project_path)
+    ] == expected
+    assert [
+        Path(f).as_posix()
+        for f in file_selector.get_current_files(project_path, max_workers=4)
+    ] == expected
+
+
+def test_file_selector_filter_utf8_files_uses_cache(tmp_path, monkeypatch):
+    project_path = set_file_selector_tmpproject(tmp_path)
+    (project_path / "image.png").write_bytes(b"\x89PNG\r\n\x1a\n\x00\x00")
+    (project_path / "latin1.txt").write_bytes("caf\xe9".encode("latin-1"))
+    (project_path / "empty.txt").write_text("")
+    files = ["a/aatest.py", "empty.txt", "image.png", "latin1.txt", "x/xxtest.py"]
+
+    file_selector = FileSelector(project_path=project_path)
+    expected = ["a/aatest.py", "empty.txt", "x/xxtest.py"]
+    assert file_selector.filter_utf8_files(project_path, files) == expected
+
+    checked = []
+    is_utf8 = FileSelector.is_utf8
+    monkeypatch.setattr(
+        FileSelector,
+        "is_utf8",
+        lambda self, path: checked.append(Path(path).name) or is_utf8(self, path),
+    )
+    file_selector = FileSelector(project_path=project_path)
+    assert file_selector.filter_utf8_files(project_path, files) == expected
+    assert checked == []
+
+    (project_path / "latin1.txt").write_text("café", encoding="utf-8")
+    assert file_selector.filter_utf8_files(project_path, files) == [
+        "a/aatest.py",
+        "empty.txt",
+        "latin1.txt",
+        "x/xxtest.py",
+    ]
+    assert checked == ["latin1.txt"]
+
+
+def test_file_selector_auto_select_files(tmp_path):
+    (tmp_path / "billing.py").write_text("def compute_invoice_total(items): pass\n")
+    (tmp_path / "auth.py").write_text("def check_password(user): pass\n")
+
+    file_selector = FileSelector(tmp_path)
+    files_dict, is_linting = file_selector.auto_select_files(
+        "Round the invoice total", 10_000, lambda text: len(text.split())
+    )
+
+    assert list(files_dict.keys()) == ["billing.py"]
+    assert is_linting
+    assert file_selector.get_files_from_toml(tmp_path, file_selector.toml_path) == [
+        "billing.py"
+    ]
@@ -1,11 +1,15 @@
+import os
 import subprocess
 import tempfile
 
 from pathlib import Path
 
+from gpt_engineer.core import git
 from gpt_engineer.core.git import (
     filter_by_gitignore,
+    filter_by_gitignore_files,
     filter_files_with_uncommitted_changes,
+    find_git_root,
     init_git_repo,
     is_git_installed,
     is_git_repo,
@@ -106,3 +110,68 @@ def test_filter_by_uncommitted_changes_ignore_untracked():
 
         # Check if the file is staged
         assert filter_files_with_uncommitted_changes(path, {"test.txt": "test"}) == []
+
+
+def test_filter_by_gitignore_is_cached(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir)
+        init_git_repo(path)
+        (path / ".gitignore").write_text("*.txt")
+
+        calls = []
+        run = subprocess.run
+        monkeypatch.setattr(
+            git.subprocess, "run", lambda *a, **kw: calls.append(a) or run(*a, **kw)
+        )
+        files = ["test.txt", "main.py"]
+        assert filter_by_gitignore(path, files) == ["main.py"]
+        assert filter_by_gitignore(path, files) == ["main.py"]
+        assert len(calls) == 1
+
+        (path / "main.py").write_text("print(1)")
+        subprocess.run(["git", "add", "main.py"], cwd=path)
+        assert filter_by_gitignore(path, files) == ["main.py"]
+        assert len(calls) == 3
+
+
+def test_filter_by_gitignore_sees_nested_gitignore_edits():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir)
+        init_git_repo(path)
+        nested = path / "src" / "pkg"
+        nested.mkdir(parents=True)
+        gitignore = nested / ".gitignore"
+        gitignore.write_text("*.log\n")
+        files = ["src/pkg/debug.log", "src/pkg/data.csv"]
+        assert filter_by_gitignore(path, files) == ["src/pkg/data.csv"]
+
+        gitignore.write_text("*.csv\n")
+        mtime = gitignore.stat().st_mtime_ns + 10**9
+        os.utime(gitignore, ns=(mtime, mtime))
+        assert filter_by_gitignore(path, files) == ["src/pkg/debug.log"]
+
+
+def test_filter_by_gitignore_in_ignored_project():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir)
+        init_git_repo(path)
+        (path / ".gitignore").write_text("projects/\n")
+        project = path / "projects" / "example"
+        project.mkdir(parents=True)
+        (project / ".gitignore").write_text("*.log\n")
+
+        assert filter_by_gitignore(project, ["main.py", "debug.log"]) == ["main.py"]
+
+
+def test_filter_by_gitignore_files():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir)
+        (path / "build").mkdir()
+        (path / "src").mkdir()
+        (path / ".gitignore").write_text("build/\n*.log\n")
+        (path / "src" / ".gitignore").write_text("!keep.log\n")
+
+        assert find_git_root(path) is None
+        assert filter_by_gitignore_files(
+            path, ["build/out.js", "debug.log", "src/keep.log", "src/main.py"]
+        ) == ["src/keep.log", "src/main.py"]
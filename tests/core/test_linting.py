@@ -0,0 +1,56 @@
+import json
+
+from gpt_engineer.core.default.disk_memory import DiskMemory
+from gpt_engineer.core.default.file_store import FileStore
+from gpt_engineer.core.default.paths import LINT_CACHE_FILE
+from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.linting import PARALLEL_LINTING_THRESHOLD, Linting
+
+UNFORMATTED = "x = {  'a':37,'b':42,\n'c':927}\n"
+FORMATTED = 'x = {"a": 37, "b": 42, "c": 927}\n'
+
+
+def test_lint_files_formats_in_parallel():
+    n_files = PARALLEL_LINTING_THRESHOLD + 2
+    files_dict = FilesDict({f"module_{i}.py": UNFORMATTED for i in range(n_files)})
+    files_dict["README.md"] = "# readme"
+
+    linted = Linting(max_workers=2).lint_files(files_dict)
+
+    assert all(linted[f"module_{i}.py"] == FORMATTED for i in range(n_files))
+    assert linted["README.md"] == "# readme"
+
+
+def test_lint_files_skips_already_formatted_files(tmp_path, capsys):
+    cache = DiskMemory(tmp_path)
+
+    Linting(cache=cache).lint_files(FilesDict({"main.py": UNFORMATTED}))
+    assert LINT_CACHE_FILE in cache
+    assert len(next(iter(json.loads(cache[LINT_CACHE_FILE]).values()))) == 1
+    capsys.readouterr()
+
+    linted = Linting(cache=cache).lint_files(FilesDict({"main.py": FORMATTED}))
+    assert linted["main.py"] == FORMATTED
+    assert "already formatted" in capsys.readouterr().out
+
+
+def test_lint_files_keeps_content_on_syntax_error(tmp_path):
+    cache = DiskMemory(tmp_path)
+    broken = "def f(:\n"
+
+    linted = Linting(cache=cache).lint_files(FilesDict({"broken.py": broken}))
+
+    assert linted["broken.py"] == broken
+    assert next(iter(json.loads(cache[LINT_CACHE_FILE]).values())) == []
+
+
+def test_file_store_linting_only_caches_in_given_memory(tmp_path):
+    store = FileStore(tmp_path / "project")
+    files = FilesDict({"main.py": "x=1\n"})
+
+    assert store.linting(files)["main.py"] == "x = 1\n"
+    assert not (tmp_path / "project" / ".gpteng").exists()
+
+    memory = DiskMemory(tmp_path / "memory")
+    store.linting(files, cache=memory)
+    assert LINT_CACHE_FILE in memory
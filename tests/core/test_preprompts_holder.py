@@ -0,0 +1,56 @@
+import os
+
+from gpt_engineer.core import preprompts_holder
+from gpt_engineer.core.default.paths import PREPROMPTS_PATH
+from gpt_engineer.core.default.steps import _assemble_sys_prompt, setup_sys_prompt
+from gpt_engineer.core.preprompts_holder import PrepromptsHolder
+
+
+def test_preprompts_are_read_once_until_modified(tmp_path, monkeypatch):
+    (tmp_path / "roadmap").write_text("Build it.")
+    reads = []
+
+    class CountingDiskMemory(preprompts_holder.DiskMemory):
+        def __getitem__(self, key):
+            reads.append(key)
+            return super().__getitem__(key)
+
+    monkeypatch.setattr(preprompts_holder, "DiskMemory", CountingDiskMemory)
+
+    assert PrepromptsHolder(tmp_path).get_preprompts() == {"roadmap": "Build it."}
+    assert PrepromptsHolder(tmp_path).get_preprompts() == {"roadmap": "Build it."}
+    assert reads == ["roadmap"]
+
+    # written in place, as editors and open(..., "w") do
+    with open(tmp_path / "roadmap", "w") as f:
+        f.write("Build it well.")
+    assert PrepromptsHolder(tmp_path).get_preprompts() == {"roadmap": "Build it well."}
+
+    # same size, told apart by the modification time
+    with open(tmp_path / "roadmap", "w") as f:
+        f.write("Build it fast.")
+    os.utime(tmp_path / "roadmap", ns=(0, 0))
+    assert PrepromptsHolder(tmp_path).get_preprompts() == {"roadmap": "Build it fast."}
+
+    (tmp_path / "philosophy").write_text("Keep it simple.")
+    assert PrepromptsHolder(tmp_path).get_preprompts() == {
+        "philosophy": "Keep it simple.",
+        "roadmap": "Build it fast.",
+    }
+    assert reads == ["roadmap", "roadmap", "roadmap", "philosophy", "roadmap"]
+
+
+def test_modified_preprompts_clear_the_assembled_system_prompts(tmp_path):
+    for name in os.listdir(PREPROMPTS_PATH):
+        (tmp_path / name).write_text((PREPROMPTS_PATH / name).read_text())
+    holder = PrepromptsHolder(tmp_path)
+    setup_sys_prompt(holder.get_preprompts())
+    assert _assemble_sys_prompt.cache_info().currsize > 0
+
+    with open(tmp_path / "philosophy", "a") as f:
+        f.write("\nPrefer the standard library.")
+
+    assert setup_sys_prompt(holder.get_preprompts()).endswith(
+        "Prefer the standard library."
+    )
+    assert _assemble_sys_prompt.cache_info().currsize == 1
@@ -0,0 +1,110 @@
+import json
+import threading
+import time
+
+from gpt_engineer.core import profiling
+from gpt_engineer.core.profiling import LLM_CATEGORY, collect_timings, profiled, span
+
+
+@profiled()
+def step():
+    def request():
+        with span("llm_request", LLM_CATEGORY):
+            time.sleep(0.1)
+
+    threads = [threading.Thread(target=request) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with span("parse", "cpu"):
+        sum(range(100000))
+    return "done"
+
+
+def test_spans_are_only_recorded_while_enabled(tmp_path):
+    assert step() == "done"
+    assert profiling.active_profiler() is None
+
+    profiler = profiling.enable(cprofile=True, trace_memory=True)
+    try:
+        assert step() == "done"
+    finally:
+        assert profiling.disable() is profiler
+
+    names = sorted(s.name for s in profiler.spans)
+    assert names == ["llm_request", "llm_request", "parse", "step"]
+    step_span = next(s for s in profiler.spans if s.name == "step")
+    assert "peak_kb" in step_span.args
+
+    wall, llm = profiler.timings()
+    # the concurrent requests overlap and count once
+    assert 0.1 <= llm < 0.19
+    assert wall >= llm
+
+    trace_path = profiler.write(tmp_path)
+    events = json.loads(trace_path.read_text())["traceEvents"]
+    complete = [e for e in events if e["ph"] == "X"]
+    assert {e["tid"] for e in complete} == {1, 2, 3}
+    assert all(e["dur"] > 0 for e in complete)
+    assert (tmp_path / "profile_step.prof").exists()
+    assert "waiting on the model" in profiler.summary()
+
+
+def test_enable_from_env(monkeypatch):
+    monkeypatch.delenv(profiling.PROFILE_ENV_VAR, raising=False)
+    assert profiling.enable_from_env() is None
+    try:
+        assert not profiling.enable_from_env(force=True).cprofile
+        monkeypatch.setenv(profiling.PROFILE_ENV_VAR, "cprofile")
+        assert profiling.enable_from_env().cprofile
+    finally:
+        profiling.disable()
+
+
+def test_finish_writes_the_trace_of_a_failed_run(tmp_path):
+    assert profiling.finish(tmp_path) is None
+
+    profiling.enable()
+    try:
+        with span("failing step"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    finally:
+        trace_path = profiling.finish(tmp_path)
+
+    assert profiling.active_profiler() is None
+    events = json.loads(trace_path.read_text())["traceEvents"]
+    assert [e["name"] for e in events if e["ph"] == "X"] == ["failing step"]
+
+
+def test_time_waiting_on_the_user_is_not_overhead():
+    profiler = profiling.enable()
+    try:
+        with span("ask_for_files"):
+            with span("open_with_default_editor", profiling.INTERACTIVE_CATEGORY):
+                time.sleep(0.1)
+    finally:
+        profiling.disable()
+
+    wall, llm = profiler.timings()
+    assert llm == 0
+    assert 0.1 <= profiler.busy_time(profiling.INTERACTIVE_CATEGORY) <= wall
+    assert "s waiting on the user" in profiler.summary()
+
+
+def test_collect_timings_without_profiler():
+    assert profiling.active_profiler() is None
+    with collect_timings() as outer:
+        with collect_timings() as inner:
+            step()
+        with span("parse", "cpu"):
+            pass
+
+    # the requests ran in other threads
+    assert set(inner) == {("step", "step"), ("cpu", "parse")}
+    assert inner[("step", "step")] >= 0.1
+    assert outer[("step", "step")] == inner[("step", "step")]
+    assert outer[("cpu", "parse")] > inner[("cpu", "parse")]
+    assert profiling.active_profiler() is None
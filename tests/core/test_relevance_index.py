@@ -0,0 +1,79 @@
+import json
+
+from gpt_engineer.core.default.disk_memory import DiskMemory
+from gpt_engineer.core.default.paths import RELEVANCE_INDEX_FILE
+from gpt_engineer.core.relevance_index import RelevanceIndex, tokenize
+
+
+def num_tokens(text: str) -> int:
+    return len(text.split())
+
+
+def make_project(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "payment_gateway.py").write_text(
+        "class PaymentGateway:\n    def charge_card(self, amount):\n        pass\n"
+    )
+    (tmp_path / "src" / "user_profile.py").write_text(
+        "def load_user_profile(user_id):\n    return {'id': user_id}\n"
+    )
+    (tmp_path / "README.md").write_text("A shop with users and payments.\n")
+    return ["src/payment_gateway.py", "src/user_profile.py", "README.md"]
+
+
+def test_tokenize_splits_identifiers():
+    tokens = tokenize("chargeCard(user_id) HTTPServer x")
+    assert "chargecard" in tokens
+    assert {"charge", "card", "user", "id", "http", "server"} <= set(tokens)
+    assert "x" not in tokens
+
+
+def test_rank_prefers_matching_files(tmp_path):
+    files = make_project(tmp_path)
+    index = RelevanceIndex(DiskMemory(tmp_path / ".gpteng"))
+    index.update(tmp_path, files)
+
+    ranked = [file for file, _ in index.rank("Fix the card charge in the gateway")]
+    assert ranked[0] == "src/payment_gateway.py"
+    assert "src/user_profile.py" not in ranked
+
+
+def test_update_is_incremental(tmp_path):
+    files = make_project(tmp_path)
+    memory = DiskMemory(tmp_path / ".gpteng")
+    assert RelevanceIndex(memory).update(tmp_path, files) == 3
+    assert RELEVANCE_INDEX_FILE in memory
+
+    (tmp_path / "src" / "user_profile.py").write_text("def delete_account(): pass\n")
+    index = RelevanceIndex(memory)
+    assert index.update(tmp_path, files[:2]) == 1
+    assert set(json.loads(memory[RELEVANCE_INDEX_FILE])["docs"]) == set(files[:2])
+    assert index.rank("delete account")[0][0] == "src/user_profile.py"
+
+
+def test_select_respects_token_budget(tmp_path):
+    files = make_project(tmp_path)
+    index = RelevanceIndex(DiskMemory(tmp_path / ".gpteng"))
+    index.update(tmp_path, files)
+
+    query = "user payment gateway profile"
+    assert len(index.select(query, tmp_path, 10_000, num_tokens)) == 2
+    assert index.select(query, tmp_path, 40, num_tokens) == ["src/user_profile.py"]
+    assert index.select(query, tmp_path, 5, num_tokens) == []
+
+
+def test_select_stops_reading_once_budget_is_spent(tmp_path):
+    files = make_project(tmp_path)
+    index = RelevanceIndex(DiskMemory(tmp_path / ".gpteng"))
+    index.update(tmp_path, files)
+    query = "user payment gateway profile"
+    first = index.rank(query)[0][0]
+    content = (tmp_path / first).read_text()
+    budget = num_tokens(content) + content.count("\n") + len(first)
+
+    counted = []
+    selected = index.select(
+        query, tmp_path, budget, lambda text: counted.append(text) or num_tokens(text)
+    )
+    assert selected == [first]
+    assert len(counted) == 1
@@ -0,0 +1,106 @@
+import threading
+
+import pytest
+
+from gpt_engineer.core.step_graph import Step, StepGraph
+
+
+def test_independent_steps_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+    calls = []
+
+    def gen_code(prompt):
+        calls.append("gen_code")
+        return f"code for {prompt}"
+
+    def gen_entrypoint(code):
+        barrier.wait()  # only passes if gen_readme runs at the same time
+        return f"run {code}"
+
+    def gen_readme(code, ai):
+        barrier.wait()
+        return f"{ai} documents {code}"
+
+    def combine(entrypoint, readme):
+        return [entrypoint, readme]
+
+    graph = StepGraph(
+        [
+            Step(combine, inputs=["entrypoint", "readme"], output="result"),
+            Step(gen_code, inputs=["prompt"], output="code"),
+            Step(gen_entrypoint, inputs=["code"], output="entrypoint"),
+            Step(gen_readme, inputs=["code"], output="readme"),
+        ],
+        memo_size=8,
+    )
+
+    values = graph.run({"prompt": "hello"}, resources={"ai": "the ai"})
+    assert values["result"] == [
+        "run code for hello",
+        "the ai documents code for hello",
+    ]
+
+    # outputs are memoized by input hash
+    graph.run({"prompt": "hello"}, resources={"ai": "the ai"})
+    assert calls == ["gen_code"]
+    graph.run({"prompt": "bye"}, resources={"ai": "the ai"})
+    assert calls == ["gen_code", "gen_code"]
+
+
+def test_steps_running_alone_run_in_the_calling_thread():
+    threads = []
+
+    def gen_code(prompt):
+        threads.append(threading.current_thread())
+        return prompt
+
+    def execute(code):
+        threads.append(threading.current_thread())
+        return code
+
+    StepGraph(
+        [
+            Step(gen_code, inputs=["prompt"], output="code"),
+            Step(execute, inputs=["code"], output="result"),
+        ]
+    ).run({"prompt": "p"})
+
+    assert threads == [threading.current_thread()] * 2
+
+
+def test_memoization_is_opt_in_and_bounded():
+    calls = []
+
+    def gen_code(prompt):
+        calls.append(prompt)
+        return prompt
+
+    graph = StepGraph([Step(gen_code, inputs=["prompt"], output="code")])
+    graph.run({"prompt": "a"})
+    graph.run({"prompt": "a"})
+    assert calls == ["a", "a"]
+
+    calls.clear()
+    graph = StepGraph([Step(gen_code, inputs=["prompt"], output="code")], memo_size=2)
+    for prompt in ["a", "b", "a", "c", "a", "b"]:
+        graph.run({"prompt": prompt})
+    # "b" was the least recently used when "c" was memoized
+    assert calls == ["a", "b", "c", "b"]
+
+
+def test_missing_inputs_are_rejected():
+    graph = StepGraph([Step(lambda code: code, inputs=["code"], output="x", name="a")])
+    with pytest.raises(ValueError, match="missing inputs"):
+        graph.run({"prompt": "hello"})
+
+    with pytest.raises(ValueError, match="produced by two steps"):
+        graph.add(Step(lambda prompt: prompt, inputs=["prompt"], output="x"))
+
+
+def test_step_errors_are_raised():
+    def failing(prompt):
+        raise RuntimeError("boom")
+
+    graph = StepGraph([Step(failing, inputs=["prompt"], output="code")])
+    with pytest.raises(RuntimeError, match="boom"):
+        graph.run({"prompt": "hello"})
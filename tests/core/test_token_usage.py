@@ -6,6 +6,8 @@ import os
 from io import StringIO
 from pathlib import Path
 
+import tiktoken
+
 from langchain.schema import HumanMessage, SystemMessage
 from PIL import Image
 
@@ -108,3 +110,17 @@ def test_list_type_message_with_image():
     assert (
         token_usage_log.log()[-1].in_step_total_tokens == expected_total_tokens
     ), f"Expected {expected_total_tokens} tokens, got {token_usage_log.log()[-1].in_step_total_tokens}"
+
+
+def test_tokenizer_loads_lazily_and_estimates_without_encoding(monkeypatch):
+    def offline(*args, **kwargs):
+        raise ConnectionError("offline")
+
+    monkeypatch.setattr(tiktoken, "encoding_for_model", offline)
+    monkeypatch.setattr(tiktoken, "get_encoding", offline)
+
+    # constructing does not load the encoding
+    tokenizer = Tokenizer("gpt-4o")
+
+    assert tokenizer.num_tokens("a" * 10) == 3
+    assert TokenUsageLog("gpt-4o").format_log().count("\n") == 1
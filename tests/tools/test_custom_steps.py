@@ -0,0 +1,241 @@
+from unittest.mock import MagicMock, patch
+
+from langchain.schema import AIMessage
+
+from gpt_engineer.core.ai import AI
+from gpt_engineer.core.chat_to_files import parse_diffs
+from gpt_engineer.core.default.disk_memory import DiskMemory
+from gpt_engineer.core.default.paths import PREPROMPTS_PATH
+from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.preprompts_holder import PrepromptsHolder
+from gpt_engineer.core.prompt import Prompt
+from gpt_engineer.tools.custom_steps import (
+    MAX_SAME_ERROR_ATTEMPTS,
+    _drop_overlapping_hunks,
+    error_signature,
+    improve_fn_map_reduce,
+    self_heal,
+    split_entrypoint,
+    summarize_failure,
+)
+
+MAIN = "import sys\nprint('Hello, World!')"
+IMPROVED_MAIN = "import sys\nfrom greet import greet\nprint(greet())"
+PLAN = """Here is the plan:
+{"main.py": "print the greeting from greet", "greet.py": "add greet() returning the text"}
+"""
+MAIN_DIFF = """
+```diff
+--- main.py
++++ main.py
+@@ -1,2 +1,3 @@
+ import sys
++from greet import greet
+-print('Hello, World!')
++print(greet())
+```
+"""
+GREET_DIFF = """
+```diff
+--- /dev/null
++++ greet.py
+@@ -0,0 +1,2 @@
++def greet():
++    return 'Hello, World!'
+```
+"""
+
+
+def test_improve_fn_map_reduce_edits_planned_files_separately(tmp_path):
+    sent = []
+
+    def next_message(messages, prompt=None, *, step_name):
+        sent.append(list(messages))
+        request = messages[-1].content
+        if "Change request" in request:
+            answer = PLAN
+        elif "planned for main.py" in request:
+            answer = MAIN_DIFF
+        else:
+            answer = GREET_DIFF
+        return messages + [AIMessage(content=answer)]
+
+    ai_mock = MagicMock(spec=AI)
+    ai_mock.next.side_effect = next_message
+    files_dict = FilesDict({"main.py": MAIN, "README.md": "A greeting."})
+
+    improved = improve_fn_map_reduce(
+        ai_mock,
+        Prompt("Move the greeting to a greet function in greet.py"),
+        files_dict,
+        DiskMemory(tmp_path),
+        PrepromptsHolder(PREPROMPTS_PATH),
+    )
+
+    assert improved == {
+        "main.py": IMPROVED_MAIN,
+        "greet.py": "def greet():\n    return 'Hello, World!'",
+        "README.md": "A greeting.",
+    }
+    assert len(sent) == 3
+    edit_conversations = "".join(str(m.content) for m in sent[1] + sent[2])
+    assert "README.md" not in edit_conversations
+
+
+def test_improve_fn_map_reduce_falls_back_without_plan(tmp_path):
+    answers = iter(["I would change main.py.", MAIN_DIFF])
+    ai_mock = MagicMock(spec=AI)
+    ai_mock.next.side_effect = lambda messages, prompt=None, *, step_name: (
+        messages + [AIMessage(content=next(answers))]
+    )
+
+    improved = improve_fn_map_reduce(
+        ai_mock,
+        Prompt("Print the greeting from greet"),
+        FilesDict({"main.py": MAIN}),
+        DiskMemory(tmp_path),
+        PrepromptsHolder(PREPROMPTS_PATH),
+    )
+
+    assert improved["main.py"] == IMPROVED_MAIN
+
+
+def test_improve_fn_map_reduce_keeps_edits_of_files_that_did_not_fail(tmp_path):
+    attempts = []
+
+    def next_message(messages, prompt=None, *, step_name):
+        request = messages[-1].content
+        if "Change request" in request:
+            return messages + [AIMessage(content=PLAN)]
+        if "planned for greet.py" in request:
+            attempts.append(request)
+            raise TimeoutError("the model did not answer")
+        return messages + [AIMessage(content=MAIN_DIFF)]
+
+    ai_mock = MagicMock(spec=AI)
+    ai_mock.next.side_effect = next_message
+
+    improved = improve_fn_map_reduce(
+        ai_mock,
+        Prompt("Move the greeting to a greet function in greet.py"),
+        FilesDict({"main.py": MAIN}),
+        DiskMemory(tmp_path),
+        PrepromptsHolder(PREPROMPTS_PATH),
+    )
+
+    assert improved == {"main.py": IMPROVED_MAIN}
+    assert len(attempts) == 2
+
+
+def test_drop_overlapping_hunks_keeps_the_first_hunk():
+    lines = {1: "a", 2: "b", 3: "c", 4: "d", 5: "e"}
+    diff = parse_diffs(
+        """
+```diff
+--- f.py
++++ f.py
+@@ -2,2 +2,2 @@
+-b
++B
+ c
+@@ -3,2 +3,2 @@
+-c
++C
+ d
+@@ -5,1 +5,1 @@
+-e
++E
+```
+"""
+    )["f.py"]
+    assert diff.validate_and_correct(lines) == []
+
+    problems = _drop_overlapping_hunks(diff)
+
+    assert len(problems) == 1
+    assert "line 3" in problems[0]
+    assert [hunk.start_line_pre_edit for hunk in diff.hunks] == [2, 5]
+
+
+def test_split_entrypoint_keeps_shell_setup_in_both_phases():
+    script = "python -m venv venv\nsource venv/bin/activate\npip install -r requirements.txt\npython main.py"
+
+    install_script, run_script = split_entrypoint(script)
+
+    assert install_script == script.rsplit("\n", 1)[0]
+    assert run_script == "source venv/bin/activate\npython main.py"
+    assert split_entrypoint("pip install flask && python app.py") == (
+        "",
+        "pip install flask && python app.py",
+    )
+
+
+def test_summarize_failure_keeps_the_last_traceback_without_repeats():
+    stderr = (
+        "warning: slow\n" * 50
+        + "Traceback (most recent call last):\n"
+        + '  File "main.py", line 3, in <module>\n'
+        + "ValueError: bad value 42\n"
+    )
+
+    summary = summarize_failure("x" * 10000, stderr)
+
+    assert "warning" not in summary
+    assert "ValueError: bad value 42" in summary
+    assert "x" * 100 not in summary
+    assert summarize_failure("", "retry\n" * 5).count("retry") == 1
+    assert error_signature("", "ValueError: bad value 42 at 0x7f3a") == error_signature(
+        "", "ValueError: bad value 7 at 0x1b2c"
+    )
+
+
+def test_self_heal_installs_once_and_stops_on_repeated_error(tmp_path):
+    commands = []
+
+    def popen(command):
+        commands.append(command)
+        process = MagicMock()
+        if command.startswith("pip install"):
+            process.communicate.return_value = (b"installed", b"")
+            process.returncode = 0
+        else:
+            process.communicate.return_value = (
+                b"",
+                b"NameError: name 'x' is not defined",
+            )
+            process.returncode = 1
+        return process
+
+    execution_env = MagicMock()
+    execution_env.popen.side_effect = popen
+    files_dict = FilesDict(
+        {
+            "run.sh": "pip install -r requirements.txt\npython main.py",
+            "requirements.txt": "flask",
+            "main.py": "print(x)",
+        }
+    )
+
+    with patch(
+        "gpt_engineer.tools.custom_steps.improve_fn",
+        side_effect=lambda ai, prompt, files_dict, *args: FilesDict(
+            files_dict, **{"main.py": files_dict["main.py"] + "\n"}
+        ),
+    ) as improve_mock:
+        self_heal(
+            MagicMock(spec=AI),
+            execution_env,
+            files_dict,
+            Prompt("Print x"),
+            PrepromptsHolder(PREPROMPTS_PATH),
+            DiskMemory(tmp_path),
+        )
+
+    assert commands.count("pip install -r requirements.txt") == 1
+    assert commands.count("python main.py") == MAX_SAME_ERROR_ATTEMPTS
+    assert improve_mock.call_count == MAX_SAME_ERROR_ATTEMPTS - 1
+    assert "NameError" in improve_mock.call_args.args[1].text
+    # only the changed file is uploaded again after a fix
+    assert execution_env.upload.call_args.args[0] == {
+        "main.py": files_dict["main.py"] + "\n\n"
+    }